@@ -55,6 +55,11 @@ class ModelParams(ParamGroup):
         # 如果未设置且输入图像宽度超过1.6K像素，则输入将自动重新缩放到此目标。
         self._white_background = False
         self.data_device = "cuda"  # 指定源图像数据的位置，默认为cuda，如果在大型/高分辨率数据集上训练，建议使用cpu，将减少VRAM消耗，但会稍微减慢训练速度。
+        self.image_cache_mb = 0  # >0时延迟加载训练图片，第一次使用时才解码，解码后的图片保存在该容量(MB)的LRU缓存中
+        self.load_workers = 1  # 创建相机列表时并行解码图片的线程数，<=0时使用所有CPU
+        self.jpeg_draft = False  # 目标分辨率不超过原图的1/2、1/4或1/8时，JPEG直接解码为缩小的图片再缩放，加快图片加载，结果与完整解码略有不同
+        self.image_disk_cache = False  # 将缩放后的图片以uint8保存在cache_dir/images下，所有partition以及之后的运行直接读取，不再解码
+        self.uint8_images = False  # GT图片以uint8保存在data_device上，训练时才转换为float并乘以mask，占用为float32的1/4，loss不变
         self.eval = False  # 添加此标志以使用mipnerf360风格的培训/测试分割进行评估。
         self.llffhold = 83  # 可以被llffhold整除的图像索引，作为测试机
         # New Params
@@ -65,11 +70,26 @@ class ModelParams(ParamGroup):
         self.pos = ""  # 点云平移，平移向量，如果使用threejs，则pos和rot的参数个数均为三个，如果使用cloudcompare则，rot为9个数，pos为3个数
         self.rot = ""  # 点云平移，如果处理平台为cloudcompare，则rot为旋转矩阵，否则用threejs处理rot就为三个旋转向量
         self.man_trans = None  # 指定经过曼哈顿对齐后的点云坐标相对于初始点云坐标的变换矩阵
+        self.cache_dir = ""  # 对齐后场景缓存的目录，默认为<source_path>/cache
         # Data Partition
         self.m_region = 3
         self.n_region = 3
         self.extend_rate = 0.2
         self.visible_rate = 0.25
+        # grid: 按相机数量均分为m_region×n_region的网格  kd: 基于代价(像素数+点数)的自适应k-d划分
+        # hierarchical: m_region×n_region的粗分块，每块再划分为sub_m_region×sub_n_region的子块，只在相邻的粗分块之间进行可见性选择
+        self.partition_strategy = "grid"
+        self.sub_m_region = 2  # hierarchical划分中每个粗分块沿x轴划分的子块数量
+        self.sub_n_region = 2  # hierarchical划分中每个粗分块沿z轴划分的子块数量
+        self.partition_target_cost = 0.0  # kd划分中每个partition的目标代价(整个场景为2)，<=0时划分为m_region*n_region块
+        self.partition_max_cameras = 0  # 每个partition相机数量的上限，>0时为每个partition自动调整extend_rate与visible_rate
+        self.partition_max_points = 0  # 每个partition初始点数量的上限，>0时为每个partition自动调整extend_rate与visible_rate
+        self.partition_workers = 1  # 基于可见性的相机选择时并行计算的进程数，<=0时使用所有CPU
+        self.visibility_max_distance = 0.0  # >0时xz平面上距离partition超过该值的相机不参与基于可见性的相机选择
+        self.point_chunk_size = 0  # >0时分块流式处理点云，每次只读取该数量的点，用于内存无法容纳的大点云
+        self.voxel_size = 0.0  # >0时对每个partition的初始点云进行体素降采样，体素内的点取平均
+        self.voxel_max_points = 0  # >0时增大体素直到每个partition的初始点数不超过该值
+        self.track_point_selection = False  # 基于覆盖率的点选择时，使用COLMAP的track直接查找相机观测到的点，而不是将点云重投影到相机中
 
         super().__init__(parser, "Loading Parameters", sentinel)
 
@@ -118,7 +118,8 @@ class PartitionScene:
 
         scene_info = sceneLoadTypeCallbacks["ColmapVast"](args.source_path, args.partition_model_path,
                                                           args.partition_id, args.images, eval=False,
-                                                          man_trans=args.man_trans)  # 分块的时候已经划分过train 和 test，此时不用再划分
+                                                          man_trans=args.man_trans,
+                                                          cache_dir=args.cache_dir)  # 分块的时候已经划分过train 和 test，此时不用再划分
 
         # if os.path.exists(os.path.join(args.source_path, "sparse")):
         #     scene_info = sceneLoadTypeCallbacks["ColmapVast"](args.source_path, args.partition_model_path, args.partition_id, args.images, args.eval, man_trans=args.man_trans)
@@ -55,6 +55,7 @@ class Camera(nn.Module):
     def __init__(self, colmap_id, R, T, FoVx, FoVy, image, gt_alpha_mask,
                  image_name, uid,
                  trans=np.array([0.0, 0.0, 0.0]), scale=1.0, data_device = "cuda",
+                 image_provider=None,
                  ):
         super(Camera, self).__init__()
 
@@ -73,14 +74,17 @@ class Camera(nn.Module):
             print(f"[Warning] Custom device {data_device} failed, fallback to default cuda device" )
             self.data_device = torch.device("cuda")
 
-        self.original_image = image.clamp(0.0, 1.0).to(self.data_device)
-        self.image_width = self.original_image.shape[2]
-        self.image_height = self.original_image.shape[1]
-
-        if gt_alpha_mask is not None:
-            self.original_image *= gt_alpha_mask.to(self.data_device)
+        self.image_provider = image_provider
+        if image_provider is None:
+            self._original_image = self.prepare_image(image, gt_alpha_mask)
+            self.image_width = self._original_image.shape[2]
+            self.image_height = self._original_image.shape[1]
         else:
-            self.original_image *= torch.ones((1, self.image_height, self.image_width), device=self.data_device)
+            # image为LazyImage，第一次访问original_image时才解码，解码结果保存在image_provider的缓存中
+            self._original_image = None
+            self.lazy_image = image
+            self.image_width = image.width
+            self.image_height = image.height
 
         self.zfar = 100.0
         self.znear = 0.01
@@ -93,6 +97,34 @@ class Camera(nn.Module):
         self.full_proj_transform = (self.world_view_transform.unsqueeze(0).bmm(self.projection_matrix.unsqueeze(0))).squeeze(0)
         self.camera_center = self.world_view_transform.inverse()[3, :3]
 
+    def prepare_image(self, image, gt_alpha_mask):
+        if image.dtype == torch.uint8:
+            # uint8保存: alpha mask作为第4个通道一起保存，访问original_image时再转换为float并乘以mask，显存/内存为float32的1/4
+            if gt_alpha_mask is not None:
+                image = torch.cat([image, gt_alpha_mask], dim=0)
+            return image.to(self.data_device).contiguous()
+        original_image = image.clamp(0.0, 1.0).to(self.data_device)
+        if gt_alpha_mask is not None:
+            original_image *= gt_alpha_mask.to(self.data_device)
+        # 没有mask时乘以全1的tensor不改变数值，不再创建
+        return original_image
+
+    @staticmethod
+    def to_float(image):
+        """uint8的 [3, H, W] 或 [4, H, W] 图像转为float，与加载时直接除以255再乘以mask的结果相同"""
+        original_image = image[:3] / 255.0
+        if image.shape[0] == 4:
+            original_image *= image[3:4] / 255.0
+        return original_image
+
+    @property
+    def original_image(self):
+        if self._original_image is not None:
+            image = self._original_image
+        else:
+            image = self.image_provider.get(self.lazy_image.key, lambda: self.prepare_image(*self.lazy_image.load()))
+        return self.to_float(image) if image.dtype == torch.uint8 else image
+
 
 class MiniCam:
     def __init__(self, width, height, fovy, fovx, znear, zfar, world_view_transform, full_proj_transform):
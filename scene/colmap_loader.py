@@ -11,7 +11,11 @@
 
 import numpy as np
 import collections
+import json
+import mmap
+import os
 import struct
+from typing import NamedTuple
 
 CameraModel = collections.namedtuple(
     "CameraModel", ["model_id", "model_name", "num_params"])
@@ -65,10 +69,64 @@ def rotmat2qvec(R):
         qvec *= -1
     return qvec
 
+KEYPOINT_MODES = ("eager", "lazy", "none")
+
+
+class LazyPoints2D:
+    """2D points of one image, decoded on first access.
+    Only the location of the keypoints is kept (byte offset into images.bin, or the position of the POINTS2D line
+    of images.txt), so the object stays small and picklable until the keypoints are actually needed.
+    """
+    __slots__ = ("path", "offset", "count", "text", "_points")
+
+    def __init__(self, path, offset, count=0, text=False):
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.text = text
+        self._points = None
+
+    def __getstate__(self):
+        return self.path, self.offset, self.count, self.text
+
+    def __setstate__(self, state):
+        self.path, self.offset, self.count, self.text = state
+        self._points = None
+
+    def load(self):
+        if self._points is None:
+            if self.text:
+                with open(self.path, "r") as fid:
+                    fid.seek(self.offset)
+                    self._points = parse_points2D_text(fid.readline())
+            else:
+                with open(self.path, "rb") as fid:
+                    fid.seek(self.offset)
+                    self._points = points2D_from_buffer(fid.read(POINT2D_DTYPE.itemsize * self.count), self.count)
+        return self._points
+
+
 class Image(BaseImage):
+    """xys/point3D_ids are either arrays, None (keypoints="none") or decoded on first access (keypoints="lazy")"""
+
     def qvec2rotmat(self):
         return qvec2rotmat(self.qvec)
 
+    @property
+    def xys(self):
+        value = tuple.__getitem__(self, 5)
+        return value.load()[0] if isinstance(value, LazyPoints2D) else value
+
+    @property
+    def point3D_ids(self):
+        value = tuple.__getitem__(self, 6)
+        return value.load()[1] if isinstance(value, LazyPoints2D) else value
+
+
+def check_keypoints_mode(keypoints):
+    if keypoints not in KEYPOINT_MODES:
+        raise ValueError(f"keypoints must be one of {KEYPOINT_MODES}, got {keypoints}")
+
 def read_next_bytes(fid, num_bytes, format_char_sequence, endian_character="<"):
     """Read and unpack the next bytes from a binary file.
     :param fid:
@@ -80,6 +138,148 @@ def read_next_bytes(fid, num_bytes, format_char_sequence, endian_character="<"):
     data = fid.read(num_bytes)
     return struct.unpack(endian_character + format_char_sequence, data)
 
+# Fixed-size record layouts of the COLMAP binary files (packed, little endian)
+POINT3D_RECORD_DTYPE = np.dtype([("id", "<u8"), ("xyz", "<f8", 3), ("rgb", "u1", 3),
+                                 ("error", "<f8"), ("track_length", "<u8")])
+IMAGE_RECORD_DTYPE = np.dtype([("id", "<i4"), ("qvec", "<f8", 4), ("tvec", "<f8", 3), ("camera_id", "<i4")])
+POINT2D_DTYPE = np.dtype([("xy", "<f8", 2), ("point3D_id", "<i8")])
+
+
+def map_binary_file(path_to_model_file):
+    """Memory-map a COLMAP binary file read-only.
+    Arrays gathered from the map are copies, so the map is released once the caller drops it."""
+    with open(path_to_model_file, "rb") as fid:
+        return mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def gather_records(buffer, offsets, dtype, chunk_size=1_000_000):
+    """Decode fixed-size records starting at arbitrary byte offsets of a buffer in one vectorized gather.
+    :return: structured array of dtype, one entry per offset
+    """
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    records = np.empty(len(offsets), dtype=dtype)
+    record_bytes = np.arange(dtype.itemsize)
+    for start in range(0, len(offsets), chunk_size):
+        rows = raw[np.asarray(offsets[start:start + chunk_size], dtype=np.int64)[:, None] + record_bytes]
+        records[start:start + chunk_size] = rows.view(dtype)[:, 0]
+    return records
+
+
+def points3D_binary_offsets(buffer):
+    """Offset pass over points3D.bin: byte offset and track length of every record.
+    Only the 8 byte track length of each record is unpacked, the track itself is skipped."""
+    num_points = struct.unpack_from("<Q", buffer, 0)[0]
+    unpack_track_length = struct.Struct("<Q").unpack_from
+    track_length_offset = POINT3D_RECORD_DTYPE.itemsize - 8
+    offsets = []
+    offset = 8
+    for _ in range(num_points):
+        offsets.append(offset)
+        offset += POINT3D_RECORD_DTYPE.itemsize + 8 * unpack_track_length(buffer, offset + track_length_offset)[0]
+    return np.array(offsets, dtype=np.int64)
+
+
+def images_binary_offsets(buffer):
+    """Offset pass over images.bin.
+    :return: list of (record offset, name end offset, number of 2D points) in file order
+    """
+    num_reg_images = struct.unpack_from("<Q", buffer, 0)[0]
+    unpack_num_points2D = struct.Struct("<Q").unpack_from
+    records = []
+    offset = 8
+    for _ in range(num_reg_images):
+        name_end = buffer.find(b"\x00", offset + IMAGE_RECORD_DTYPE.itemsize)  # look for the ASCII 0 entry
+        num_points2D = unpack_num_points2D(buffer, name_end + 1)[0]
+        records.append((offset, name_end, num_points2D))
+        offset = name_end + 9 + POINT2D_DTYPE.itemsize * num_points2D
+    return records
+
+
+IMAGES_INDEX_VERSION = 1
+
+
+def images_binary_index_path(path_to_model_file):
+    """Sidecar index stored next to images.bin"""
+    return path_to_model_file + ".index.json"
+
+
+def build_images_binary_index(path_to_model_file, buffer=None):
+    """Index images.bin by image name: byte offset, record length and number of 2D points of every image.
+    The size and mtime of images.bin are recorded so that a stale index is detected and rebuilt.
+    """
+    if buffer is None:
+        buffer = map_binary_file(path_to_model_file)
+    stat = os.stat(path_to_model_file)
+    index = {"version": IMAGES_INDEX_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "images": {}}
+    for offset, name_end, num_points2D in images_binary_offsets(buffer):
+        image_name = bytes(buffer[offset + IMAGE_RECORD_DTYPE.itemsize:name_end]).decode("utf-8")
+        length = name_end + 9 + POINT2D_DTYPE.itemsize * num_points2D - offset
+        index["images"][image_name] = [offset, length, num_points2D]
+    return index
+
+
+def load_images_binary_index(path_to_model_file, buffer=None, rebuild=False):
+    """Load the sidecar index of images.bin, (re)building it once if it is missing or images.bin changed.
+    The index is written atomically, so concurrent partition processes never read a partial file.
+    :return: dict, image name -> [offset, length, num_points2D]
+    """
+    index_path = images_binary_index_path(path_to_model_file)
+    stat = os.stat(path_to_model_file)
+    if not rebuild:
+        try:
+            with open(index_path, "r", encoding="utf-8") as file:
+                index = json.load(file)
+            if (index["version"] == IMAGES_INDEX_VERSION and index["size"] == stat.st_size
+                    and index["mtime_ns"] == stat.st_mtime_ns):
+                return index["images"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = build_images_binary_index(path_to_model_file, buffer)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(index, file)
+        os.replace(tmp_path, index_path)
+    except OSError:  # 只读的数据目录，直接使用内存中的索引
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return index["images"]
+
+
+def points2D_from_buffer(buffer, num_points2D, offset=0):
+    """Decode (x, y, point3D_id) records, same shapes and dtypes as the original struct based reader"""
+    if num_points2D > 0:
+        points2D = np.frombuffer(buffer, dtype=POINT2D_DTYPE, count=num_points2D, offset=offset)
+        return np.ascontiguousarray(points2D["xy"]), points2D["point3D_id"].copy()
+    return np.empty((0, 2)), np.array(())  # same shapes as column_stack/array of empty tuples
+
+
+def parse_points2D_text(line):
+    """Decode a POINTS2D[] line of images.txt"""
+    elems = line.split()
+    if len(elems) == 0:
+        return np.empty((0, 2)), np.array(())
+    values = np.array(elems, dtype=np.float64).reshape(-1, 3)
+    point3D_ids = np.array(elems[2::3], dtype=np.int64)  # -1 for keypoints without 3D point
+    return np.ascontiguousarray(values[:, :2]), point3D_ids
+
+
+def decode_image_record(buffer, header, offset, name_end, num_points2D, keypoints="eager", path=None):
+    """Build an Image from a decoded header and its position in images.bin"""
+    image_name = bytes(buffer[offset + IMAGE_RECORD_DTYPE.itemsize:name_end]).decode("utf-8")
+    xys, point3D_ids = None, None
+    if keypoints == "eager":
+        xys, point3D_ids = points2D_from_buffer(buffer, num_points2D, offset=name_end + 9)
+    elif keypoints == "lazy":
+        xys = point3D_ids = LazyPoints2D(path=path, offset=name_end + 9, count=num_points2D)
+    return Image(
+        id=int(header["id"]), qvec=np.array(header["qvec"], dtype=np.float64),
+        tvec=np.array(header["tvec"], dtype=np.float64),
+        camera_id=int(header["camera_id"]), name=image_name,
+        xys=xys, point3D_ids=point3D_ids)
+
+
 def read_points3D_text(path):
     """
     see: src/base/reconstruction.cc
@@ -123,43 +323,32 @@ def read_points3D_text(path):
     return xyzs, rgbs, errors
 
 
-def read_extrinsics_binary_vast(path_to_model_file, lines):
+def index_record_matches(buffer, image_name, offset, length, num_points2D):
+    """Check that an index entry still points at the record of image_name"""
+    name_end = offset + length - 9 - POINT2D_DTYPE.itemsize * num_points2D
+    name = image_name.encode("utf-8")
+    return (0 <= offset and name_end + 9 <= len(buffer)
+            and buffer[offset + IMAGE_RECORD_DTYPE.itemsize:name_end + 1] == name + b"\x00")
+
+
+def read_extrinsics_binary_vast(path_to_model_file, lines, keypoints="lazy"):
+    """
+    Read only the images listed in lines, seeking straight to their records through the sidecar index of images.bin.
+    :param keypoints: "eager" decodes xys/point3D_ids, "lazy" decodes them on first access, "none" leaves them as None
+    """
+    check_keypoints_mode(keypoints)
     images = {}
-    with open(path_to_model_file, "rb") as fid:
-        num_reg_images = read_next_bytes(fid, 8, "Q")[0]
-        for _ in range(num_reg_images):
-            binary_image_properties = read_next_bytes(
-                fid, num_bytes=64, format_char_sequence="idddddddi")
-            image_id = binary_image_properties[0]
-
-            # Read the image name even if it is not needed
-            image_name = ""
-            current_char = read_next_bytes(fid, 1, "c")[0]
-            while current_char != b"\x00":  # look for the ASCII 0 entry
-                image_name += current_char.decode("utf-8")
-                current_char = read_next_bytes(fid, 1, "c")[0]
-
-            # Read the number of 2D points
-            num_points2D = read_next_bytes(fid, num_bytes=8, format_char_sequence="Q")[0]
-
-            # Read all 2D points data even if it is not needed
-            x_y_id_s = read_next_bytes(fid, num_bytes=24 * num_points2D, format_char_sequence="ddq" * num_points2D)
-
-            if image_name not in lines:
-                continue  # Continue to the next image after reading all data for the current image
-
-            qvec = np.array(binary_image_properties[1:5])
-            tvec = np.array(binary_image_properties[5:8])
-            camera_id = binary_image_properties[8]
-
-            xys = np.column_stack([tuple(map(float, x_y_id_s[0::3])),
-                                   tuple(map(float, x_y_id_s[1::3]))])
-            point3D_ids = np.array(tuple(map(int, x_y_id_s[2::3])))
-
-            images[image_id] = Image(
-                id=image_id, qvec=qvec, tvec=tvec,
-                camera_id=camera_id, name=image_name,
-                xys=xys, point3D_ids=point3D_ids)
+    buffer = map_binary_file(path_to_model_file)
+    lines = set(lines)
+    index = load_images_binary_index(path_to_model_file, buffer)
+    if not all(index_record_matches(buffer, name, *index[name]) for name in lines if name in index):
+        index = load_images_binary_index(path_to_model_file, buffer, rebuild=True)  # mtime/size未变但内容已改变
+    records = sorted(index[name] for name in lines if name in index)  # 保持images.bin中的顺序
+    headers = gather_records(buffer, [record[0] for record in records], IMAGE_RECORD_DTYPE)
+    for header, (offset, length, num_points2D) in zip(headers, records):
+        name_end = offset + length - 9 - POINT2D_DTYPE.itemsize * num_points2D
+        image = decode_image_record(buffer, header, offset, name_end, num_points2D, keypoints, path_to_model_file)
+        images[image.id] = image
     return images
 
 
@@ -198,30 +387,111 @@ def read_points3D_binary(path_to_model_file):
         void Reconstruction::ReadPoints3DBinary(const std::string& path)
         void Reconstruction::WritePoints3DBinary(const std::string& path)
     """
+    buffer = map_binary_file(path_to_model_file)
+    records = gather_records(buffer, points3D_binary_offsets(buffer), POINT3D_RECORD_DTYPE)
+    xyzs = records["xyz"].astype(np.float64)
+    rgbs = records["rgb"].astype(np.float64)
+    errors = records["error"].astype(np.float64)[:, None]
+    return xyzs, rgbs, errors
 
 
-    with open(path_to_model_file, "rb") as fid:
-        num_points = read_next_bytes(fid, 8, "Q")[0]
-
-        xyzs = np.empty((num_points, 3))
-        rgbs = np.empty((num_points, 3))
-        errors = np.empty((num_points, 1))
-
-        for p_id in range(num_points):
-            binary_point_line_properties = read_next_bytes(
-                fid, num_bytes=43, format_char_sequence="QdddBBBd")
-            xyz = np.array(binary_point_line_properties[1:4])
-            rgb = np.array(binary_point_line_properties[4:7])
-            error = np.array(binary_point_line_properties[7])
-            track_length = read_next_bytes(
-                fid, num_bytes=8, format_char_sequence="Q")[0]
-            track_elems = read_next_bytes(
-                fid, num_bytes=8*track_length,
-                format_char_sequence="ii"*track_length)
-            xyzs[p_id] = xyz
-            rgbs[p_id] = rgb
-            errors[p_id] = error
-    return xyzs, rgbs, errors
+def read_points3D_tracks_binary(path_to_model_file, xyz_rows=None):
+    """
+    Read the tracks of points3D.bin, in file order.
+    :param xyz_rows: optional point indices whose xyz is returned as well, e.g. to check that a ply matches the model
+    :return: track_offsets [N+1] (the track of point k is track_image_ids[track_offsets[k]:track_offsets[k+1]]),
+             track_image_ids [M] ids of the images observing each point,
+             and xyz [len(xyz_rows), 3] when xyz_rows is given (rows >= N are skipped)
+    """
+    buffer = map_binary_file(path_to_model_file)
+    offsets = points3D_binary_offsets(buffer)
+    xyz = None
+    if xyz_rows is not None:
+        xyz_rows = np.asarray(xyz_rows, dtype=np.int64)
+        xyz = gather_records(buffer, offsets[xyz_rows[xyz_rows < len(offsets)]], POINT3D_RECORD_DTYPE)["xyz"].astype(np.float64)
+    track_lengths = gather_records(buffer, offsets + POINT3D_RECORD_DTYPE.itemsize - 8,
+                                   np.dtype("<u8")).astype(np.int64)
+    track_offsets = np.zeros(len(offsets) + 1, dtype=np.int64)
+    np.cumsum(track_lengths, out=track_offsets[1:])
+    # byte offset of the image id of every (image_id, point2D_idx) track element
+    element_offsets = (np.repeat(offsets + POINT3D_RECORD_DTYPE.itemsize - track_offsets[:-1] * 8, track_lengths)
+                       + np.arange(track_offsets[-1], dtype=np.int64) * 8)
+    track_image_ids = gather_records(buffer, element_offsets, np.dtype("<i4")).astype(np.int32)
+    if xyz_rows is not None:
+        return track_offsets, track_image_ids, xyz
+    return track_offsets, track_image_ids
+
+
+def read_points3D_tracks_text(path, xyz_rows=None):
+    """
+    Text counterpart of read_points3D_tracks_binary.
+    """
+    wanted = set(int(row) for row in xyz_rows) if xyz_rows is not None else set()
+    xyz = {}
+    track_lengths = []
+    track_image_ids = []
+    with open(path, "r") as fid:
+        while True:
+            line = fid.readline()
+            if not line:
+                break
+            line = line.strip()
+            if len(line) > 0 and line[0] != "#":
+                elems = line.split()
+                if len(track_lengths) in wanted:
+                    xyz[len(track_lengths)] = tuple(map(float, elems[1:4]))
+                image_ids = np.array(tuple(map(int, elems[8::2])), dtype=np.int32)
+                track_lengths.append(len(image_ids))
+                track_image_ids.append(image_ids)
+    track_offsets = np.zeros(len(track_lengths) + 1, dtype=np.int64)
+    np.cumsum(track_lengths, out=track_offsets[1:])
+    track_image_ids = np.concatenate(track_image_ids) if track_image_ids else np.empty(0, dtype=np.int32)
+    if xyz_rows is not None:
+        xyz = np.array([xyz[int(row)] for row in xyz_rows if int(row) in xyz], dtype=np.float64).reshape(-1, 3)
+        return track_offsets, track_image_ids, xyz
+    return track_offsets, track_image_ids
+
+
+class ObservationIndex(NamedTuple):
+    """Point-to-image observations of a sparse model in CSR layout, grouped by image:
+    the points observed by image_names[i] are point_indices[offsets[i]:offsets[i+1]]."""
+    image_names: list
+    offsets: np.ndarray
+    point_indices: np.ndarray
+    name_to_index: dict
+
+    def points_of(self, image_name):
+        idx = self.name_to_index.get(image_name)
+        if idx is None:
+            return np.empty(0, dtype=self.point_indices.dtype)
+        return self.point_indices[self.offsets[idx]:self.offsets[idx + 1]]
+
+
+def build_observation_index(track_offsets, track_image_ids, image_id_to_name, point_rows=None):
+    """Build an ObservationIndex from the tracks of points3D.
+    :param image_id_to_name: {colmap image id: image name}
+    :param point_rows: [N] row of each points3D entry in the point cloud actually used, -1 if the point was dropped.
+                       Defaults to the file order.
+    """
+    num_points = len(track_offsets) - 1
+    if point_rows is None:
+        point_rows = np.arange(num_points, dtype=np.int64)
+    obs_points = np.repeat(np.asarray(point_rows, dtype=np.int64), np.diff(track_offsets))
+
+    image_ids = np.array(sorted(image_id_to_name), dtype=np.int64)
+    image_names = [image_id_to_name[image_id] for image_id in image_ids]
+    obs_images = np.searchsorted(image_ids, track_image_ids)
+    known = obs_images < len(image_ids)
+    known[known] = image_ids[obs_images[known]] == track_image_ids[known]
+    keep = known & (obs_points >= 0)
+    obs_images, obs_points = obs_images[keep], obs_points[keep]
+
+    order = np.argsort(obs_images, kind="stable")
+    offsets = np.zeros(len(image_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(obs_images, minlength=len(image_ids)), out=offsets[1:])
+    return ObservationIndex(image_names=image_names, offsets=offsets, point_indices=obs_points[order],
+                            name_to_index={name: idx for idx, name in enumerate(image_names)})
+
 
 def read_intrinsics_text(path):
     """
@@ -247,38 +517,21 @@ def read_intrinsics_text(path):
                                             params=params)
     return cameras
 
-def read_extrinsics_binary(path_to_model_file):
+def read_extrinsics_binary(path_to_model_file, keypoints="eager"):
     """
     see: src/base/reconstruction.cc
         void Reconstruction::ReadImagesBinary(const std::string& path)
         void Reconstruction::WriteImagesBinary(const std::string& path)
+    :param keypoints: "eager" decodes xys/point3D_ids, "lazy" decodes them on first access, "none" leaves them as None
     """
+    check_keypoints_mode(keypoints)
     images = {}
-    with open(path_to_model_file, "rb") as fid:
-        num_reg_images = read_next_bytes(fid, 8, "Q")[0]
-        for _ in range(num_reg_images):
-            binary_image_properties = read_next_bytes(
-                fid, num_bytes=64, format_char_sequence="idddddddi")
-            image_id = binary_image_properties[0]
-            qvec = np.array(binary_image_properties[1:5])
-            tvec = np.array(binary_image_properties[5:8])
-            camera_id = binary_image_properties[8]
-            image_name = ""
-            current_char = read_next_bytes(fid, 1, "c")[0]
-            while current_char != b"\x00":   # look for the ASCII 0 entry
-                image_name += current_char.decode("utf-8")
-                current_char = read_next_bytes(fid, 1, "c")[0]
-            num_points2D = read_next_bytes(fid, num_bytes=8,
-                                           format_char_sequence="Q")[0]
-            x_y_id_s = read_next_bytes(fid, num_bytes=24*num_points2D,
-                                       format_char_sequence="ddq"*num_points2D)
-            xys = np.column_stack([tuple(map(float, x_y_id_s[0::3])),
-                                   tuple(map(float, x_y_id_s[1::3]))])
-            point3D_ids = np.array(tuple(map(int, x_y_id_s[2::3])))
-            images[image_id] = Image(
-                id=image_id, qvec=qvec, tvec=tvec,
-                camera_id=camera_id, name=image_name,
-                xys=xys, point3D_ids=point3D_ids)
+    buffer = map_binary_file(path_to_model_file)
+    records = images_binary_offsets(buffer)
+    headers = gather_records(buffer, [record[0] for record in records], IMAGE_RECORD_DTYPE)
+    for header, (offset, name_end, num_points2D) in zip(headers, records):
+        image = decode_image_record(buffer, header, offset, name_end, num_points2D, keypoints, path_to_model_file)
+        images[image.id] = image
     return images
 
 
@@ -311,10 +564,12 @@ def read_intrinsics_binary(path_to_model_file):
     return cameras
 
 
-def read_extrinsics_text(path):
+def read_extrinsics_text(path, keypoints="eager"):
     """
     Taken from https://github.com/colmap/colmap/blob/dev/scripts/python/read_write_model.py
+    :param keypoints: "eager" decodes xys/point3D_ids, "lazy" decodes them on first access, "none" leaves them as None
     """
+    check_keypoints_mode(keypoints)
     images = {}
     with open(path, "r") as fid:
         while True:
@@ -329,10 +584,13 @@ def read_extrinsics_text(path):
                 tvec = np.array(tuple(map(float, elems[5:8])))
                 camera_id = int(elems[8])
                 image_name = elems[9]
-                elems = fid.readline().split()
-                xys = np.column_stack([tuple(map(float, elems[0::3])),
-                                       tuple(map(float, elems[1::3]))])
-                point3D_ids = np.array(tuple(map(int, elems[2::3])))
+                points2D_offset = fid.tell()
+                points2D_line = fid.readline()
+                xys, point3D_ids = None, None
+                if keypoints == "eager":
+                    xys, point3D_ids = parse_points2D_text(points2D_line)
+                elif keypoints == "lazy":
+                    xys = point3D_ids = LazyPoints2D(path, points2D_offset, text=True)
                 images[image_id] = Image(
                     id=image_id, qvec=qvec, tvec=tvec,
                     camera_id=camera_id, name=image_name,
@@ -15,15 +15,18 @@ from PIL import Image
 from typing import NamedTuple
 from scene.colmap_loader import read_extrinsics_text, read_intrinsics_text, qvec2rotmat, \
     read_extrinsics_binary, read_intrinsics_binary, read_points3D_binary, read_points3D_text, \
-    read_extrinsics_binary_vast, read_intrinsics_binary_vast
+    read_extrinsics_binary_vast, read_intrinsics_binary_vast, read_points3D_tracks_binary, read_points3D_tracks_text, \
+    build_observation_index, ObservationIndex, load_images_binary_index
 from utils.graphics_utils import getWorld2View2, focal2fov, fov2focal
 import numpy as np
 import json
 from pathlib import Path
-from plyfile import PlyData, PlyElement
+from utils.ply_utils import read_ply, write_ply, write_ply_chunks, columns
 from utils.sh_utils import SH2RGB
 from utils.partition_utils import read_camList
 from scene.gaussian_model import BasicPointCloud
+from scene.scene_cache import scene_cache_path, save_scene_cache, load_scene_cache, save_point_subset, \
+    load_point_subset, POINT_KEYS
 
 class CameraInfo(NamedTuple):
     uid: int
@@ -43,6 +46,7 @@ class SceneInfo(NamedTuple):
     test_cameras: list
     nerf_normalization: dict
     ply_path: str
+    observation_index: ObservationIndex = None  # 稀疏模型中每张图片观测到的点，只在分块时按需加载
 
 def getNerfppNorm(cam_info):
     def get_center_and_diag(cam_centers):
@@ -247,9 +251,16 @@ def readColmapCamerasEval(cam_extrinsics, cam_intrinsics, images_folder, man_tra
     return cam_infos
 
 def fetchPly(path, man_trans=None):
-    plydata = PlyData.read(path)
-    vertices = plydata['vertex']  # 提取点云的顶点
-    positions = np.vstack([vertices['x'], vertices['y'], vertices['z']]).T  # 将x,y,z这三个坐标属性堆叠在一起
+    return alignVertices(read_ply(path), man_trans)  # 提取点云的顶点，映射到文件的结构化数组
+
+def fetchPlyChunks(path, man_trans=None, chunk_size=1 << 20):
+    """分块读取点云，每次返回chunk_size个点，与fetchPly的结果逐点相同，峰值内存只与chunk_size有关，至少返回一块"""
+    vertices = read_ply(path)
+    for start in range(0, max(vertices.shape[0], 1), chunk_size):
+        yield alignVertices(vertices[start:start + chunk_size], man_trans)
+
+def alignVertices(vertices, man_trans=None):
+    positions = np.array(columns(vertices, ['x', 'y', 'z']))  # 将x,y,z这三个坐标属性堆叠在一起
     # print(positions.shape)
     if man_trans is not None:  # 曼哈顿对齐
         man_trans_R = man_trans[:3, :3]
@@ -257,38 +268,35 @@ def fetchPly(path, man_trans=None):
         new_positions = np.dot(man_trans_R, positions.transpose()) + np.repeat(man_trans_T, positions.shape[0]).reshape(
             -1, positions.shape[0])
         positions = new_positions.transpose()
-    colors = np.vstack(
-        [vertices['red'], vertices['green'], vertices['blue']]).T / 255.0  # 将R,G,B三个颜色属性堆叠在一起，并除以255进行归一化
-    normals = np.vstack([vertices['nx'], vertices['ny'], vertices['nz']]).T  # 提取顶点的三个法向量属性，并堆叠在一起
+    colors = columns(vertices, ['red', 'green', 'blue']) / 255.0  # 将R,G,B三个颜色属性堆叠在一起，并除以255进行归一化
+    normals = np.array(columns(vertices, ['nx', 'ny', 'nz']))  # 提取顶点的三个法向量属性，并堆叠在一起
     return BasicPointCloud(points=positions, colors=colors, normals=normals)
 
-def storePly(path, xyz, rgb):
-    # Define the dtype for the structured array
-    dtype = [('x', 'f4'), ('y', 'f4'), ('z', 'f4'),
-            ('nx', 'f4'), ('ny', 'f4'), ('nz', 'f4'),
-            ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
-    
-    normals = np.zeros_like(xyz)
+def point_attributes(xyz, rgb):
+    xyz = np.asarray(xyz).reshape(-1, 3)
+    return [(['x', 'y', 'z'], xyz.astype(np.float32)),
+            (['nx', 'ny', 'nz'], np.zeros(xyz.shape, dtype=np.float32)),
+            (['red', 'green', 'blue'], np.asarray(rgb).reshape(-1, 3).astype(np.uint8))]
 
-    elements = np.empty(xyz.shape[0], dtype=dtype)
-    attributes = np.concatenate((xyz, normals, rgb), axis=1)
-    elements[:] = list(map(tuple, attributes))
+def storePly(path, xyz, rgb):
+    write_ply(path, point_attributes(xyz, rgb))
 
-    # Create the PlyData object and write to file
-    vertex_element = PlyElement.describe(elements, 'vertex')
-    ply_data = PlyData([vertex_element])
-    ply_data.write(path)
+def storePlyIndices(path, xyz, rgb, indices, chunk_size=1 << 20):
+    """将点云中indices对应的点分块写入，xyz/rgb可以是memmap，峰值内存只与chunk_size有关"""
+    chunks = (point_attributes(xyz[indices[start:start + chunk_size]], rgb[indices[start:start + chunk_size]])
+              for start in range(0, max(len(indices), 1), chunk_size))
+    write_ply_chunks(path, chunks, len(indices))
 
 def readColmapSceneInfo(path, images, eval, llffhold=83):
     try:
         cameras_extrinsic_file = os.path.join(path, "sparse/0", "images.bin")
         cameras_intrinsic_file = os.path.join(path, "sparse/0", "cameras.bin")
-        cam_extrinsics = read_extrinsics_binary(cameras_extrinsic_file)
+        cam_extrinsics = read_extrinsics_binary(cameras_extrinsic_file, keypoints="lazy")
         cam_intrinsics = read_intrinsics_binary(cameras_intrinsic_file)
     except:
         cameras_extrinsic_file = os.path.join(path, "sparse/0", "images.txt")
         cameras_intrinsic_file = os.path.join(path, "sparse/0", "cameras.txt")
-        cam_extrinsics = read_extrinsics_text(cameras_extrinsic_file)
+        cam_extrinsics = read_extrinsics_text(cameras_extrinsic_file, keypoints="lazy")
         cam_intrinsics = read_intrinsics_text(cameras_intrinsic_file)
 
     reading_dir = "images" if images == None else images
@@ -327,7 +335,7 @@ def readColmapSceneInfo(path, images, eval, llffhold=83):
     return scene_info
 
 
-def readColmapSceneInfoVast(path, model_path, partition_id, images, eval, man_trans, llffhold=83):
+def readColmapSceneInfoVast(path, model_path, partition_id, images, eval, man_trans, llffhold=83, cache_dir=""):
     # Read the point cloud for each partition, as well as the corresponding cameras
     # Read information for all images, including camera intrinsic and extrinsic parameters, and 3D point cloud coordinates
     client_camera_txt_path = os.path.join(model_path, f"{partition_id}_camera.txt")
@@ -335,16 +343,25 @@ def readColmapSceneInfoVast(path, model_path, partition_id, images, eval, man_tr
         lines = file.readlines()
     lines = [line.strip() for line in lines]
 
-    cameras_extrinsic_file = os.path.join(path, "sparse/0", "images.bin")
-    cameras_intrinsic_file = os.path.join(path, "sparse/0", "cameras.bin")
-    cam_extrinsics = read_extrinsics_binary_vast(cameras_extrinsic_file, lines)
-    cam_intrinsics = read_intrinsics_binary_vast(cameras_intrinsic_file, lines)
-
     images_dir = os.path.join(path, "images")
-    cam_infos_unsorted = readColmapCameras(cam_extrinsics=cam_extrinsics, cam_intrinsics=cam_intrinsics,
-                                           images_folder=images_dir,
-                                           man_trans=man_trans)  # 存储所有图片的 相机模型id，旋转矩阵 平移向量，视角场，图片数据，图片路径，图片名，图片宽高
-    cam_infos = sorted(cam_infos_unsorted.copy(), key=lambda x: x.image_name)  # 根据图片名称对 list进行排序
+    try:
+        cached = load_scene_cache(scene_cache_path(path, man_trans, cache_dir), load_points=False)
+    except OSError:
+        cached = None
+    if cached is not None:
+        # 分块时已经缓存了对齐后的相机，直接按图片名取出该partition的相机
+        image_names = set(line.split(".")[0] for line in lines)
+        cam_infos = cameraInfos_from_arrays(cached[0], images_dir, image_names, open_images=True)
+    else:
+        cameras_extrinsic_file = os.path.join(path, "sparse/0", "images.bin")
+        cameras_intrinsic_file = os.path.join(path, "sparse/0", "cameras.bin")
+        cam_extrinsics = read_extrinsics_binary_vast(cameras_extrinsic_file, lines)
+        cam_intrinsics = read_intrinsics_binary_vast(cameras_intrinsic_file, lines)
+
+        cam_infos_unsorted = readColmapCameras(cam_extrinsics=cam_extrinsics, cam_intrinsics=cam_intrinsics,
+                                               images_folder=images_dir,
+                                               man_trans=man_trans)  # 存储所有图片的 相机模型id，旋转矩阵 平移向量，视角场，图片数据，图片路径，图片名，图片宽高
+        cam_infos = sorted(cam_infos_unsorted.copy(), key=lambda x: x.image_name)  # 根据图片名称对 list进行排序
 
     if eval:
         train_cam_infos = [c for idx, c in enumerate(cam_infos) if idx % llffhold != 0]
@@ -370,12 +387,12 @@ def readColmapSceneInfoEval(path, images, man_trans, model_path):
     try:
         cameras_extrinsic_file = os.path.join(path, "sparse/0", "images.bin")
         cameras_intrinsic_file = os.path.join(path, "sparse/0", "cameras.bin")
-        cam_extrinsics = read_extrinsics_binary(cameras_extrinsic_file)
+        cam_extrinsics = read_extrinsics_binary(cameras_extrinsic_file, keypoints="lazy")
         cam_intrinsics = read_intrinsics_binary(cameras_intrinsic_file)
     except:
         cameras_extrinsic_file = os.path.join(path, "sparse/0", "images.txt")
         cameras_intrinsic_file = os.path.join(path, "sparse/0", "cameras.txt")
-        cam_extrinsics = read_extrinsics_text(cameras_extrinsic_file)
+        cam_extrinsics = read_extrinsics_text(cameras_extrinsic_file, keypoints="lazy")
         cam_intrinsics = read_intrinsics_text(cameras_intrinsic_file)
 
     images_dir = os.path.join(path, "images")
@@ -398,26 +415,213 @@ def readColmapSceneInfoEval(path, images, man_trans, model_path):
     return scene_info
 
 
-def partition(path, images, man_trans, eval, llffhold=83):
-    # 读取整个场景的点云和相机参数，用于分块
+def readObservationIndex(path, num_points, keep_indices, num_check_rows=64):
+    """读取points3D中每个点的track，建立图片->点云中点的索引
+    :param num_points: points3D.ply 中点的数量，points3D.ply由points3D.bin按顺序转换而来
+    :param keep_indices: 点云过滤后保留的点的索引，升序排列
+    :param num_check_rows: 比较ply与稀疏模型中均匀分布的若干个点(包括第一个和最后一个)的坐标，
+                           点数相同但顺序或内容不同的ply(如重新生成或用户提供的点云)不能使用track
+    """
+    check_rows = np.unique(np.linspace(0, max(num_points - 1, 0), min(num_points, num_check_rows)).astype(np.int64))
+    try:
+        track_offsets, track_image_ids, model_xyz = read_points3D_tracks_binary(
+            os.path.join(path, "sparse/0/points3D.bin"), check_rows)
+        cam_extrinsics = read_extrinsics_binary(os.path.join(path, "sparse/0/images.bin"), keypoints="none")
+    except:
+        track_offsets, track_image_ids, model_xyz = read_points3D_tracks_text(
+            os.path.join(path, "sparse/0/points3D.txt"), check_rows)
+        cam_extrinsics = read_extrinsics_text(os.path.join(path, "sparse/0/images.txt"), keypoints="none")
+    if len(track_offsets) - 1 != num_points:
+        print("[ INFO ] points3D.ply does not match the sparse model, track based point selection is disabled.")
+        return None
+    ply_xyz = columns(read_ply(os.path.join(path, "sparse/0/points3D.ply"))[check_rows], ['x', 'y', 'z'])
+    if not np.array_equal(ply_xyz, model_xyz.astype(ply_xyz.dtype)):  # ply中的坐标由稀疏模型的坐标转换类型得到
+        print("[ INFO ] points3D.ply has the same number of points as the sparse model but different coordinates, "
+              "track based point selection is disabled.")
+        return None
+
+    point_rows = np.full(num_points, -1, dtype=np.int64)  # 原始点在过滤后点云中的行号，被过滤的点为-1
+    point_rows[keep_indices] = np.arange(len(keep_indices))
+    image_id_to_name = {extr.id: os.path.basename(extr.name).split(".")[0] for extr in cam_extrinsics.values()}
+    return build_observation_index(track_offsets, track_image_ids, image_id_to_name, point_rows)
+
+
+def ensurePointsPly(path):
+    """返回稀疏模型的点云 sparse/0/points3D.ply，不存在时由points3D.bin(或points3D.txt)转换得到"""
+    ply_path = os.path.join(path, "sparse/0/points3D.ply")
+    bin_path = os.path.join(path, "sparse/0/points3D.bin")
+    txt_path = os.path.join(path, "sparse/0/points3D.txt")
+    if not os.path.exists(ply_path):
+        print(
+            "Converting point3d.bin to .ply, will happen only the first time you open the scene.")  # 将point3d.bin转换为.ply，只会在您第一次打开场景时发生。
+        try:
+            xyz, rgb, _ = read_points3D_binary(bin_path)
+        except:
+            xyz, rgb, _ = read_points3D_text(txt_path)
+        storePly(ply_path, xyz, rgb)
+    return ply_path
+
+
+def readAlignedScene(path, man_trans, cache_dir="", point_chunk_size=0):
+    """读取整个场景曼哈顿对齐后的相机与点云，优先从场景缓存中读取
+    :param point_chunk_size: >0时分块读取ply并写入缓存，返回映射到缓存文件的点云，峰值内存只与point_chunk_size有关
+    :return: 按图片名排序的 CameraInfo 列表(不加载图片), 对齐后的点云
+    """
+    images_folder = os.path.join(path, "images")
+    ply_path = ensurePointsPly(path)  # points3D.ply参与缓存的哈希，需要在计算缓存路径之前生成
+    try:
+        cache_path = scene_cache_path(path, man_trans, cache_dir)
+    except OSError:  # 缓存目录不可写，不使用缓存
+        cache_path = None
+    cached = load_scene_cache(cache_path) if cache_path is not None else None
+    if cached is not None:
+        print(f"Loading aligned scene from cache {cache_path}")
+        cameras, point_cloud = cached
+        return cameraInfos_from_arrays(cameras, images_folder), BasicPointCloud(**point_cloud)
+
     # 读取所有图像的信息，包括相机内外参数，以及3D点云坐标
     try:
         cameras_extrinsic_file = os.path.join(path, "sparse/0", "images.bin")  # 相机外参文件
         cameras_intrinsic_file = os.path.join(path, "sparse/0", "cameras.bin")  # 相机内参文件
-        cam_extrinsics = read_extrinsics_binary(cameras_extrinsic_file)  # 读取相机外参
+        cam_extrinsics = read_extrinsics_binary(cameras_extrinsic_file, keypoints="lazy")  # 读取相机外参
         cam_intrinsics = read_intrinsics_binary(cameras_intrinsic_file)  # 读取相机内参
+        load_images_binary_index(cameras_extrinsic_file)  # 建立images.bin的索引，各partition进程加载相机时直接定位到对应的记录
     except:
         cameras_extrinsic_file = os.path.join(path, "sparse/0", "images.txt")
         cameras_intrinsic_file = os.path.join(path, "sparse/0", "cameras.txt")
-        cam_extrinsics = read_extrinsics_text(cameras_extrinsic_file)
+        cam_extrinsics = read_extrinsics_text(cameras_extrinsic_file, keypoints="lazy")
         cam_intrinsics = read_intrinsics_text(cameras_intrinsic_file)
 
-    reading_dir = os.path.join(path, "images")
     cam_infos_unsorted = readColmapCamerasPartition(cam_extrinsics=cam_extrinsics, cam_intrinsics=cam_intrinsics,
-                                                    images_folder=reading_dir,
+                                                    images_folder=images_folder,
                                                     man_trans=man_trans)  # 存储所有图片的 相机模型id，旋转矩阵 平移向量，视角场，图片数据，图片路径，图片名，图片宽高
     cam_infos = sorted(cam_infos_unsorted.copy(), key=lambda x: x.image_name)  # 根据图片名称对 list进行排序
 
+    # 将3D点云数据写入 scene_info中
+    if cache_path is not None and point_chunk_size > 0:
+        try:
+            save_scene_cache(cache_path, cameraInfos_to_arrays(cam_infos), read_ply(ply_path).shape[0],
+                             (pcd._asdict() for pcd in fetchPlyChunks(ply_path, man_trans, point_chunk_size)))
+            return cam_infos, BasicPointCloud(**load_scene_cache(cache_path)[1])
+        except OSError as e:
+            print(f"[ WARNING ] Failed to write scene cache {cache_path}: {e}")
+            cache_path = None
+    pcd = fetchPly(ply_path, man_trans=man_trans)  # 得到稀疏点云中，各个3D点的属性信息
+
+    if cache_path is not None:
+        try:
+            save_scene_cache(cache_path, cameraInfos_to_arrays(cam_infos), pcd.points.shape[0], [pcd._asdict()])
+        except OSError as e:
+            print(f"[ WARNING ] Failed to write scene cache {cache_path}: {e}")
+    return cam_infos, pcd
+
+
+def cameraInfos_to_arrays(cam_infos):
+    """将 CameraInfo 列表转换为数组，用于保存场景缓存"""
+    return {
+        "uid": np.array([cam.uid for cam in cam_infos], dtype=np.int64),
+        "R": np.array([cam.R for cam in cam_infos], dtype=np.float64).reshape(-1, 3, 3),
+        "T": np.array([cam.T for cam in cam_infos], dtype=np.float64).reshape(-1, 3),
+        "FovY": np.array([cam.FovY for cam in cam_infos], dtype=np.float64),
+        "FovX": np.array([cam.FovX for cam in cam_infos], dtype=np.float64),
+        "width": np.array([cam.width for cam in cam_infos], dtype=np.int64),
+        "height": np.array([cam.height for cam in cam_infos], dtype=np.int64),
+        "image_name": np.array([cam.image_name for cam in cam_infos], dtype=str),
+        "image_file": np.array([os.path.basename(cam.image_path) for cam in cam_infos], dtype=str),
+    }
+
+
+def cameraInfos_from_arrays(cameras, images_folder, image_names=None, open_images=False):
+    """由场景缓存中的数组恢复 CameraInfo 列表
+    :param image_names: 只恢复这些图片对应的相机，为None时恢复所有相机
+    :param open_images: 是否打开图片(PIL延迟读取像素)，与readColmapCameras保持一致
+    """
+    cam_infos = []
+    for idx in range(len(cameras["uid"])):
+        image_name = str(cameras["image_name"][idx])
+        if image_names is not None and image_name not in image_names:
+            continue
+        image_path = os.path.join(images_folder, str(cameras["image_file"][idx]))
+        cam_infos.append(CameraInfo(uid=int(cameras["uid"][idx]), R=cameras["R"][idx], T=cameras["T"][idx],
+                                    FovY=float(cameras["FovY"][idx]), FovX=float(cameras["FovX"][idx]),
+                                    image=Image.open(image_path) if open_images else None,
+                                    image_path=image_path, image_name=image_name,
+                                    width=int(cameras["width"][idx]), height=int(cameras["height"][idx])))
+    return cam_infos
+
+
+def chunkedPercentile(values, q, chunk_size, num_bins=4096, max_passes=64):
+    """与np.percentile(values, q)(线性插值)相同的分位数，分块读取values(如映射到文件的点云的一列)，峰值内存只与chunk_size有关
+    思路: 维护包含目标排名的两个值的区间 [low, high)，每次读取所有块，统计区间内num_bins个阈值以下的值的数量，
+         将区间缩小到目标排名所在的两个阈值之间，直到区间内的值不超过chunk_size个(或所有值相同)，再读入区间内的值并排序
+    """
+    num_values = values.shape[0]
+    chunks = lambda: (np.asarray(values[start:start + chunk_size]) for start in range(0, num_values, chunk_size))
+    index = (num_values - 1) * np.true_divide(q, 100)
+    rank_low = int(np.floor(index))
+    rank_high = min(rank_low + 1, num_values - 1)
+    bounds = [(chunk.min(), chunk.max()) for chunk in chunks()]
+    low = min(bound[0] for bound in bounds)
+    high = np.nextafter(max(bound[1] for bound in bounds), np.inf)
+    below, inside = 0, num_values  # 小于low的值的数量，区间内的值的数量
+    for _ in range(max_passes):
+        if inside <= chunk_size:
+            break
+        thresholds = np.unique(np.linspace(low, high, num_bins + 1))
+        counts = np.zeros(len(thresholds) + 1, dtype=np.int64)
+        for chunk in chunks():
+            counts += np.bincount(np.searchsorted(thresholds, chunk, side="right"), minlength=len(thresholds) + 1)
+        less = np.cumsum(counts)[:-1]  # 小于每个阈值的值的数量
+        start = np.searchsorted(less, rank_low, side="right") - 1
+        end = np.searchsorted(less, rank_high, side="right")
+        if (thresholds[start], thresholds[end]) == (low, high):
+            break  # 区间内的值都相同，无法继续缩小
+        low, high = thresholds[start], thresholds[end]
+        below, inside = int(less[start]), int(less[end] - less[start])
+    selected = np.sort(np.concatenate([chunk[(chunk >= low) & (chunk < high)] for chunk in chunks()]))
+    # 用numpy对两个值进行插值，与np.percentile的结果完全相同
+    return np.quantile(selected[[rank_low - below, rank_high - below]], float(index - rank_low))
+
+
+def filterPointCloud(pcd, dist_threshold, point_chunk_size=0, subset_path=None):
+    """去除y坐标不低于dist_threshold分位数的离群点
+    point_chunk_size>0时分块计算分位数，并将保留的点分块写入subset_path(场景缓存中的目录，已存在时直接读取)，
+    返回映射到文件的点云，峰值内存只与point_chunk_size有关，结果与整体过滤相同
+    :return: 过滤后的点云, 保留的点在原点云中的索引(升序)
+    """
+    if point_chunk_size > 0 and subset_path is not None:
+        subset = load_point_subset(subset_path)
+        if subset is None:
+            points = pcd.points
+            threshold = chunkedPercentile(points[:, 1], dist_threshold, point_chunk_size)
+            starts = range(0, max(points.shape[0], 1), point_chunk_size)
+            keep = lambda start: np.nonzero(np.asarray(points[start:start + point_chunk_size, 1]) < threshold)[0]
+            num_kept = sum(len(keep(start)) for start in starts)
+            chunks = ({"points": np.asarray(points[start:start + point_chunk_size])[kept],
+                       "colors": np.asarray(pcd.colors[start:start + point_chunk_size])[kept],
+                       "normals": np.asarray(pcd.normals[start:start + point_chunk_size])[kept],
+                       "indices": kept + start} for start, kept in ((start, keep(start)) for start in starts))
+            try:
+                save_point_subset(subset_path, num_kept, chunks, dist_threshold=dist_threshold,
+                                  threshold=float(threshold))
+                subset = load_point_subset(subset_path)
+            except OSError as e:
+                print(f"[ WARNING ] Failed to write filtered point cloud {subset_path}: {e}")
+        if subset is not None:
+            return BasicPointCloud(**{key: subset[key] for key in POINT_KEYS}), subset["indices"]
+
+    points, colors, normals = pcd.points, pcd.colors, pcd.normals
+    points_threshold = np.percentile(points[:, 1], dist_threshold)  # use dist_ratio to exclude outliers
+
+    keep_mask = points[:, 1] < points_threshold
+    return (BasicPointCloud(points=points[keep_mask], colors=colors[keep_mask], normals=normals[keep_mask]),
+            np.nonzero(keep_mask)[0])
+
+
+def partition(path, images, man_trans, eval, llffhold=83, load_tracks=False, cache_dir="", point_chunk_size=0):
+    # 读取整个场景的点云和相机参数，用于分块
+    cam_infos, pcd = readAlignedScene(path, man_trans, cache_dir, point_chunk_size)
+
     if eval:
         train_cam_infos = [c for idx, c in enumerate(cam_infos) if idx % llffhold != 0]
         test_cam_infos = [c for idx, c in enumerate(cam_infos) if idx % llffhold == 0]
@@ -426,35 +630,29 @@ def partition(path, images, man_trans, eval, llffhold=83):
         test_cam_infos = []
 
     nerf_normalization = getNerfppNorm(train_cam_infos)  # 使用找到在世界坐标系下相机的几何中心
-    # 将3D点云数据写入 scene_info中
     ply_path = os.path.join(path, "sparse/0/points3D.ply")
-    bin_path = os.path.join(path, "sparse/0/points3D.bin")
-    txt_path = os.path.join(path, "sparse/0/points3D.txt")
-    if not os.path.exists(ply_path):
-        print(
-            "Converting point3d.bin to .ply, will happen only the first time you open the scene.")  # 将point3d.bin转换为.ply，只会在您第一次打开场景时发生。
-        try:
-            xyz, rgb, _ = read_points3D_binary(bin_path)
-        except:
-            xyz, rgb, _ = read_points3D_text(txt_path)
-        storePly(ply_path, xyz, rgb)
-    pcd = fetchPly(ply_path, man_trans=man_trans)  # 得到稀疏点云中，各个3D点的属性信息
 
     dist_threshold = 99
-    points, colors, normals = pcd.points, pcd.colors, pcd.normals
-    points_threshold = np.percentile(points[:, 1], dist_threshold)  # use dist_ratio to exclude outliers
+    num_points = pcd.points.shape[0]
+    subset_path = None
+    if point_chunk_size > 0:
+        try:
+            subset_path = os.path.join(scene_cache_path(path, man_trans, cache_dir), f"y_below_p{dist_threshold}")
+        except OSError:  # 缓存目录不可写，在内存中过滤
+            subset_path = None
+    pcd, keep_indices = filterPointCloud(pcd, dist_threshold, point_chunk_size, subset_path)
 
-    colors = colors[points[:, 1] < points_threshold]
-    normals = normals[points[:, 1] < points_threshold]
-    points = points[points[:, 1] < points_threshold]
-    pcd = BasicPointCloud(points=points, colors=colors, normals=normals)
+    observation_index = None
+    if load_tracks:
+        observation_index = readObservationIndex(path, num_points, keep_indices)
 
     # print(pcd)
     scene_info = SceneInfo(point_cloud=pcd,
                            train_cameras=train_cam_infos,
                            test_cameras=test_cam_infos,
                            nerf_normalization=nerf_normalization,
-                           ply_path=ply_path)  # 保存一个场景的所有参数信息
+                           ply_path=ply_path,
+                           observation_index=observation_index)  # 保存一个场景的所有参数信息
     return scene_info
 
 
@@ -0,0 +1,101 @@
+# Author: Peilun Kang
+# Contact: kangpeilun@nefu.edu.cn
+# License: Apache Licence
+# Project: VastGaussian
+# File: scene_cache.py
+# Time: 10/17/26 2:35 PM
+# Des: 解析并曼哈顿对齐后的场景缓存
+"""
+分块以及每个partition的训练进程都需要读取COLMAP稀疏模型并进行曼哈顿对齐，
+这里将对齐后的相机参数(R, T, FoV, 宽高, 图片名)和点云以npz/npy的形式缓存下来，
+缓存目录由稀疏模型文件(包括点云来源points3D.ply)的内容哈希与曼哈顿变换矩阵决定，输入改变时自动使用新的缓存，
+点云以npy保存，读取时使用memmap，子进程可以在毫秒级完成加载，
+分块处理大点云时，点云与分块使用的过滤后的点云都分块写入缓存，不需要在内存中保存整个点云
+"""
+import os
+import hashlib
+
+import numpy as np
+
+from utils.cache_utils import file_digest, array_digest, atomic_save_json, atomic_save_npy_chunks, atomic_write, \
+    load_json
+
+SCENE_CACHE_VERSION = 1
+# points3D.ply是缓存点云的来源，可能被替换为其他点云(如融合了LiDAR的点云)，因此也参与哈希
+SPARSE_FILES = ["cameras.bin", "images.bin", "points3D.bin", "cameras.txt", "images.txt", "points3D.txt", "points3D.ply"]
+CAMERA_KEYS = ["uid", "R", "T", "FovY", "FovX", "width", "height", "image_name", "image_file"]
+POINT_KEYS = ["points", "colors", "normals"]
+SUBSET_KEYS = POINT_KEYS + ["indices"]  # 过滤后的点云以及保留的点在缓存点云中的索引
+
+
+def get_cache_dir(source_path, cache_dir=""):
+    return cache_dir if cache_dir else os.path.join(source_path, "cache")
+
+
+def scene_cache_path(source_path, man_trans, cache_dir=""):
+    """场景缓存的目录，由稀疏模型文件的内容与曼哈顿变换矩阵(由pos/rot/plantform得到)决定
+    train/test的划分在读取缓存后根据llffhold得到，因此不参与哈希
+    """
+    cache_dir = get_cache_dir(source_path, cache_dir)
+    sparse_dir = os.path.join(source_path, "sparse/0")
+    memo_path = os.path.join(cache_dir, "digests.json")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    key = hashlib.sha1(f"scene-v{SCENE_CACHE_VERSION}".encode("utf-8"))
+    for file_name in SPARSE_FILES:
+        file_path = os.path.join(sparse_dir, file_name)
+        if os.path.exists(file_path):
+            key.update(f"{file_name}:{file_digest(file_path, memo_path)}".encode("utf-8"))
+    key.update(array_digest(man_trans).encode("utf-8"))
+    return os.path.join(cache_dir, f"scene_{key.hexdigest()[:16]}")
+
+
+def save_scene_cache(cache_path, cameras, num_points, point_chunks):
+    """
+    :param cameras: dict, CAMERA_KEYS -> 按图片名排序后的相机参数数组
+    :param num_points: 点云中点的数量
+    :param point_chunks: 依次给出对齐后点云的每一块 POINT_KEYS -> 数组，整个点云作为一块时一次写入
+    """
+    os.makedirs(cache_path, exist_ok=True)
+    atomic_write(os.path.join(cache_path, "cameras.npz"),
+                 lambda file: np.savez(file, **{key: cameras[key] for key in CAMERA_KEYS}))
+    atomic_save_npy_chunks({key: os.path.join(cache_path, f"{key}.npy") for key in POINT_KEYS}, num_points, point_chunks)
+    # meta.json最后写入，作为缓存完整的标记
+    atomic_save_json(os.path.join(cache_path, "meta.json"),
+                     {"version": SCENE_CACHE_VERSION, "num_cameras": len(cameras["uid"]), "num_points": int(num_points)})
+
+
+def load_scene_cache(cache_path, load_points=True):
+    """
+    :return: (cameras, point_cloud)，缓存不存在时返回None，load_points为False时point_cloud为None
+    """
+    meta = load_json(os.path.join(cache_path, "meta.json"))
+    if meta is None or meta.get("version") != SCENE_CACHE_VERSION:
+        return None
+    with np.load(os.path.join(cache_path, "cameras.npz")) as data:
+        cameras = {key: data[key] for key in CAMERA_KEYS}
+    point_cloud = None
+    if load_points:
+        point_cloud = {key: np.load(os.path.join(cache_path, f"{key}.npy"), mmap_mode="r") for key in POINT_KEYS}
+    return cameras, point_cloud
+
+
+def save_point_subset(subset_path, num_points, point_chunks, **meta):
+    """保存缓存点云的一个子集(如分块前过滤掉离群点后的点云)，分块写入
+    :param point_chunks: 依次给出每一块 SUBSET_KEYS -> 数组
+    :param meta: 得到子集的参数，记录在meta.json中
+    """
+    os.makedirs(subset_path, exist_ok=True)
+    atomic_save_npy_chunks({key: os.path.join(subset_path, f"{key}.npy") for key in SUBSET_KEYS}, num_points, point_chunks)
+    atomic_save_json(os.path.join(subset_path, "meta.json"),
+                     {"version": SCENE_CACHE_VERSION, "num_points": int(num_points), **meta})
+
+
+def load_point_subset(subset_path):
+    """
+    :return: SUBSET_KEYS -> 映射到文件的数组，子集不存在时返回None
+    """
+    meta = load_json(os.path.join(subset_path, "meta.json"))
+    if meta is None or meta.get("version") != SCENE_CACHE_VERSION:
+        return None
+    return {key: np.load(os.path.join(subset_path, f"{key}.npy"), mmap_mode="r") for key in SUBSET_KEYS}
@@ -8,16 +8,24 @@
 """
 因为不理解如何进行曼哈顿世界对齐，使世界坐标的y轴垂直于地平面，因此本实现假设已经是对其的坐标
 """
-import copy
 import os
 import numpy as np
 from typing import NamedTuple
-import pickle
 import math
+import heapq
+import itertools
+import multiprocessing
 
-from scene.dataset_readers import CameraInfo, storePly
+from scene.dataset_readers import CameraInfo, storePly, storePlyIndices
 from utils.graphics_utils import BasicPointCloud
-from scene.vastgs.graham_scan import run_graham_scan
+from scene.vastgs.visibility import stack_cameras, compute_visibility_pairs, points_in_camera, camera_parameters, \
+    select_cameras, frustum_cull, pair_lookup
+from scene.vastgs.partition_manifest import save_partition_manifest, load_manifest_meta, save_manifest_arrays, \
+    load_manifest_arrays, load_partition_camera_names, load_partition_point_indices, LEGACY_PARTITION_DATA
+from scene.vastgs.spatial_index import SpatialIndex2D
+from scene.vastgs.partition_graph import build_adjacency
+from scene.vastgs.voxel_downsample import voxel_downsample
+from utils.cache_utils import array_digest, fingerprint
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 
@@ -36,25 +44,76 @@ class CameraPartition(NamedTuple):
 
     ori_point_bbox: list  # 由拓展前相机边界筛选出来的point，这些点的边界  [x_min, x_max, y_min, y_max, z_min, z_max]
     extend_point_bbox: list  # 由拓展后相机边界筛选出来的point，这些点的边界
+    point_indices: np.ndarray = None  # point_cloud中的每个点在原始点云中的索引
+    inf_sides: list = None  # ori_camera_bbox的哪些边位于场景外侧 [x_min, x_max, z_min, z_max]，无缝合并时拓展到无穷远
+    visible_rate: float = None  # 该partition基于可见性选择相机时使用的能见度阈值
+    num_init_points: int = None  # 训练时初始点云(_visible.ply)中点的数量，体素降采样后小于point_indices的数量
+
+
+_worker_task = None  # 子进程通过fork继承的 (函数, 只读输入)
+
+
+def _run_worker_task(idx):
+    function, args = _worker_task
+    return function(idx, *args)
+
+
+def map_partitions(function, args, num_tasks, num_workers=1):
+    """依次计算 function(idx, *args)，idx = 0..num_tasks-1，结果按idx排列
+    num_workers>1时使用fork方式创建的进程池，子进程直接继承点云、能见度等只读输入，不需要对每个任务pickle整个点云，
+    只有每个任务的返回值需要传回主进程；不支持fork的平台上串行计算
+    """
+    global _worker_task
+    if num_workers <= 1 or num_tasks <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return [function(idx, *args) for idx in range(num_tasks)]
+    _worker_task = (function, args)
+    try:
+        with multiprocessing.get_context("fork").Pool(min(num_workers, num_tasks)) as pool:
+            return pool.map(_run_worker_task, range(num_tasks), chunksize=1)
+    finally:
+        _worker_task = None
 
 
 class ProgressiveDataPartitioning:
     # 渐进数据分区
     def __init__(self, scene_info, train_cameras, model_path, m_region=2, n_region=4, extend_rate=0.2,
-                 visible_rate=0.25):
+                 visible_rate=0.25, partition_strategy="grid", partition_target_cost=0.0, max_cameras=0, max_points=0,
+                 num_workers=1, max_distance=0.0, sub_m_region=2, sub_n_region=2, point_chunk_size=0,
+                 voxel_size=0.0, voxel_max_points=0):
         self.partition_scene = None
         self.pcd = scene_info.point_cloud
+        self.observation_index = getattr(scene_info, "observation_index", None)  # 图片->观测点的索引，存在时用于基于覆盖率的点选择
         # print(f"self.pcd={self.pcd}")
         self.model_path = model_path  # 存放模型位置
         self.partition_dir = os.path.join(model_path, "partition_point_cloud")
         self.partition_ori_dir = os.path.join(self.partition_dir, "ori")
         self.partition_extend_dir = os.path.join(self.partition_dir, "extend")
         self.partition_visible_dir = os.path.join(self.partition_dir, "visible")
-        self.save_partition_data_dir = os.path.join(self.model_path, "partition_data.pkl")
+        self.save_partition_data_dir = os.path.join(self.model_path, LEGACY_PARTITION_DATA)  # 旧版本的分块结果
         self.m_region = m_region
         self.n_region = n_region
         self.extend_rate = extend_rate
         self.visible_rate = visible_rate
+        assert partition_strategy in ["grid", "kd", "hierarchical"], f"unknown partition strategy: {partition_strategy}"
+        # grid: m×n相机网格划分  kd: 基于代价的自适应划分  hierarchical: m×n的粗分块，每块再划分为sub_m×sub_n的子块
+        self.partition_strategy = partition_strategy
+        self.sub_m_region = sub_m_region
+        self.sub_n_region = sub_n_region
+        self.partition_tree = None  # 分层划分时每个粗分块的边界与子块
+        self.partition_target_cost = partition_target_cost  # kd划分中每个partition的目标代价，<=0时划分为m_region*n_region块
+        # 每个partition的相机数量/初始点数量的上限，设置后extend_rate与visible_rate作为上下限，每个partition分别搜索满足上限的值
+        self.max_cameras = max_cameras
+        self.max_points = max_points
+        self.num_workers = num_workers  # 基于可见性选择时并行计算的进程数，<=0时使用所有CPU
+        if self.num_workers <= 0:
+            self.num_workers = os.cpu_count() or 1
+        self.max_distance = max_distance  # >0时xz平面上距离partition超过该值的相机不参与可见性选择
+        # >0时分块流式处理点云(如场景缓存中映射到文件的点云)，每次只读取point_chunk_size个点，partition中不保存点云，只保存点的索引
+        self.point_chunk_size = point_chunk_size
+        # 保存每个partition的初始点云时进行体素降采样: voxel_size>0时使用该体素大小，
+        # voxel_max_points>0时增大体素直到点数不超过该值，只影响训练使用的初始点云，不影响分块结果
+        self.voxel_size = voxel_size
+        self.voxel_max_points = voxel_max_points
 
         if not os.path.exists(self.partition_ori_dir): os.makedirs(self.partition_ori_dir)  # 创建存放分块后 拓展前 点云的文件夹
         if not os.path.exists(self.partition_extend_dir): os.makedirs(self.partition_extend_dir)  # 创建存放分块后 拓展后 点云的文件夹
@@ -64,10 +123,11 @@ class ProgressiveDataPartitioning:
         self.run_DataPartition(train_cameras)
 
     def draw_pcd(self, pcd, train_cameras):        
-        x_coords = pcd.points[:, 0]
-        z_coords = pcd.points[:, 2]
+        points, step = self.sample_points()  # 流式处理时只绘制子采样的点
+        x_coords = points[:, 0]
+        z_coords = points[:, 2]
         fig, ax = plt.subplots()
-        ax.scatter(x_coords, z_coords, c=(pcd.colors), s=1)
+        ax.scatter(x_coords, z_coords, c=(pcd.colors[::step]), s=1)
         ax.title.set_text('Plot of 2D Points')
         ax.set_xlabel('X-axis')
         ax.set_ylabel('Z-axis')
@@ -95,27 +155,92 @@ class ProgressiveDataPartitioning:
         return
         
     def run_DataPartition(self, train_cameras):
-        if not os.path.exists(self.save_partition_data_dir):
-            partition_dict = self.Camera_position_based_region_division(train_cameras)
-            partition_dict, refined_ori_bbox = self.refine_ori_bbox(partition_dict)
-            # partition_dict, refined_ori_bbox = self.refine_ori_bbox_average(partition_dict)
-            partition_list = self.Position_based_data_selection(partition_dict, refined_ori_bbox)
+        manifest = load_manifest_meta(self.model_path)
+        inputs = self.partition_inputs()
+        camera_names = [camera.image_name for camera in train_cameras]
+        camera_params = camera_parameters(stack_cameras(train_cameras))
+        self.fingerprint = fingerprint(inputs, camera_names, camera_params)  # 分块输入的指纹，输入改变后不再复用旧的分块结果
+
+        if manifest is not None and manifest.get("fingerprint") == self.fingerprint:
+            self.partition_scene = self.load_partition_data(train_cameras)
+        elif manifest is not None and self.can_update_incrementally(manifest, inputs, camera_names, camera_params):
+            self.partition_scene = self.update_partition_data(train_cameras)  # 只有新增相机时，只重新计算受影响的partition
+            self.save_partition_data(camera_names, camera_params)
+        else:
+            if manifest is not None:
+                print("[ INFO ] Partition inputs changed, re-partitioning the scene.")
+            elif os.path.exists(self.save_partition_data_dir):
+                # 旧版本的partition_data.pkl没有记录分块的输入，无法判断是否过期，也没有点的索引，重新分块并写入清单
+                print(f"[ INFO ] {self.save_partition_data_dir} was written by an older version and its inputs "
+                      f"cannot be checked, re-partitioning the scene.")
+            if self.partition_strategy == "kd":
+                partition_dict, refined_ori_bbox, inf_sides = self.Cost_based_region_division(train_cameras)
+            elif self.partition_strategy == "hierarchical":
+                partition_dict, refined_ori_bbox, inf_sides = self.Hierarchical_region_division(train_cameras)
+            else:
+                partition_dict = self.Camera_position_based_region_division(train_cameras)
+                partition_dict, refined_ori_bbox = self.refine_ori_bbox(partition_dict)
+                # partition_dict, refined_ori_bbox = self.refine_ori_bbox_average(partition_dict)
+                inf_sides = {partition_id: self.grid_inf_sides(partition_id) for partition_id in partition_dict}
+            partition_list = self.Position_based_data_selection(partition_dict, refined_ori_bbox, inf_sides)
             self.draw_partition(partition_list)
             self.partition_scene = self.Visibility_based_camera_selection(partition_list)  # 输出经过可见性筛选后的场景 包括相机和点云
-            self.save_partition_data()
-        else:
-            self.partition_scene = self.load_partition_data()
+            self.save_partition_data(camera_names, camera_params)
+
+    def partition_inputs(self):
+        """除相机外影响分块结果的输入"""
+        return {"points": array_digest(self.pcd.points), "colors": array_digest(self.pcd.colors),
+                "m_region": self.m_region, "n_region": self.n_region,
+                "extend_rate": self.extend_rate, "visible_rate": self.visible_rate,
+                "track_point_selection": self.observation_index is not None,
+                "partition_strategy": self.partition_strategy, "partition_target_cost": self.partition_target_cost,
+                "sub_m_region": self.sub_m_region, "sub_n_region": self.sub_n_region,
+                "max_cameras": self.max_cameras, "max_points": self.max_points, "max_distance": self.max_distance,
+                "voxel_size": self.voxel_size, "voxel_max_points": self.voxel_max_points,
+                "point_chunk_size": self.point_chunk_size}  # 分块处理时kd划分与预算调整使用子采样的点
 
+    def save_partition_data(self, camera_names, camera_params):
+        """将partition后的数据保存为清单文件, 方便下次加载"""
+        save_manifest_arrays(self.model_path, "input_cameras", camera_names=np.array(camera_names, dtype=str),
+                             camera_params=camera_params)
+        save_partition_manifest(self.model_path, self.partition_scene, self.pcd.points.shape[0],
+                                fingerprint=self.fingerprint, inputs=self.partition_inputs(),
+                                m_region=self.m_region, n_region=self.n_region,
+                                extend_rate=self.extend_rate, visible_rate=self.visible_rate,
+                                partition_strategy=self.partition_strategy, tree=self.partition_tree,
+                                adjacency=build_adjacency(self.partition_scene),
+                                max_cameras=self.max_cameras, max_points=self.max_points)
 
-    def save_partition_data(self):
-        """将partition后的数据序列化保存起来, 方便下次加载"""
-        with open(self.save_partition_data_dir, 'wb') as f:
-            pickle.dump(self.partition_scene, f)
+    def can_update_incrementally(self, manifest, inputs, camera_names, camera_params):
+        """只有新增了相机，且点云、分块参数以及原有相机都没有改变时，才能增量更新"""
+        input_cameras = load_manifest_arrays(self.model_path, "input_cameras")
+        if input_cameras is None or manifest["params"].get("inputs") != inputs:
+            return False
+        camera_row = {name: row for row, name in enumerate(camera_names)}
+        old_names = [str(name) for name in input_cameras["camera_names"]]
+        if len(old_names) >= len(camera_names) or any(name not in camera_row for name in old_names):
+            return False
+        rows = np.array([camera_row[name] for name in old_names], dtype=np.int64)
+        return np.array_equal(camera_params[rows], input_cameras["camera_params"])
 
-    def load_partition_data(self):
-        """加载partition后的数据"""
-        with open(self.save_partition_data_dir, 'rb') as f:
-            partition_scene = pickle.load(f)
+    def load_partition_data(self, train_cameras):
+        """从清单文件加载partition后的数据，相机按图片名对应到train_cameras，点云按索引从self.pcd中取出"""
+        manifest = load_manifest_meta(self.model_path)
+        assert manifest["num_points"] == self.pcd.points.shape[0], "partition manifest does not match the point cloud"
+        camera_dict = {camera.image_name: camera for camera in train_cameras}
+        partition_scene = []
+        for meta in manifest["partitions"]:
+            cameras = [CameraPose(camera=camera_dict[image_name], pose=np.array(camera_dict[image_name].camera_center.cpu()))
+                       for image_name in load_partition_camera_names(self.model_path, manifest, meta["partition_id"])]
+            point_indices = np.asarray(load_partition_point_indices(self.model_path, meta["partition_id"]))
+            partition_scene.append(CameraPartition(
+                partition_id=meta["partition_id"], cameras=cameras,
+                point_cloud=self.point_cloud_of(point_indices),
+                ori_camera_bbox=meta["ori_camera_bbox"], extend_camera_bbox=meta["extend_camera_bbox"],
+                extend_rate=meta["extend_rate"],
+                ori_point_bbox=meta["ori_point_bbox"], extend_point_bbox=meta["extend_point_bbox"],
+                point_indices=point_indices, inf_sides=meta.get("inf_sides"), visible_rate=meta.get("visible_rate"),
+                num_init_points=meta.get("num_init_points")))
         return partition_scene
 
     def refine_ori_bbox_average(self, partition_dict):
@@ -182,8 +307,12 @@ class ProgressiveDataPartitioning:
                               partition_dict.items()}
         return new_partition_dict, bbox_with_id
 
-    def refine_ori_bbox(self, partition_dict):
-        """将连续的相机坐标作为无缝分块的边界"""
+    def refine_ori_bbox(self, partition_dict, m_region=None, n_region=None):
+        """将连续的相机坐标作为无缝分块的边界
+        :param m_region, n_region: 网格的大小，默认为self.m_region, self.n_region
+        """
+        m_region = self.m_region if m_region is None else m_region
+        n_region = self.n_region if n_region is None else n_region
         bbox_with_id = {}
         for partition_idx, cameras in partition_dict.items():
             # TODO: 需要修改，origin边界用分区时的边界，不能使用相机的位置作为边界，否则无法做到无缝合并
@@ -195,9 +324,9 @@ class ProgressiveDataPartitioning:
             bbox_with_id[partition_idx] = ori_camera_bbox
 
         # 2.按照z轴对相机的边界进行修正
-        for m in range(1, self.m_region+1):
-            for n in range(1, self.n_region+1):
-                if n+1 == self.n_region+1:
+        for m in range(1, m_region+1):
+            for n in range(1, n_region+1):
+                if n+1 == n_region+1:
                     break
                 partition_idx_1 = str(m) + '_' + str(n+1)  # 上边块
                 min_x_1, max_x_1, min_z_1, max_z_1 = bbox_with_id[partition_idx_1]
@@ -208,9 +337,9 @@ class ProgressiveDataPartitioning:
                 bbox_with_id[partition_idx_2] = [min_x_2, max_x_2, min_z_2, mid_z]
 
         # 3.按照x轴对相机的边界进行修正
-        for n in range(1, self.n_region + 1):
-            for m in range(1, self.m_region + 1):
-                if m + 1 == self.m_region + 1:
+        for n in range(1, n_region + 1):
+            for m in range(1, m_region + 1):
+                if m + 1 == m_region + 1:
                     break
                 partition_idx_1 = str(m) + '_' + str(n)  # 左边块
                 min_x_1, max_x_1, min_z_1, max_z_1 = bbox_with_id[partition_idx_1]
@@ -223,14 +352,16 @@ class ProgressiveDataPartitioning:
         new_partition_dict = {f"{partition_id}": cameras["camera_list"] for partition_id, cameras in partition_dict.items()}
         return new_partition_dict, bbox_with_id
 
-    def Camera_position_based_region_division(self, train_cameras):
+    def Camera_position_based_region_division(self, train_cameras, m_region=None, n_region=None):
         """1.基于相机位置的区域划分
         思路: 1.首先将整个场景的相机坐标投影到以xz轴组成的平面上
              2.按照x轴方向, 将所有的相机分成m部分
              3.按照z轴方向, 将每一部分分成n部分 (默认将整个区域分成2*4=8个部分),同时保证mxn个部分中的相机数量的均衡
              4.返回每个部分的边界坐标，以及每个部分对应的相机
+        :param m_region, n_region: 网格的大小，默认为self.m_region, self.n_region，分层划分时用于子块的划分
         """
-        m, n = self.m_region, self.n_region    # m=2, n=4
+        m = self.m_region if m_region is None else m_region    # m=2
+        n = self.n_region if n_region is None else n_region    # n=4
         CameraPose_list = []
         camera_centers = []
         for idx, camera in enumerate(train_cameras):
@@ -240,7 +371,8 @@ class ProgressiveDataPartitioning:
                 CameraPose(camera=camera, pose=pose))  # 世界坐标系下相机的中心坐标
 
         # 保存相机坐标，用于可视化相机位置
-        storePly(os.path.join(self.partition_dir, 'camera_centers.ply'), np.array(camera_centers), np.zeros_like(np.array(camera_centers)))
+        if m_region is None:
+            storePly(os.path.join(self.partition_dir, 'camera_centers.ply'), np.array(camera_centers), np.zeros_like(np.array(camera_centers)))
 
         # 2.沿着x轴将相机分成m部分
         m_partition_dict = {}
@@ -282,14 +414,154 @@ class ProgressiveDataPartitioning:
 
         return partition_dict
 
-    def extract_point_cloud(self, pcd, bbox):
-        """根据camera的边界从初始点云中筛选对应partition的点云"""
-        mask = (pcd.points[:, 0] >= bbox[0]) & (pcd.points[:, 0] <= bbox[1]) & (
-                pcd.points[:, 2] >= bbox[2]) & (pcd.points[:, 2] <= bbox[3])  # 筛选在范围内的点云，得到对应的mask
-        points = pcd.points[mask]
-        colors = pcd.colors[mask]
-        normals = pcd.normals[mask]
-        return points, colors, normals
+    def grid_inf_sides(self, partition_id):
+        """网格划分中位于场景外侧的边 [x_min, x_max, z_min, z_max]，与seamless_merging中的extend_inf_x_z_bbox一致"""
+        m, n = int(partition_id.split("_")[0]), int(partition_id.split("_")[1])
+        return [m == 1, m == self.m_region, n == 1, n == self.n_region]
+
+    def Hierarchical_region_division(self, train_cameras):
+        """1.分层的区域划分，用于城市级别的场景
+        思路: 1.先按相机位置将场景划分为m_region×n_region的粗分块
+             2.每个粗分块内的相机再按相同的方式划分为sub_m_region×sub_n_region的子块，子块位于粗分块外侧的边与粗分块对齐，
+               因此所有子块无缝拼接成整个场景；粗分块的相机数量少于sub_m_region×sub_n_region时相应地减少子块的数量
+             3.基于可见性的选择只在相邻的粗分块(包括自身)的子块之间进行，见candidate_pairs，选择的开销随场景面积线性增长
+        子块的编号为 "粗分块编号-子块编号"，如 "1_2-2_1"，粗分块与子块的关系记录在self.partition_tree中
+        :return partition_dict, 每个子块的边界, 每个子块位于场景外侧的边
+        """
+        coarse_dict = self.Camera_position_based_region_division(train_cameras)
+        coarse_dict, coarse_bbox = self.refine_ori_bbox(coarse_dict)
+        sub_m, sub_n = self.sub_m_region, self.sub_n_region
+
+        partition_dict, bbox_with_id, inf_sides = {}, {}, {}
+        self.partition_tree = []
+        for coarse_id, camera_list in coarse_dict.items():
+            coarse_inf = self.grid_inf_sides(coarse_id)
+            c_x_min, c_x_max, c_z_min, c_z_max = coarse_bbox[coarse_id]
+            # 每个子块至少需要一个相机: 相机数量不足sub_m×sub_n时减少该粗分块的子块数量
+            block_m = max(1, min(sub_m, len(camera_list)))
+            block_n = max(1, min(sub_n, len(camera_list) // block_m))
+            if (block_m, block_n) != (sub_m, sub_n):
+                print(f"[ WARNING ] Coarse block {coarse_id} has only {len(camera_list)} cameras, "
+                      f"dividing it into {block_m}x{block_n} sub-blocks instead of {sub_m}x{sub_n}.")
+            sub_dict = self.Camera_position_based_region_division([camera_pose.camera for camera_pose in camera_list],
+                                                                  block_m, block_n)
+            sub_dict, sub_bbox = self.refine_ori_bbox(sub_dict, block_m, block_n)
+            children = []
+            for sub_id, sub_cameras in sub_dict.items():
+                a, b = int(sub_id.split("_")[0]), int(sub_id.split("_")[1])
+                x_min, x_max, z_min, z_max = sub_bbox[sub_id]
+                partition_id = f"{coarse_id}-{sub_id}"
+                partition_dict[partition_id] = sub_cameras
+                bbox_with_id[partition_id] = [c_x_min if a == 1 else x_min, c_x_max if a == block_m else x_max,
+                                              c_z_min if b == 1 else z_min, c_z_max if b == block_n else z_max]
+                inf_sides[partition_id] = [coarse_inf[0] and a == 1, coarse_inf[1] and a == block_m,
+                                           coarse_inf[2] and b == 1, coarse_inf[3] and b == block_n]
+                children.append(partition_id)
+            self.partition_tree.append({"node_id": coarse_id, "ori_camera_bbox": [float(value) for value in coarse_bbox[coarse_id]],
+                                        "inf_sides": coarse_inf, "sub_m_region": block_m, "sub_n_region": block_n,
+                                        "children": children})
+        return partition_dict, bbox_with_id, inf_sides
+
+    def region_cost(self, camera_pixels, num_points):
+        """区域的代价: 相机像素数与点数分别占整个场景的比例之和，整个场景的代价为2
+        训练时间主要由渲染的像素数与高斯点的数量决定，按此代价划分可以使每个partition的训练时间大致相同
+        """
+        return camera_pixels / self.total_camera_pixels + num_points / max(self.total_points, 1)
+
+    def split_region(self, camera_xz, camera_pixels, point_xz):
+        """将一个区域沿相机分布较长的轴一分为二，切分位置使两侧的代价最接近
+        :param camera_xz: [C, 2] 区域内相机中心的xz坐标
+        :param point_xz: [N, 2] 区域内点的xz坐标
+        :return: (axis, 切分位置)，区域内的相机无法再分时返回None
+        """
+        extent = camera_xz.max(axis=0) - camera_xz.min(axis=0)
+        for axis in np.argsort(-extent, kind="stable"):  # 优先沿较长的轴切分
+            order = np.argsort(camera_xz[:, axis], kind="stable")
+            coords = camera_xz[order, axis]
+            candidates = np.nonzero(coords[1:] > coords[:-1])[0] + 1  # 切分后左侧的相机数量，坐标相同的相机不会被分开
+            if len(candidates) == 0:
+                continue
+            # 切分位置取相邻两个相机坐标的中点，相邻partition共用这条边界，保证无缝合并
+            positions = (coords[candidates - 1] + coords[candidates]) / 2
+            left_pixels = np.cumsum(camera_pixels[order])[candidates - 1]
+            left_points = np.searchsorted(np.sort(point_xz[:, axis]), positions, side="left")
+            left_cost = self.region_cost(left_pixels, left_points)
+            right_cost = self.region_cost(camera_pixels.sum() - left_pixels, point_xz.shape[0] - left_points)
+            best = np.argmin(np.abs(left_cost - right_cost))
+            return int(axis), float(positions[best])
+        return None
+
+    def Cost_based_region_division(self, train_cameras):
+        """1.基于代价的自适应区域划分(k-d树)，代替固定的m×n相机网格
+        思路: 1.相机的代价为图像像素数，点的代价相同，区域的代价见region_cost
+             2.每次选择代价最大的区域，沿相机分布较长的轴，在使两侧代价最接近的位置将其一分为二
+             3.所有区域的代价都不超过partition_target_cost时停止，未设置目标代价时划分为m_region*n_region块
+             4.区域的边界就是无缝合并的边界，位于场景外侧的边取相机坐标的范围，无缝合并时拓展到无穷远
+        :return partition_dict, 每个partition的边界 [x_min, x_max, z_min, z_max], 每个partition位于场景外侧的边
+        """
+        CameraPose_list = [CameraPose(camera=camera, pose=np.array(camera.camera_center.cpu())) for camera in train_cameras]
+        camera_centers = np.array([camera_pose.pose for camera_pose in CameraPose_list])
+        storePly(os.path.join(self.partition_dir, 'camera_centers.ply'), camera_centers, np.zeros_like(camera_centers))
+        camera_xz = camera_centers[:, [0, 2]]
+        camera_pixels = np.array([camera.image_width * camera.image_height for camera in train_cameras], dtype=np.float64)
+        points, step = self.sample_points()  # 流式处理时用子采样的点估计点的数量
+        point_xz = points[:, [0, 2]]
+        self.total_camera_pixels = camera_pixels.sum()
+        self.total_points = point_xz.shape[0]
+
+        if self.partition_target_cost > 0:
+            target_cost, max_regions = self.partition_target_cost, np.inf
+        else:
+            target_cost, max_regions = 0, self.m_region * self.n_region
+
+        # 区域: (-代价, 序号, 相机索引, 点索引, 边界)，用堆按代价从大到小切分，根区域为整个xz平面
+        counter = itertools.count()
+        def make_region(camera_idx, point_idx, cell):
+            cost = self.region_cost(camera_pixels[camera_idx].sum(), len(point_idx))
+            return -cost, next(counter), camera_idx, point_idx, cell
+
+        heap = [make_region(np.arange(len(CameraPose_list)), np.arange(point_xz.shape[0]),
+                            [-np.inf, np.inf, -np.inf, np.inf])]
+        leaves = []
+        while heap:
+            if len(heap) + len(leaves) >= max_regions:
+                leaves.extend(heap)
+                break
+            region = heapq.heappop(heap)
+            neg_cost, _, camera_idx, point_idx, cell = region
+            split = None
+            if -neg_cost > target_cost and len(camera_idx) > 1:
+                split = self.split_region(camera_xz[camera_idx], camera_pixels[camera_idx], point_xz[point_idx])
+            if split is None:
+                leaves.append(region)
+                continue
+            axis, position = split
+            camera_left = camera_xz[camera_idx, axis] < position
+            point_left = point_xz[point_idx, axis] < position
+            left_cell, right_cell = list(cell), list(cell)
+            left_cell[2 * axis + 1] = position
+            right_cell[2 * axis] = position
+            heapq.heappush(heap, make_region(camera_idx[camera_left], point_idx[point_left], left_cell))
+            heapq.heappush(heap, make_region(camera_idx[~camera_left], point_idx[~point_left], right_cell))
+
+        # 按区域左下角的位置(先x后z)编号
+        leaves.sort(key=lambda region: (region[4][0], region[4][2]))
+        scene_bbox = [camera_xz[:, 0].min(), camera_xz[:, 0].max(), camera_xz[:, 1].min(), camera_xz[:, 1].max()]
+        partition_dict, bbox_with_id, inf_sides = {}, {}, {}
+        for idx, (neg_cost, _, camera_idx, point_idx, cell) in enumerate(leaves):
+            partition_id = f"kd_{idx + 1}"
+            partition_dict[partition_id] = [CameraPose_list[camera] for camera in camera_idx]
+            inf_sides[partition_id] = [bool(np.isinf(value)) for value in cell]
+            bbox_with_id[partition_id] = [float(scene_bbox[side]) if np.isinf(value) else float(value)
+                                          for side, value in enumerate(cell)]
+            print(f"Partition {partition_id}: {len(camera_idx)} cameras, {len(point_idx) * step} points, cost {-neg_cost:.4f}")
+        return partition_dict, bbox_with_id, inf_sides
+
+    def isin_sorted(self, values, sorted_array):
+        """判断values中的每个元素是否在有序数组sorted_array中"""
+        pos = np.searchsorted(sorted_array, values)
+        pos[pos == len(sorted_array)] = 0
+        return (sorted_array[pos] == values) if len(sorted_array) > 0 else np.zeros(len(values), dtype=bool)
 
     def get_point_range(self, points):
         """获取当前点云的x y z边界"""
@@ -301,13 +573,163 @@ class ProgressiveDataPartitioning:
                 min(y_list), max(y_list),
                 min(z_list), max(z_list)]
 
-    def Position_based_data_selection(self, partition_dict, refined_ori_bbox):
+    def sample_points(self):
+        """流式处理时返回约point_chunk_size个均匀子采样的点，以及每个采样点代表的点数，否则返回整个点云"""
+        num_points = self.pcd.points.shape[0]
+        step = max(1, -(-num_points // self.point_chunk_size)) if self.point_chunk_size > 0 else 1
+        return np.asarray(self.pcd.points[::step]), step
+
+    def index_chunks(self, indices):
+        """将点的索引按point_chunk_size分块，不分块时只有一块"""
+        chunk_size = self.point_chunk_size if self.point_chunk_size > 0 else max(len(indices), 1)
+        for start in range(0, len(indices), chunk_size):
+            yield indices[start:start + chunk_size]
+
+    def points_in_boxes(self, bboxes, name):
+        """查询每个边界框 [x_min, x_max, z_min, z_max] 内的点在点云中的索引，升序排列
+        流式处理时依次读取点云的每一块，只为该块建立空间索引，将块内的点分配给包含它的所有边界框，
+        并追加写入每个边界框的索引文件 partition_point_cloud/stream/{name}_{序号}.idx，峰值内存只与point_chunk_size有关
+        :return: 索引数组的列表，流式处理时为映射到索引文件的数组
+        """
+        if self.point_chunk_size <= 0:
+            return SpatialIndex2D.from_points(self.pcd.points).query_boxes(bboxes)
+        stream_dir = os.path.join(self.partition_dir, "stream")
+        os.makedirs(stream_dir, exist_ok=True)
+        paths = [os.path.join(stream_dir, f"{name}_{idx}.idx") for idx in range(len(bboxes))]
+        files = [open(path, "wb") for path in paths]
+        try:
+            num_points = self.pcd.points.shape[0]
+            for start in range(0, num_points, self.point_chunk_size):
+                points = np.asarray(self.pcd.points[start:start + self.point_chunk_size])
+                for file, indices in zip(files, SpatialIndex2D.from_points(points).query_boxes(bboxes)):
+                    (indices + start).astype(np.int64).tofile(file)
+        finally:
+            for file in files:
+                file.close()
+        return [np.memmap(path, dtype=np.int64, mode="r") if os.path.getsize(path) > 0 else np.zeros(0, dtype=np.int64)
+                for path in paths]
+
+    def point_range(self, indices, camera_bbox=None):
+        """索引对应的点的x y z边界，与get_point_range相同，流式处理时分块读取
+        :param camera_bbox: 没有点时(如相机很少的子块)使用相机的边界 [x_min, x_max, z_min, z_max]，y方向取整个点云的范围
+        """
+        if len(indices) == 0 and camera_bbox is not None:
+            points, _ = self.sample_points()
+            return [camera_bbox[0], camera_bbox[1], points[:, 1].min(), points[:, 1].max(), camera_bbox[2], camera_bbox[3]]
+        if self.point_chunk_size <= 0:
+            return self.get_point_range(self.pcd.points[indices])
+        bounds = [(points.min(axis=0), points.max(axis=0))
+                  for points in (np.asarray(self.pcd.points[chunk]) for chunk in self.index_chunks(indices))]
+        low, high = np.min([b[0] for b in bounds], axis=0), np.max([b[1] for b in bounds], axis=0)
+        return [low[0], high[0], low[1], high[1], low[2], high[2]]
+
+    def point_cloud_of(self, indices):
+        """索引对应的点云，流式处理时partition中不保存点云，返回None"""
+        if self.point_chunk_size > 0:
+            return None
+        return BasicPointCloud(self.pcd.points[indices], self.pcd.colors[indices], self.pcd.normals[indices])
+
+    def store_points(self, path, indices):
+        """保存索引对应的点云，流式处理时分块写入"""
+        if self.point_chunk_size > 0:
+            storePlyIndices(path, self.pcd.points, self.pcd.colors, indices, self.point_chunk_size)
+        else:
+            storePly(path, self.pcd.points[indices], self.pcd.colors[indices])
+
+    def store_init_points(self, partition_id, indices):
+        """保存partition训练时使用的初始点云 _visible.ply，设置了voxel_size或voxel_max_points时先进行体素降采样
+        :return: 初始点云中点的数量
+        """
+        path = os.path.join(self.partition_visible_dir, f"{partition_id}_visible.ply")
+        if len(indices) == 0 or (self.voxel_size <= 0 and (self.voxel_max_points <= 0 or len(indices) <= self.voxel_max_points)):
+            self.store_points(path, indices)
+            return len(indices)
+
+        x_min, x_max, y_min, y_max, z_min, z_max = self.point_range(indices)
+        voxel_size = self.voxel_size
+        if voxel_size <= 0:  # 只设置了点数上限时，由点云边界框的体积估计初始的体素大小
+            voxel_size = (max((x_max - x_min) * (y_max - y_min) * (z_max - z_min), 1e-12) / self.voxel_max_points) ** (1 / 3)
+        pcd = self.pcd
+        def downsample(voxel_size):  # 体素的键相对于点云边界框的最小角点，远离坐标原点的场景也不会越界
+            return voxel_downsample(((pcd.points[chunk], pcd.colors[chunk], pcd.normals[chunk])
+                                     for chunk in self.index_chunks(indices)), voxel_size, [x_min, y_min, z_min])
+
+        result = downsample(voxel_size)
+        if self.voxel_max_points > 0 and (self.voxel_size <= 0 or result[0].shape[0] > self.voxel_max_points):
+            # 在满足点数上限的前提下使体素尽量小: 先倍增或减半得到上下界，再二分，体素不小于设置的voxel_size
+            too_small, fits, best = None, None, result
+            previous = None  # 减半前的点数
+            for _ in range(20):
+                num_points = result[0].shape[0]
+                if num_points > self.voxel_max_points:
+                    too_small = voxel_size
+                else:
+                    fits, best = voxel_size, result
+                if too_small is not None and fits is not None:
+                    break
+                if fits is not None and (num_points >= len(indices) or num_points == previous):
+                    break  # 减半体素不再增加点数(如每个点已经各占一个体素)，不再继续减小
+                previous = num_points
+                voxel_size = voxel_size * 2 if fits is None else voxel_size / 2
+                try:
+                    result = downsample(voxel_size)
+                except ValueError:  # 体素过小，体素坐标超出键的范围
+                    break
+            for _ in range(8 if too_small is not None and fits is not None else 0):
+                mid = math.sqrt(too_small * fits)
+                result = downsample(mid)
+                if result[0].shape[0] > self.voxel_max_points:
+                    too_small = mid
+                else:
+                    fits, best = mid, result
+            voxel_size, result = fits if fits is not None else voxel_size, best
+        points, colors, normals = result
+        storePly(path, points, colors)
+        print(f"Partition {partition_id}: {len(indices)} initial points, {points.shape[0]} after voxel downsampling "
+              f"(voxel size {voxel_size:.4f})")
+        return points.shape[0]
+
+    def extend_bbox(self, bbox, extend_rate):
+        """按照extend_rate拓展边界 [x_min, x_max, z_min, z_max]"""
+        min_x, max_x, min_z, max_z = bbox
+        return [min_x - extend_rate * (max_x - min_x),
+                max_x + extend_rate * (max_x - min_x),
+                min_z - extend_rate * (max_z - min_z),
+                max_z + extend_rate * (max_z - min_z)]
+
+    def within_budget(self, num_cameras, num_points):
+        return ((self.max_cameras <= 0 or num_cameras <= self.max_cameras)
+                and (self.max_points <= 0 or num_points <= self.max_points))
+
+    def tune_extend_rate(self, ori_camera_bbox, camera_index, point_index, iterations=20, point_weight=1):
+        """在 [0, extend_rate] 中二分查找满足相机/点数量上限的最大拓展比例
+        拓展后边界内的相机和点的数量随拓展比例单调增加，数量只需要通过空间索引统计
+        :param point_weight: point_index中每个点代表的点数，point_index建立在子采样的点上时大于1
+        """
+        def fits(extend_rate):
+            bbox = self.extend_bbox(ori_camera_bbox, extend_rate)
+            return self.within_budget(camera_index.count_boxes([bbox])[0],
+                                      point_index.count_boxes([bbox])[0] * point_weight)
+
+        if fits(self.extend_rate):
+            return self.extend_rate
+        if not fits(0.0):
+            print(f"[ WARNING ] Partition bbox {ori_camera_bbox} exceeds the budget even without extension.")
+            return 0.0
+        low, high = 0.0, self.extend_rate
+        for _ in range(iterations):
+            mid = (low + high) / 2
+            low, high = (mid, high) if fits(mid) else (low, mid)
+        return low
+
+    def Position_based_data_selection(self, partition_dict, refined_ori_bbox, inf_sides=None):
         """
         2.基于位置的数据选择
         思路: 1.计算每个partition的x z边界
              2.然后按照extend_rate将每个partition的边界坐标扩展, 得到新的边界坐标 [x_min, x_max, z_min, z_max]
              3.根据extend后的边界坐标, 获取该部分对应的点云
         问题: 有可能根据相机确定边界框后, 仍存在一些比较好的点云没有被选中的情况, 因此extend_rate是一个超参数, 需要根据实际情况调整
+        :param inf_sides: 每个partition位于场景外侧的边，为None时按网格划分的编号计算
         :return partition_list: 每个部分对应的点云，所有相机，边界
         """
         # 计算每个部分的拓展后的边界坐标，以及该部分对应的点云
@@ -315,13 +737,21 @@ class ProgressiveDataPartitioning:
         partition_list = []
         point_num = 0
         point_extend_num = 0
+        # 所有partition的相机在xz平面上的索引，用于查询拓展后边界内的相机
+        all_camera_poses = [camera_pose for camera_list in partition_dict.values() for camera_pose in camera_list]
+        camera_index = SpatialIndex2D.from_points(np.array([camera_pose.pose for camera_pose in all_camera_poses]))
+        if self.max_cameras > 0 or self.max_points > 0:
+            points, step = self.sample_points()  # 流式处理时用子采样的点估计边界内点的数量
+            point_index = SpatialIndex2D.from_points(points)
+        # 1.确定每个partition拓展前后的边界与相机
+        bboxes = []
         for partition_idx, camera_list in partition_dict.items():
             min_x, max_x, min_z, max_z = refined_ori_bbox[partition_idx]
             ori_camera_bbox = [min_x, max_x, min_z, max_z]
-            extend_camera_bbox = [min_x - self.extend_rate * (max_x - min_x),
-                                  max_x + self.extend_rate * (max_x - min_x),
-                                  min_z - self.extend_rate * (max_z - min_z),
-                                  max_z + self.extend_rate * (max_z - min_z)]
+            extend_rate = self.extend_rate
+            if self.max_cameras > 0 or self.max_points > 0:
+                extend_rate = self.tune_extend_rate(ori_camera_bbox, camera_index, point_index, point_weight=step)
+            extend_camera_bbox = self.extend_bbox(ori_camera_bbox, extend_rate)
             print("Partition", partition_idx, "ori_camera_bbox", ori_camera_bbox, "\textend_camera_bbox", extend_camera_bbox)
             ori_camera_centers = []
             for camera_pose in camera_list:
@@ -332,39 +762,39 @@ class ProgressiveDataPartitioning:
                      np.array(ori_camera_centers),
                      np.zeros_like(np.array(ori_camera_centers)))
 
-            # TODO: 需要根据拓展后的边界重新添加相机
-            new_camera_list = []
-            extend_camera_centers = []
-            for id, camera_list in partition_dict.items():
-                for camera_pose in camera_list:
-                    if extend_camera_bbox[0] <= camera_pose.pose[0] <= extend_camera_bbox[1] and extend_camera_bbox[2] <= camera_pose.pose[2] <= extend_camera_bbox[3]:
-                        extend_camera_centers.append(camera_pose.pose)
-                        new_camera_list.append(camera_pose)
+            # 根据拓展后的边界重新添加相机
+            new_camera_list = [all_camera_poses[idx] for idx in camera_index.query_box(extend_camera_bbox)]
+            extend_camera_centers = [camera_pose.pose for camera_pose in new_camera_list]
 
             # 保存extend后新添加的相机位置
             storePly(os.path.join(self.partition_extend_dir, f'{partition_idx}_camera_centers.ply'),
                      np.array(extend_camera_centers),
                      np.zeros_like(np.array(extend_camera_centers)))
+            bboxes.append((partition_idx, ori_camera_bbox, extend_camera_bbox, extend_rate, new_camera_list))
 
-            # 获取该部分对应的点云
-            points, colors, normals = self.extract_point_cloud(pcd, ori_camera_bbox)  # 分别提取原始边界内的点云，和拓展边界后的点云
-            points_extend, colors_extend, normals_extend = self.extract_point_cloud(pcd, extend_camera_bbox)
+        # 2.获取每个部分对应的点云，所有partition拓展前后的边界一起查询，流式处理时只需要遍历一次点云
+        point_indices_list = self.points_in_boxes([bbox for _, ori_camera_bbox, extend_camera_bbox, _, _ in bboxes
+                                                   for bbox in (ori_camera_bbox, extend_camera_bbox)], "position")
+        for idx, (partition_idx, ori_camera_bbox, extend_camera_bbox, extend_rate, new_camera_list) in enumerate(bboxes):
+            ori_point_indices, point_indices = point_indices_list[2 * idx], point_indices_list[2 * idx + 1]  # 分别提取原始边界内的点云，和拓展边界后的点云
             # 论文中说点云围成的边界框的高度选取为最高点到地平面的距离，但在本实现中，因为不确定地平面位置，(可视化中第平面不用坐标轴xz重合)
             # 因此使用整个点云围成的框作为空域感知的边界框
             partition_list.append(CameraPartition(partition_id=partition_idx, cameras=new_camera_list,
-                                                  point_cloud=BasicPointCloud(points_extend, colors_extend, normals_extend),
+                                                  point_cloud=self.point_cloud_of(point_indices),
                                                   ori_camera_bbox=ori_camera_bbox,
                                                   extend_camera_bbox=extend_camera_bbox,
-                                                  extend_rate=self.extend_rate,
-                                                  ori_point_bbox=self.get_point_range(points),
-                                                  extend_point_bbox=self.get_point_range(points_extend),
+                                                  extend_rate=extend_rate,
+                                                  ori_point_bbox=self.point_range(ori_point_indices, ori_camera_bbox),
+                                                  extend_point_bbox=self.point_range(point_indices, extend_camera_bbox),
+                                                  point_indices=point_indices,
+                                                  inf_sides=inf_sides[partition_idx] if inf_sides is not None
+                                                  else self.grid_inf_sides(partition_idx),
                                                   ))
 
-            point_num += points.shape[0]
-            point_extend_num += points_extend.shape[0]
-            storePly(os.path.join(self.partition_ori_dir, f"{partition_idx}.ply"), points, colors)  # 分别保存未拓展前 和 拓展后的点云
-            storePly(os.path.join(self.partition_extend_dir, f"{partition_idx}_extend.ply"), points_extend,
-                     colors_extend)
+            point_num += len(ori_point_indices)
+            point_extend_num += len(point_indices)
+            self.store_points(os.path.join(self.partition_ori_dir, f"{partition_idx}.ply"), ori_point_indices)  # 分别保存未拓展前 和 拓展后的点云
+            self.store_points(os.path.join(self.partition_extend_dir, f"{partition_idx}_extend.ply"), point_indices)
 
         # 未拓展边界前：根据位置选择后的数据量会比初始的点云数量小很多，因为相机围成的边界会比实际的边界小一些，因此使用这些边界筛点云，点的数量会减少
         # 拓展边界后：因为会有许多重合的点，因此点的数量会增多
@@ -391,39 +821,297 @@ class ProgressiveDataPartitioning:
         }
 
 
-    def point_in_image(self, camera, points):
-        """使用投影矩阵将角点投影到二维平面"""
-        # 获取点在图像平面的坐标
-        R = camera.R
-        T = camera.T
-        w2c = np.eye(4)
-        w2c[:3, :3] = np.transpose(R)
-        w2c[:3, 3] = T
-        fx = camera.image_width / (2 * math.tan(camera.FoVx / 2))
-        fy = camera.image_height / (2 * math.tan(camera.FoVy / 2))
-
-        intrinsic_matrix = np.array([
-            [fx, 0, camera.image_height // 2],
-            [0, fy, camera.image_width // 2],
-            [0, 0, 1]
-        ])
-
-        points_camera = np.dot(w2c[:3, :3], points.T) + w2c[:3, 3:].reshape(3, 1)  # [3, n]
-        points_camera = points_camera.T  # [n, 3]  [1, 3]
-        points_camera = points_camera[np.where(points_camera[:, 2] > 0)]  # [n, 3]  这里需要根据z轴过滤一下点
-        points_image = np.dot(intrinsic_matrix, points_camera.T)  # [3, n]
-        points_image = points_image[:2, :] / points_image[2, :]  # [2, n]
-        points_image = points_image.T  # [n, 2]
-
-        mask = np.where(np.logical_and.reduce((
-            points_image[:, 0] >= 0,
-            points_image[:, 0] < camera.image_height,
-            points_image[:, 1] >= 0,
-            points_image[:, 1] < camera.image_width
-        )))[0]
-
-        return points_image, points_image[mask], mask
+    def visible_point_indices(self, point_mask, point_indices_j, image_name, cams, camera_idx):
+        """Coverage-based point selection: j部分中可以被当前相机看到、且还不在point_mask中的点
+        :param point_indices_j: j部分的点在原始点云中的索引(有序)
+        """
+        if self.observation_index is not None:
+            # 直接通过track查找当前相机观测到的、属于j部分的点
+            observed = self.observation_index.points_of(image_name)
+            observed = observed[self.isin_sorted(observed, point_indices_j)]
+            return observed[~point_mask[observed]]
+        candidates = point_indices_j[~point_mask[point_indices_j]]  # 已经被选中的点不需要再投影
+        return np.concatenate([np.zeros(0, dtype=np.int64)] + [
+            chunk[points_in_camera(cams, camera_idx, self.pcd.points[chunk])] for chunk in self.index_chunks(candidates)])
+
+    def select_visible_points(self, point_mask, point_indices_j, image_name, cams, camera_idx):
+        """将j部分中可以被当前相机看到的点并入point_mask"""
+        point_mask[self.visible_point_indices(point_mask, point_indices_j, image_name, cams, camera_idx)] = True
+
+    def tune_visible_rate(self, partition_i, candidates, rates, point_mask, cams):
+        """按能见度从高到低加入候选相机，直到相机或点的数量超过上限，返回i部分的能见度阈值
+        能见度相同的相机同时加入或同时舍弃，因此结果等价于对i部分使用一个更高的阈值
+        设置了点的上限时，被加入的相机可见的点直接并入point_mask
+        :param candidates: [(partition_j, camera_pose, camera_idx)] 能见度不低于visible_rate的候选相机
+        :param rates: 候选相机对i部分的能见度
+        """
+        order = np.argsort(-rates, kind="stable")
+        num_cameras = len(partition_i.cameras)
+        num_points = int(point_mask.sum())
+        visible_rate = self.visible_rate
+        start = 0
+        while start < len(order):
+            end = start
+            while end < len(order) and rates[order[end]] == rates[order[start]]:
+                end += 1
+            new_points = np.zeros(0, dtype=np.int64)
+            if self.max_points > 0:
+                new_points = np.unique(np.concatenate([new_points] + [
+                    self.visible_point_indices(point_mask, candidates[k][0].point_indices,
+                                               candidates[k][1].camera.image_name, cams, candidates[k][2])
+                    for k in order[start:end]]))
+            if not self.within_budget(num_cameras + end - start, num_points + len(new_points)):
+                visible_rate = float(np.nextafter(rates[order[start]], np.inf))
+                break
+            point_mask[new_points] = True
+            num_cameras += end - start
+            num_points += len(new_points)
+            start = end
+        print(f"Partition {partition_i.partition_id}: extend_rate {partition_i.extend_rate:.4f}, "
+              f"visible_rate {visible_rate:.4f}, {num_cameras} cameras, {num_points} points")
+        return visible_rate
+
+    def candidate_pairs(self, partition_list, corner_points, cams, camera_lists):
+        """基于可见性的选择需要计算能见度的 (partition, camera) 对，以及每个partition选择相机时考虑的partition
+        分层划分时按粗分块分组: 每个粗分块只考虑相邻的粗分块(编号在两个方向上都相差不超过1，包括自身)中的相机，
+        先用视锥体与距离剔除看不到整个粗分块的相机，粗分块中的子块只与剩下的相机组成对，
+        相邻关系直接由粗分块的网格编号得到，对的数量随场景面积线性增长；其他划分策略时所有partition为一组
+        :param camera_lists: 每个partition中相机在cams中的序号
+        :return: neighbors (每个partition考虑的partition序号), pair_partition, pair_camera
+        """
+        partition_pos = {partition.partition_id: idx for idx, partition in enumerate(partition_list)}
+        if self.partition_tree is not None:
+            groups = [[partition_pos[child] for child in node["children"] if child in partition_pos]
+                      for node in self.partition_tree]
+            grid = [tuple(int(value) for value in node["node_id"].split("_")) for node in self.partition_tree]
+            group_of_cell = {cell: g for g, cell in enumerate(grid)}
+            group_neighbors = [[group_of_cell[(a + da, b + db)] for da in (-1, 0, 1) for db in (-1, 0, 1)
+                                if (a + da, b + db) in group_of_cell] for a, b in grid]
+        else:
+            groups, group_neighbors = [list(range(len(partition_list)))], [[0]]
+
+        neighbors = [None] * len(partition_list)
+        pair_partition, pair_camera = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        num_pairs, num_culled = 0, 0
+        for members, neighbor_groups in zip(groups, group_neighbors):
+            if len(members) == 0: continue
+            neighbor_list = sorted(j for g in neighbor_groups for j in groups[g])
+            for idx in members:
+                neighbors[idx] = neighbor_list
+            columns = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] +
+                                               [np.asarray(camera_lists[j], dtype=np.int64) for j in neighbor_list]))
+            # 粗分块一级的剔除: 所有子块角点的AABB包含每个子块的AABB，被剔除的相机对每个子块的能见度都为0
+            frustum_culled, distance_culled = frustum_cull(corner_points[members].reshape(1, -1, 3),
+                                                           select_cameras(cams, columns), self.max_distance)
+            culled = (frustum_culled | distance_culled)[0]
+            num_pairs += len(members) * len(columns)
+            num_culled += len(members) * int(culled.sum())
+            columns = columns[~culled]
+            pair_partition.append(np.repeat(np.array(members, dtype=np.int64), len(columns)))
+            pair_camera.append(np.tile(columns, len(members)))
+        print(f"Visibility candidates: {num_culled} of {num_pairs} pairs rejected by block frustum")
+        return neighbors, np.concatenate(pair_partition), np.concatenate(pair_camera)
+
+    def load_or_compute_visibility(self, corner_points, camera_names, cams, pair_partition, pair_camera):
+        """计算给定的 (partition, camera) 对的能见度，复用清单目录中缓存的结果
+        缓存以稀疏的对保存，partition的角点没有改变时，参数没有改变的相机直接使用缓存中的结果，只计算缺少的对，
+        因此只修改visible_rate或新增相机时不需要重新计算；缓存中其他相机的结果保存时保留，
+        增量分块只计算新相机，之后的分块仍可以复用原有相机的结果
+        :return: 按partition排列的对，第i个partition的对位于 offsets[i]:offsets[i+1]，用pair_lookup查找
+        """
+        camera_params = camera_parameters(cams)
+        intersection_area = np.full(len(pair_partition), np.nan)
+        save_names, save_params = list(camera_names), [camera_params]
+        kept_partition, kept_camera, kept_area = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        cached = load_manifest_arrays(self.model_path, "visibility")
+        if (cached is not None and "pair_partition" in cached and np.array_equal(cached["corner_points"], corner_points)
+                and float(cached["max_distance"]) == self.max_distance):
+            # 缓存中的相机在保存时的序号: 本次的相机使用本次的序号(参数改变的相机为-1，结果不再使用)，
+            # 不在本次范围内的相机(如增量分块时的原有相机)追加在最后
+            camera_row = {name: idx for idx, name in enumerate(camera_names)}
+            column_map = np.full(len(cached["camera_names"]), -1, dtype=np.int64)
+            for column, name in enumerate(str(name) for name in cached["camera_names"]):
+                idx = camera_row.get(name)
+                if idx is None:
+                    column_map[column] = len(save_names)
+                    save_names.append(name)
+                    save_params.append(cached["camera_params"][column:column + 1])
+                elif np.array_equal(cached["camera_params"][column], camera_params[idx]):
+                    column_map[column] = idx
+            keep = column_map[cached["pair_camera"]] >= 0
+            kept_partition = cached["pair_partition"][keep]
+            kept_camera = column_map[cached["pair_camera"][keep]]
+            kept_area = cached["intersection_area"][keep]
+
+            kept_key = kept_partition * len(save_names) + kept_camera
+            order = np.argsort(kept_key, kind="stable")
+            query = pair_partition * len(save_names) + pair_camera
+            pos = np.minimum(np.searchsorted(kept_key[order], query), max(len(order) - 1, 0))
+            found = np.zeros(len(query), dtype=bool) if len(order) == 0 else kept_key[order][pos] == query
+            intersection_area[found] = kept_area[order[pos[found]]]
+
+        missing = np.nonzero(np.isnan(intersection_area))[0]
+        print(f"Visibility pairs: {len(pair_partition) - len(missing)} from cache, {len(missing)} computed")
+        if len(missing) > 0:
+            visibility = compute_visibility_pairs(corner_points, cams, pair_partition[missing], pair_camera[missing],
+                                                  max_distance=self.max_distance)
+            self.report_culling(visibility, len(missing))
+            intersection_area[missing] = visibility["intersection_area"]
+            save_manifest_arrays(self.model_path, "visibility", corner_points=corner_points,
+                                 camera_names=np.array(save_names, dtype=str),
+                                 camera_params=np.concatenate(save_params), max_distance=self.max_distance,
+                                 pair_partition=np.concatenate([kept_partition, pair_partition[missing]]),
+                                 pair_camera=np.concatenate([kept_camera, pair_camera[missing]]),
+                                 intersection_area=np.concatenate([kept_area, intersection_area[missing]]))
+
+        order = np.lexsort((pair_camera, pair_partition))
+        image_area = cams["width"] * cams["height"]
+        return {
+            "offsets": np.searchsorted(pair_partition[order], np.arange(corner_points.shape[0] + 1)),
+            "pair_camera": pair_camera[order],
+            "intersection_area": intersection_area[order],
+            "image_area": image_area,
+            "intersection_rate": intersection_area[order] / image_area[pair_camera[order]],
+        }
+
+    def report_culling(self, visibility, num_pairs):
+        """输出快速剔除掉的 (partition, camera) 对的数量"""
+        print(f"Visibility culling: {visibility['frustum_culled']} of {num_pairs} pairs rejected by frustum, "
+              f"{visibility['distance_culled']} by distance, "
+              f"{num_pairs - visibility['frustum_culled'] - visibility['distance_culled']} scored")
+
+    def update_partition_data(self, train_cameras):
+        """增量分块: 保持原有的分块边界不变，只将新增的相机加入对应的partition
+        1.新相机的中心位于某个partition拓展后的边界内时，按位置加入该partition
+        2.按位置加入j部分的新相机，若对i部分的能见度大于阈值，加入i部分，并将j部分中该相机可见的点加入i部分，
+          与完整分块相同，分层划分时i部分只考虑相邻粗分块中的j部分
+        只有加入了新相机的partition会被重新计算点云
+        """
+        self.partition_tree = load_manifest_meta(self.model_path).get("tree")  # 保存清单时保留分层划分的结构
+        input_cameras = load_manifest_arrays(self.model_path, "input_cameras")
+        old_names = set(str(name) for name in input_cameras["camera_names"])
+        new_poses = [CameraPose(camera=camera, pose=np.array(camera.camera_center.cpu()))
+                     for camera in train_cameras if camera.image_name not in old_names]
+        partition_list = [partition._replace(cameras=list(partition.cameras))
+                          for partition in self.load_partition_data(train_cameras)]
+        pcd = self.pcd
+
+        # 1.基于位置加入新相机
+        new_camera_index = SpatialIndex2D.from_points(np.array([camera_pose.pose for camera_pose in new_poses]))
+        position_poses = []  # 每个partition按位置加入的新相机
+        assigned = np.zeros(len(new_poses), dtype=bool)
+        affected = set()
+        extend_camera_bboxes = [partition.extend_camera_bbox for partition in partition_list]
+        for idx, (partition, inside) in enumerate(zip(partition_list, new_camera_index.query_boxes(extend_camera_bboxes))):
+            position_poses.append([new_poses[camera_idx] for camera_idx in inside])
+            partition.cameras.extend(position_poses[idx])
+            assigned[inside] = True
+            if len(inside) > 0:
+                affected.add(idx)
+        if not assigned.all():
+            print(f"[ WARNING ] {int((~assigned).sum())} new cameras lie outside all partitions, "
+                  f"remove {self.model_path}/partition_manifest to re-partition the whole scene.")
+
+        # 2.基于可见性加入新相机，只需要计算新相机的能见度
+        assigned_poses = [new_poses[camera_idx] for camera_idx in np.nonzero(assigned)[0]]
+        camera_index = {camera_pose.camera.image_name: idx for idx, camera_pose in enumerate(assigned_poses)}
+        cams = stack_cameras([camera_pose.camera for camera_pose in assigned_poses])
+        corner_points = np.array([list(self.get_8_corner_points(partition.extend_point_bbox).values())
+                                  for partition in partition_list])  # [P, 8, 3]
+        camera_lists = [[camera_index[camera_pose.camera.image_name] for camera_pose in poses] for poses in position_poses]
+        neighbors, pair_partition, pair_camera = self.candidate_pairs(partition_list, corner_points, cams, camera_lists)
+        visibility = None
+        if len(assigned_poses) > 0:  # 新相机的能见度同时写入缓存，之后的分块不需要重新计算
+            visibility = self.load_or_compute_visibility(corner_points, list(camera_index), cams,
+                                                         pair_partition, pair_camera)
+        position_indices = None  # 每个partition基于位置选择的点，需要时一起查询
+        for idx, partition_i in enumerate(partition_list):
+            point_mask = None
+            collect_names = set(camera_pose.camera.image_name for camera_pose in partition_i.cameras)
+            rate_of = {} if visibility is None else {camera_idx: float(visibility["intersection_rate"][pos])
+                                                     for camera_idx, pos in pair_lookup(visibility, idx).items()}
+            for idx_j in neighbors[idx]:
+                if idx_j == idx: continue
+                point_indices_j = None
+                for camera_pose in position_poses[idx_j]:
+                    camera_idx = camera_index[camera_pose.camera.image_name]
+                    visible_rate = partition_i.visible_rate if partition_i.visible_rate is not None else self.visible_rate
+                    if (rate_of.get(camera_idx, 0.0) < visible_rate
+                            or camera_pose.camera.image_name in collect_names):
+                        continue
+                    partition_i.cameras.append(camera_pose)
+                    collect_names.add(camera_pose.camera.image_name)
+                    if point_mask is None:
+                        point_mask = np.zeros(pcd.points.shape[0], dtype=bool)
+                        point_mask[partition_i.point_indices] = True
+                    if point_indices_j is None:  # j部分基于位置选择的点
+                        if position_indices is None:
+                            position_indices = self.points_in_boxes(extend_camera_bboxes, "update")
+                        point_indices_j = position_indices[idx_j]
+                    self.select_visible_points(point_mask, point_indices_j, camera_pose.camera.image_name, cams, camera_idx)
+                    affected.add(idx)
+            if point_mask is not None:
+                point_indices = np.nonzero(point_mask)[0]
+                partition_list[idx] = partition_i._replace(point_cloud=self.point_cloud_of(point_indices),
+                                                           point_indices=point_indices)
+
+        for idx in sorted(affected):
+            partition = partition_list[idx]
+            camera_centers = np.array([camera_pose.pose for camera_pose in partition.cameras])
+            storePly(os.path.join(self.partition_visible_dir, f'{partition.partition_id}_camera_centers.ply'),
+                     camera_centers, np.zeros_like(camera_centers))
+            partition_list[idx] = partition._replace(
+                num_init_points=self.store_init_points(partition.partition_id, partition.point_indices))
+        print(f"[ INFO ] {len(new_poses)} new cameras, updated partitions: "
+              f"{[partition_list[idx].partition_id for idx in sorted(affected)]}")
+        return partition_list
+
+    def select_partition_cameras(self, idx, partition_list, visibility, camera_index, cams, neighbors):
+        """对第i个partition进行基于可见性的相机选择与基于覆盖率的点选择，不修改任何输入，可以在子进程中执行
+        :param neighbors: 每个partition需要考虑的partition的序号，见candidate_pairs
+        :return: (加入的相机 [(j, 相机在j部分中的序号, camera_idx)], 能见度阈值, 选择后的点在原始点云中的索引)
+        """
+        partition_i = partition_list[idx]
+        # 基于覆盖率的点选择结果用原始点云上的mask表示，每个被选中的相机将其可见的点并入mask，无需拼接后再去重
+        point_mask = np.zeros(self.pcd.points.shape[0], dtype=bool)
+        point_mask[partition_i.point_indices] = True
+
+        # 候选相机: j部分中能见度不低于阈值、且还不在i部分中的相机，按j部分与相机的顺序排列
+        collect_names = set(camera_pose.camera.image_name for camera_pose in partition_i.cameras)
+        # 没有计算的对已被剔除，能见度为0
+        rate_of = {camera_idx: float(visibility["intersection_rate"][pos])
+                   for camera_idx, pos in pair_lookup(visibility, idx).items()}
+        candidates = []
+        for j in neighbors[idx]:  # 第j个partiiton
+            if j == idx: continue  # 如果当前partition与之前相同，则跳过
+            partition_j = partition_list[j]
+            for k, cameras_pose in enumerate(partition_j.cameras):
+                camera = cameras_pose.camera  # 获取当前相机
+                # i部分中点云边界框投影在j部分当前图像中的面积与当前图像面积的比值
+                camera_idx = camera_index[camera.image_name]
+                if rate_of.get(camera_idx, 0.0) >= self.visible_rate:
+                    if camera.image_name in collect_names:
+                        continue  # 如果相机已经存在，则不需要再重复添加
+                    candidates.append((j, k, camera_idx))
+                    collect_names.add(camera.image_name)
 
+        # 设置了相机/点的上限时，提高i部分的能见度阈值，使加入的相机与点不超过上限
+        rates = np.array([rate_of.get(camera_idx, 0.0) for _, _, camera_idx in candidates])
+        visible_rate = self.visible_rate
+        if self.max_cameras > 0 or self.max_points > 0:
+            visible_rate = self.tune_visible_rate(
+                partition_i, [(partition_list[j], partition_list[j].cameras[k], camera_idx) for j, k, camera_idx in candidates],
+                rates, point_mask, cams)
+
+        accepted = []
+        for (j, k, camera_idx), rate in zip(candidates, rates):
+            if rate < visible_rate: continue
+            accepted.append((j, k, camera_idx))
+            if self.max_points <= 0:  # 设置了点的上限时，可见的点已经在tune_visible_rate中并入
+                # 基于覆盖率的点选择，筛选在j部分中的所有点中哪些可以投影在当前图像中
+                self.select_visible_points(point_mask, partition_list[j].point_indices,
+                                           partition_list[j].cameras[k].camera.image_name, cams, camera_idx)
+        return accepted, visible_rate, np.nonzero(point_mask)[0]
 
     def Visibility_based_camera_selection(self, partition_list):
         """3.基于可见性的相机选择 和 基于覆盖率的点选择
@@ -433,95 +1121,61 @@ class ProgressiveDataPartitioning:
             3.计算投影区域面积与图像像素面积的比值，作为能见度
             4.将j中能见度大于阈值的相机s加入i中
             5.将j中所有可以投影到相机s的点云加入到i中
+        每个partition的选择相互独立，num_workers>1时在多个进程中并行计算，结果按partition的顺序写回，与串行计算相同
         :param visible_rate: 能见度阈值 默认为0.25 同论文
         """
-        # 复制一份新的变量，用于添加可视相机后的每个部分的所有相机
-        # 防止相机和点云被重复添加
-        add_visible_camera_partition_list = copy.deepcopy(partition_list)
-        client = 0
-        for idx, partition_i in enumerate(partition_list):  # 第i个partition
-            new_points = []  # 提前创建空的数组 用于保存新增的点
-            new_colors = []
-            new_normals = []
-
-            pcd_i = partition_i.point_cloud
-            partition_id_i = partition_i.partition_id  # 获取当前partition的编号
-            # 获取当前partition中点云围成的边界框的8角坐标
-            partition_ori_point_bbox = partition_i.ori_point_bbox
-            partition_extend_point_bbox = partition_i.extend_point_bbox
-            ori_8_corner_points = self.get_8_corner_points(partition_ori_point_bbox)  # 获取点云围成的边界的8个角点的坐标
-            extent_8_corner_points = self.get_8_corner_points(partition_extend_point_bbox)
-
-            corner_points = []
-            for point in extent_8_corner_points.values():
-                corner_points.append(point)
+        # 复制每个partition的相机列表，用于添加可视相机后的每个部分的所有相机
+        # 相机对象本身不会被修改，只需要复制列表，防止相机被重复添加
+        add_visible_camera_partition_list = [partition._replace(cameras=list(partition.cameras))
+                                             for partition in partition_list]
+
+        # 所有partition中出现过的相机(按image_name去重)，以及每个partition边界框的8个角点
+        camera_index = {}
+        all_cameras = []
+        for partition in partition_list:
+            for camera_pose in partition.cameras:
+                if camera_pose.camera.image_name not in camera_index:
+                    camera_index[camera_pose.camera.image_name] = len(all_cameras)
+                    all_cameras.append(camera_pose.camera)
+        corner_points = np.array([list(self.get_8_corner_points(partition.extend_point_bbox).values())
+                                  for partition in partition_list])  # [P, 8, 3]
+        # airspace-aware visibility: 一次性将所有候选 (partition, camera) 对的角点投影到相机中，得到它们的能见度
+        cams = stack_cameras(all_cameras)
+        camera_lists = [[camera_index[camera_pose.camera.image_name] for camera_pose in partition.cameras]
+                        for partition in partition_list]
+        neighbors, pair_partition, pair_camera = self.candidate_pairs(partition_list, corner_points, cams, camera_lists)
+        visibility = self.load_or_compute_visibility(corner_points, list(camera_index), cams, pair_partition, pair_camera)
+
+        results = map_partitions(self.select_partition_cameras, (partition_list, visibility, camera_index, cams, neighbors),
+                                 len(partition_list), self.num_workers)
+
+        for idx, (accepted, visible_rate, point_indices) in enumerate(results):  # 第i个partition
+            partition_id_i = partition_list[idx].partition_id  # 获取当前partition的编号
             storePly(os.path.join(self.partition_extend_dir, f'{partition_id_i}_corner_points.ply'),
-                     np.array(corner_points),
-                     np.zeros_like(np.array(corner_points)))
-
-            total_partition_camera_count = 0  # 当前partition中的相机数量
-            for partition_j in partition_list:  # 第j个partiiton
-                partition_id_j = partition_j.partition_id  # 获取当前partition的编号
-                if partition_id_i == partition_id_j: continue  # 如果当前partition与之前相同，则跳过
-                print(f"Now processing partition i:{partition_id_i} and j:{partition_id_j}")
-                # 获取当前partition中的点云
-                pcd_j = partition_j.point_cloud
-
-                append_camera_count = 0  # 用于记录第j个parition被添加了个新相机
-                # 依次获取第j个partition中每个相机的投影矩阵
-                # Visibility_based_camera_selection
-                for cameras_pose in partition_j.cameras:
-                    camera = cameras_pose.camera  # 获取当前相机
-                    # 将i区域的点云投影到相机平面
-                    # 3D points distributed on the object surface
-                    # _, points_in_image, _ = self.point_in_image(camera, pcd_i.points)
-                    # if not len(points_in_image) > 3: continue
-
-                    # 将i部分的point_cloud边界框投影到j的当前相机中
-                    # Visibility_based_camera_selection
-                    # airspace-aware visibility
-                    proj_8_corner_points = {}
-                    for key, point in extent_8_corner_points.items():
-                        points_in_image, _, _ = self.point_in_image(camera, np.array([point]))
-                        if len(points_in_image) == 0: continue
-                        proj_8_corner_points[key] = points_in_image[0]
-
-                    # 基于覆盖率的点选择
-                    # i部分中点云边界框投影在j部分当前图像中的面积与当前图像面积的比值
-                    if not len(list(proj_8_corner_points.values())) > 3: continue
-                    pkg = run_graham_scan(list(proj_8_corner_points.values()), camera.image_width, camera.image_height)
-                    # pkg = run_graham_scan(points_in_image, camera.image_width, camera.image_height)
-                    if pkg["intersection_rate"] >= self.visible_rate:
-                        collect_names = [camera_pose.camera.image_name for camera_pose in add_visible_camera_partition_list[idx].cameras]
-                        if cameras_pose.camera.image_name in collect_names:
-                            # print("skip")
-                            continue  # 如果相机已经存在，则不需要再重复添加
-                        append_camera_count += 1
-                        # print(f"Partition {idx} Append Camera {camera.image_name}")
-                        # 如果空域感知比率大于阈值，则将j中的当前相机添加到i部分中
-                        add_visible_camera_partition_list[idx].cameras.append(cameras_pose)
-                        # 筛选在j部分中的所有点中哪些可以投影在当前图像中
-                        # Coverage-based point selection
-                        _, _, mask = self.point_in_image(camera, pcd_j.points)  # 在原始点云上需要新增的点
-                        updated_points, updated_colors, updated_normals = pcd_j.points[mask], pcd_j.colors[mask], pcd_j.normals[mask]
-                        # 更新i部分的需要新增的点云，因为有许多相机可能会观察到相同的点云，因此需要对点云进行去重
-                        new_points.append(updated_points)
-                        new_colors.append(updated_colors)
-                        new_normals.append(updated_normals)
-
-                        with open(os.path.join(self.model_path, "graham_scan"), 'a') as f:
-                            f.write(f"intersection_area:{pkg['intersection_area']}\t"
-                                    f"image_area:{pkg['image_area']}\t"
-                                    f"intersection_rate:{pkg['intersection_rate']}\t"
-                                    f"partition_i:{partition_id_i}\t"
-                                    f"partition_j:{partition_id_j}\t"
-                                    f"append_camera_id:{camera.image_name}\t"
-                                    f"append_camera_count:{append_camera_count}\n")
-                total_partition_camera_count += append_camera_count
+                     corner_points[idx],
+                     np.zeros_like(corner_points[idx]))
+
+            append_camera_count = {}  # 用于记录第j个parition被添加了个新相机
+            pairs = pair_lookup(visibility, idx)
+            for j, k, camera_idx in accepted:
+                cameras_pose = partition_list[j].cameras[k]
+                partition_id_j = partition_list[j].partition_id
+                append_camera_count[partition_id_j] = append_camera_count.get(partition_id_j, 0) + 1
+                # 如果空域感知比率大于阈值，则将j中的当前相机添加到i部分中
+                add_visible_camera_partition_list[idx].cameras.append(cameras_pose)
+                with open(os.path.join(self.model_path, "graham_scan"), 'a') as f:
+                    pos = pairs.get(camera_idx)
+                    f.write(f"intersection_area:{visibility['intersection_area'][pos] if pos is not None else 0.0}\t"
+                            f"image_area:{visibility['image_area'][camera_idx]}\t"
+                            f"intersection_rate:{visibility['intersection_rate'][pos] if pos is not None else 0.0}\t"
+                            f"partition_i:{partition_id_i}\t"
+                            f"partition_j:{partition_id_j}\t"
+                            f"append_camera_id:{cameras_pose.camera.image_name}\t"
+                            f"append_camera_count:{append_camera_count[partition_id_j]}\n")
 
             with open(os.path.join(self.model_path, "partition_cameras"), 'a') as f:
                 f.write(f"partition_id:{partition_id_i}\t"
-                        f"total_append_camera_count:{total_partition_camera_count}\t"
+                        f"total_append_camera_count:{len(accepted)}\t"
                         f"total_camera:{len(add_visible_camera_partition_list[idx].cameras)}\n")
 
             camera_centers = []
@@ -532,24 +1186,10 @@ class ProgressiveDataPartitioning:
             storePly(os.path.join(self.partition_visible_dir, f'{partition_id_i}_camera_centers.ply'), np.array(camera_centers),
                      np.zeros_like(np.array(camera_centers)))
 
-            # 点云去重
-            point_cloud = add_visible_camera_partition_list[idx].point_cloud
-            new_points.append(point_cloud.points)
-            new_colors.append(point_cloud.colors)
-            new_normals.append(point_cloud.normals)
-            new_points = np.concatenate(new_points, axis=0)
-            new_colors = np.concatenate(new_colors, axis=0)
-            new_normals = np.concatenate(new_normals, axis=0)
-
-            new_points, mask = np.unique(new_points, return_index=True, axis=0)
-            new_colors = new_colors[mask]
-            new_normals = new_normals[mask]
-
-            # 当第j部分所有相机都筛选完之后，更新最终的点云
+            # 当第j部分所有相机都筛选完之后，更新最终的点云，并保存可见性选择后每个partition的点云
             add_visible_camera_partition_list[idx] = add_visible_camera_partition_list[idx]._replace(
-                point_cloud=BasicPointCloud(points=new_points, colors=new_colors,
-                                            normals=new_normals))  # 更新点云，新增的点云有许多重复的点，需要在后面剔除掉
-            storePly(os.path.join(self.partition_visible_dir, f"{partition_id_i}_visible.ply"), new_points,
-                     new_colors)  # 保存可见性选择后每个partition的点云
+                point_cloud=self.point_cloud_of(point_indices),
+                point_indices=point_indices, visible_rate=visible_rate,
+                num_init_points=self.store_init_points(partition_id_i, point_indices))  # 更新点云
 
         return add_visible_camera_partition_list
@@ -106,3 +106,198 @@ def run_graham_scan(points, W, H):
         "image_area": image_area,
         "intersection_rate": intersection_rate,
     }
+
+
+def batch_convex_hull(points, valid):
+    """Andrew单调链算法，一次性计算N组点的凸包
+    :param points: [N, K, 2] 每组点的坐标
+    :param valid: [N, K] 每个点是否参与计算
+    :return hull: [N, 2K, 2] 按逆时针排列的凸包顶点(多余位置补0), count: [N] 每个凸包的顶点数
+    """
+    points = np.asarray(points, dtype=np.float64)
+    valid = np.asarray(valid, dtype=bool)
+    N, K = valid.shape
+    rows = np.arange(N)
+
+    # 按 (x, y) 排序，无效点排在最后
+    order = np.lexsort((points[..., 1], points[..., 0], ~valid), axis=-1)
+    points = np.take_along_axis(points, order[..., None], axis=1)
+    num_valid = valid.sum(axis=1)
+
+    def half_hull(indices):
+        stack = np.zeros((N, K, 2))
+        length = np.zeros(N, dtype=np.int64)
+        for k in indices:
+            point = points[:, k]
+            active = k < num_valid
+            for _ in range(K):  # 弹出所有不构成左转的点
+                can_pop = active & (length >= 2)
+                a = stack[rows, np.maximum(length - 2, 0)]
+                b = stack[rows, np.maximum(length - 1, 0)]
+                cross = (b[:, 0] - a[:, 0]) * (point[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (point[:, 0] - a[:, 0])
+                pop = can_pop & (cross <= 0)
+                if not pop.any():
+                    break
+                length -= pop
+            stack[rows[active], length[active]] = point[active]
+            length += active
+        return stack, length
+
+    lower, lower_len = half_hull(range(K))
+    upper, upper_len = half_hull(range(K - 1, -1, -1))
+
+    # 去掉上下凸包各自的最后一个点后拼接
+    lower_len = np.maximum(lower_len - 1, 0)
+    upper_len = np.maximum(upper_len - 1, 0)
+    count = lower_len + upper_len
+    slots = np.arange(2 * K)[None, :]
+    from_lower = slots < lower_len[:, None]
+    lower_idx = np.minimum(slots, K - 1)
+    upper_idx = np.clip(slots - lower_len[:, None], 0, K - 1)
+    hull = np.where(from_lower[..., None],
+                    np.take_along_axis(lower, np.broadcast_to(lower_idx, (N, 2 * K))[..., None], axis=1),
+                    np.take_along_axis(upper, upper_idx[..., None], axis=1))
+    hull[slots >= count[:, None]] = 0
+    count[count < 3] = 0  # 少于3个顶点的凸包面积为0
+    return hull, count
+
+
+def _clip_polygons(polygons, count, coefficients, offsets):
+    """Sutherland–Hodgman算法，使用半平面 a·p + b >= 0 裁剪N个凸多边形
+    :param polygons: [N, M, 2], count: [N]
+    :param coefficients: [N, 2] 半平面法向量 a, offsets: [N] 半平面偏移 b
+    """
+    N, M, _ = polygons.shape
+    slots = np.arange(M)[None, :]
+    exists = slots < count[:, None]
+    prev_idx = (slots - 1) % np.maximum(count, 1)[:, None]
+    prev = np.take_along_axis(polygons, prev_idx[..., None], axis=1)
+
+    f_cur = np.einsum("nmk,nk->nm", polygons, coefficients) + offsets[:, None]
+    f_prev = np.einsum("nmk,nk->nm", prev, coefficients) + offsets[:, None]
+    cur_inside = f_cur >= 0
+    prev_inside = f_prev >= 0
+    crossing = exists & (cur_inside != prev_inside)
+    denominator = np.where(crossing, f_prev - f_cur, 1.0)
+    t = np.where(crossing, f_prev / denominator, 0.0)
+    intersection = prev + t[..., None] * (polygons - prev)
+
+    # 每个顶点最多输出两个点: 与裁剪边的交点、当前顶点
+    candidates = np.stack([intersection, polygons], axis=2).reshape(N, 2 * M, 2)
+    keep = np.stack([crossing, exists & cur_inside], axis=2).reshape(N, 2 * M)
+    order = np.argsort(~keep, axis=1, kind="stable")
+    new_count = keep.sum(axis=1)
+    width = max(int(new_count.max(initial=0)), 1)
+    clipped = np.take_along_axis(candidates, order[:, :width, None], axis=1)
+    clipped[np.arange(width)[None, :] >= new_count[:, None]] = 0
+    return clipped, new_count
+
+
+def polygon_area(polygons, count):
+    """鞋带公式计算N个多边形的面积"""
+    slots = np.arange(polygons.shape[1])[None, :]
+    next_idx = (slots + 1) % np.maximum(count, 1)[:, None]
+    nxt = np.take_along_axis(polygons, next_idx[..., None], axis=1)
+    cross = polygons[..., 0] * nxt[..., 1] - nxt[..., 0] * polygons[..., 1]
+    cross[slots >= count[:, None]] = 0
+    return np.abs(cross.sum(axis=1)) / 2
+
+
+def batch_intersection_rate(points, valid, W, H):
+    """run_graham_scan 的批量版本: 一次性计算N组投影点的凸包与图像矩形 [0, W] x [0, H] 的交集面积
+    :param points: [N, K, 2] 每组点的坐标
+    :param valid: [N, K] 每个点是否参与计算
+    :param W: [N] 或标量 图像宽度
+    :param H: [N] 或标量 图像高度
+    :return: 与 run_graham_scan 相同的字典，每个值都是长度为N的数组
+    """
+    N = np.asarray(valid).shape[0]
+    W = np.broadcast_to(np.asarray(W, dtype=np.float64), (N,))
+    H = np.broadcast_to(np.asarray(H, dtype=np.float64), (N,))
+    polygons, count = batch_convex_hull(points, valid)
+
+    zeros, ones = np.zeros(N), np.ones(N)
+    half_planes = [
+        (np.stack([ones, zeros], axis=1), zeros),   # x >= 0
+        (np.stack([-ones, zeros], axis=1), W),      # x <= W
+        (np.stack([zeros, ones], axis=1), zeros),   # y >= 0
+        (np.stack([zeros, -ones], axis=1), H),      # y <= H
+    ]
+    for coefficients, offsets in half_planes:
+        polygons, count = _clip_polygons(polygons, count, coefficients, offsets)
+
+    intersection_area = polygon_area(polygons, count)
+    image_area = W * H
+    return {
+        "intersection_area": intersection_area,
+        "image_area": image_area,
+        "intersection_rate": intersection_area / image_area,
+    }
+
+
+def reference_intersection_area(points, valid, W, H):
+    """run_graham_scan 对一组点的结果，只使用有效的点；少于3个点或所有点共线时凸包退化，面积为0"""
+    points = np.asarray(points, dtype=np.float64)[np.asarray(valid, dtype=bool)]
+    if len(np.unique(points, axis=0)) < 3:
+        return 0.0
+    try:
+        return run_graham_scan(points, W, H)["intersection_area"]
+    except Exception:  # scipy的QhullError: 点共线等退化的情况
+        return 0.0
+
+
+def random_test_points(rng, W, H, K=8):
+    """随机生成一组投影点，覆盖一般位置、共线/重复的角点、完全位于图像外、完全包含图像、有效点少于3个等情况
+    :return: points [K, 2], valid [K]
+    """
+    case = rng.integers(6)
+    scale = np.array([W, H])
+    points = rng.uniform(-0.5, 1.5, size=(K, 2)) * scale  # 一般位置，部分位于图像外
+    valid = rng.random(K) < 0.8
+    if case == 1:  # 共线的点，以及重复的角点
+        t = rng.uniform(-0.5, 1.5, size=K)
+        direction = rng.normal(size=2)
+        points = scale / 2 + t[:, None] * direction[None, :] * scale
+        if rng.random() < 0.5:
+            points[:K // 2] = rng.uniform(0, 1, size=(K // 2, 2)) * scale
+            points[K // 2:] = points[rng.integers(K // 2, size=K - K // 2)]
+    elif case == 2:  # 完全位于图像的某一侧之外
+        side = rng.integers(4)
+        axis, sign = side // 2, 1 if side % 2 else -1
+        points[:, axis] = (rng.uniform(1.01, 2.0, size=K) if sign > 0 else rng.uniform(-1.0, -0.01, size=K)) * scale[axis]
+    elif case == 3:  # 凸包完全包含图像
+        points = np.concatenate([np.array([[-1, -1], [2, -1], [2, 2], [-1, 2]]) * scale,
+                                 rng.uniform(-1, 2, size=(K - 4, 2)) * scale])
+        valid[:4] = True
+    elif case == 4:  # 有效点少于3个
+        valid[:] = False
+        valid[rng.choice(K, size=rng.integers(3), replace=False)] = True
+    elif case == 5:  # 整数坐标，大量重合的点与共线的边
+        points = np.round(rng.uniform(-0.5, 1.5, size=(K, 2)) * 4) / 4 * scale
+    return points, valid
+
+
+def check_batch_intersection_rate(num_trials=5000, seed=0, rtol=1e-9):
+    """随机比较 batch_intersection_rate 与参考实现 run_graham_scan 的交集面积
+    :return: 最大的相对误差(相对于图像面积)
+    """
+    rng = np.random.default_rng(seed)
+    W = rng.integers(100, 4000, size=num_trials).astype(np.float64)
+    H = rng.integers(100, 4000, size=num_trials).astype(np.float64)
+    cases = [random_test_points(rng, W[idx], H[idx]) for idx in range(num_trials)]
+    points = np.stack([points for points, _ in cases])
+    valid = np.stack([valid for _, valid in cases])
+
+    batch = batch_intersection_rate(points, valid, W, H)["intersection_area"]
+    reference = np.array([reference_intersection_area(points[idx], valid[idx], W[idx], H[idx])
+                          for idx in range(num_trials)])
+    error = np.abs(batch - reference) / (W * H)
+    worst = int(np.argmax(error))
+    assert error[worst] <= rtol, (f"batch_intersection_rate differs from run_graham_scan: {batch[worst]} vs "
+                                  f"{reference[worst]}, points {points[worst][valid[worst]].tolist()}, W {W[worst]}, H {H[worst]}")
+    return float(error[worst])
+
+
+if __name__ == "__main__":
+    # python scene/vastgs/graham_scan.py 检查批量实现与参考实现的结果是否一致
+    print(f"max relative error: {check_batch_intersection_rate():.3e}")
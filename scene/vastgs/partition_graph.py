@@ -0,0 +1,81 @@
+# Author: Peilun Kang
+# Contact: kangpeilun@nefu.edu.cn
+# License: Apache Licence
+# Project: VastGaussian
+# File: partition_graph.py
+# Time: 10/17/26 9:05 PM
+# Des: partition之间的邻接图
+"""
+由每个partition无缝的原始边界(ori_camera_bbox)得到邻接关系: 两个partition的边界框有一条边重合且重合部分长度大于0时相邻，
+每条边记录公共边界线段，以及两个partition共同拥有的相机数量(拓展边界与可见性选择后)，
+调度、合并以及考虑边界的训练可以直接使用，不需要根据编号重新推导位置
+"""
+import numpy as np
+
+
+def build_adjacency(partition_list, tolerance=1e-9):
+    """
+    :param partition_list: CameraPartition 列表
+    :param tolerance: 判断两条边重合时的相对容差
+    :return: list of dict, partitions [a, b], axis (公共边界垂直于哪个轴 "x"/"z"), boundary [[x, z], [x, z]] 公共边界线段,
+             shared_cameras 两个partition共同拥有的相机数量
+    """
+    bboxes = np.array([partition.ori_camera_bbox for partition in partition_list], dtype=np.float64).reshape(-1, 4)
+    scale = tolerance * max(float(np.abs(bboxes).max()) if bboxes.size > 0 else 1.0, 1.0)
+    camera_names = [set(camera_pose.camera.image_name for camera_pose in partition.cameras) for partition in partition_list]
+
+    edges = []
+    # axis=0: a的x_max与b的x_min重合，公共边界沿z轴  axis=1: a的z_max与b的z_min重合，公共边界沿x轴
+    for axis, name in [(0, "x"), (1, "z")]:
+        low, high = bboxes[:, 2 * axis], bboxes[:, 2 * axis + 1]
+        other_low, other_high = bboxes[:, 2 - 2 * axis], bboxes[:, 3 - 2 * axis]
+        touch = np.abs(high[:, None] - low[None, :]) <= scale  # [P, P]
+        overlap_low = np.maximum(other_low[:, None], other_low[None, :])
+        overlap_high = np.minimum(other_high[:, None], other_high[None, :])
+        for a, b in zip(*np.nonzero(touch & (overlap_high - overlap_low > scale))):
+            position = float(high[a])
+            segment = [float(overlap_low[a, b]), float(overlap_high[a, b])]
+            boundary = [[position, segment[0]], [position, segment[1]]] if axis == 0 else \
+                [[segment[0], position], [segment[1], position]]
+            edges.append({"partitions": [partition_list[a].partition_id, partition_list[b].partition_id],
+                          "axis": name, "boundary": boundary,
+                          "shared_cameras": len(camera_names[a] & camera_names[b])})
+    return edges
+
+
+def neighbor_aware_order(partition_ids, adjacency):
+    """调整partition的训练顺序，使相邻且共享相机较多的partition连续训练，它们的图片可以留在缓存中
+    从第一个partition开始，每次选择与上一个partition共享相机最多的未训练的邻居，没有邻居时按原顺序取下一个
+    """
+    weight = {}
+    for edge in adjacency:
+        a, b = edge["partitions"]
+        weight.setdefault(a, {})[b] = edge["shared_cameras"]
+        weight.setdefault(b, {})[a] = edge["shared_cameras"]
+
+    remaining = list(partition_ids)
+    order = [remaining.pop(0)] if remaining else []
+    while remaining:
+        previous = weight.get(order[-1], {})
+        candidates = [partition_id for partition_id in remaining if partition_id in previous]
+        current = max(candidates, key=lambda partition_id: previous[partition_id]) if candidates else remaining[0]
+        remaining.remove(current)
+        order.append(current)
+    return order
+
+
+def gpu_partition_order(partition_ids, adjacency, num_gpus):
+    """按GPU调度调整partition列表的顺序
+    train_vast.py 在第i轮把列表中第 i + training_round*j 个partition分配给第j块GPU，即第j块GPU依次训练
+    [j*training_round, (j+1)*training_round) 这一段，剩余的 remainder 个partition在最后一轮同时分给前 remainder 块GPU
+    因此为每块GPU单独构造一条相邻链，使同一块GPU上先后训练的partition相邻且共享相机较多
+    """
+    num_gpus = max(int(num_gpus), 1)
+    training_round = len(partition_ids) // num_gpus
+    remaining = list(partition_ids)
+    order = []
+    for _ in range(num_gpus if training_round > 0 else 0):
+        chain = neighbor_aware_order(remaining, adjacency)[:training_round]  # 第j块GPU依次训练的partition
+        order.extend(chain)
+        remaining = [partition_id for partition_id in remaining if partition_id not in chain]
+    return order + remaining  # 最后一轮的partition在不同GPU上同时训练，顺序不影响
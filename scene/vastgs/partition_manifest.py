@@ -0,0 +1,140 @@
+# Author: Peilun Kang
+# Contact: kangpeilun@nefu.edu.cn
+# License: Apache Licence
+# Project: VastGaussian
+# File: partition_manifest.py
+# Time: 10/17/26 3:40 PM
+# Des: 分块结果的清单文件，替代 partition_data.pkl
+"""
+分块结果保存在 <model_path>/partition_manifest 目录下:
+    manifest.json           版本号、分块参数、所有相机的图片名，以及每个partition的编号、边界框、相机和点的数量
+    <partition_id>_cameras.npy  该partition中的相机在 camera_names 中的索引
+    <partition_id>_points.npy   该partition中的点在分块所用点云中的索引
+manifest.json中还保存了partition之间的邻接图(adjacency)，分层划分时还保存了树(粗分块及其子块)，每个子块记录其所在的粗分块(parent)，训练与无缝合并只使用子块
+只需要边界框的地方(如无缝合并)只读取json，需要某个partition的点时只加载对应的索引文件(memmap)
+"""
+import os
+import pickle
+
+import numpy as np
+
+from utils.cache_utils import atomic_save_json, atomic_save_npy, atomic_write, load_json
+
+MANIFEST_VERSION = 1
+MANIFEST_DIR_NAME = "partition_manifest"
+LEGACY_PARTITION_DATA = "partition_data.pkl"
+BBOX_KEYS = ["ori_camera_bbox", "extend_camera_bbox", "ori_point_bbox", "extend_point_bbox"]
+
+
+def get_manifest_dir(model_path):
+    return os.path.join(model_path, MANIFEST_DIR_NAME)
+
+
+def save_partition_manifest(model_path, partition_list, num_points, fingerprint="", tree=None, adjacency=None, **params):
+    """
+    :param partition_list: CameraPartition 列表，point_indices 为点在分块所用点云中的索引
+    :param num_points: 分块所用点云中点的数量，用于检查索引与点云是否匹配
+    :param fingerprint: 分块输入(点云、相机、分块参数)的指纹，输入改变时清单失效
+    :param tree: 分层划分时的粗分块列表，每个元素包含 node_id, ori_camera_bbox, inf_sides, children(子块编号)
+    :param adjacency: partition之间的邻接图，见partition_graph.build_adjacency
+    :param params: 额外写入清单的分块参数，如 m_region, n_region, visible_rate
+    """
+    manifest_dir = get_manifest_dir(model_path)
+    os.makedirs(manifest_dir, exist_ok=True)
+
+    camera_names = []
+    camera_index = {}
+    partitions = []
+    parent = {child: node["node_id"] for node in (tree or []) for child in node["children"]}
+    for partition in partition_list:
+        indices = []
+        for camera_pose in partition.cameras:
+            image_name = camera_pose.camera.image_name
+            if image_name not in camera_index:
+                camera_index[image_name] = len(camera_names)
+                camera_names.append(image_name)
+            indices.append(camera_index[image_name])
+        atomic_save_npy(os.path.join(manifest_dir, f"{partition.partition_id}_cameras.npy"),
+                        np.array(indices, dtype=np.int32))
+        atomic_save_npy(os.path.join(manifest_dir, f"{partition.partition_id}_points.npy"),
+                        np.asarray(partition.point_indices, dtype=np.int64))
+
+        meta = {"partition_id": partition.partition_id, "extend_rate": float(partition.extend_rate),
+                "num_cameras": len(indices), "num_points": int(len(partition.point_indices))}
+        meta.update({key: [float(value) for value in getattr(partition, key)] for key in BBOX_KEYS})
+        if getattr(partition, "inf_sides", None) is not None:
+            meta["inf_sides"] = [bool(flag) for flag in partition.inf_sides]
+        if partition.partition_id in parent:
+            meta["parent"] = parent[partition.partition_id]
+        if getattr(partition, "visible_rate", None) is not None:
+            meta["visible_rate"] = float(partition.visible_rate)
+        if getattr(partition, "num_init_points", None) is not None:
+            meta["num_init_points"] = int(partition.num_init_points)  # 体素降采样后训练使用的初始点数
+        partitions.append(meta)
+
+    # manifest.json最后写入，存在即表示清单完整
+    manifest = {"version": MANIFEST_VERSION, "fingerprint": fingerprint, "num_points": int(num_points),
+                "params": params, "camera_names": camera_names, "partitions": partitions}
+    if tree is not None:
+        manifest["tree"] = tree
+    if adjacency is not None:
+        manifest["adjacency"] = adjacency
+    atomic_save_json(os.path.join(manifest_dir, "manifest.json"), manifest)
+
+
+def load_manifest_meta(model_path):
+    """只读取清单中的元数据，清单不存在或版本不匹配时返回None"""
+    manifest = load_json(os.path.join(get_manifest_dir(model_path), "manifest.json"))
+    if manifest is None or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest_arrays(model_path, name, **arrays):
+    """在清单目录中保存分块的中间结果(如能见度矩阵)，用于参数改变后的增量计算"""
+    manifest_dir = get_manifest_dir(model_path)
+    os.makedirs(manifest_dir, exist_ok=True)
+    atomic_write(os.path.join(manifest_dir, f"{name}.npz"), lambda file: np.savez(file, **arrays))
+
+
+def load_manifest_arrays(model_path, name):
+    """读取save_manifest_arrays保存的数组，不存在时返回None"""
+    path = os.path.join(get_manifest_dir(model_path), f"{name}.npz")
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def load_partition_camera_names(model_path, manifest, partition_id):
+    """读取某个partition中所有相机的图片名"""
+    indices = np.load(os.path.join(get_manifest_dir(model_path), f"{partition_id}_cameras.npy"))
+    return [manifest["camera_names"][idx] for idx in indices]
+
+
+def load_partition_point_indices(model_path, partition_id, mmap=True):
+    """读取某个partition中的点在分块所用点云中的索引"""
+    return np.load(os.path.join(get_manifest_dir(model_path), f"{partition_id}_points.npy"),
+                   mmap_mode="r" if mmap else None)
+
+
+def load_partition_adjacency(model_path):
+    """读取partition之间的邻接图，清单中没有时返回None"""
+    manifest = load_manifest_meta(model_path)
+    return manifest.get("adjacency") if manifest is not None else None
+
+
+def load_partition_bboxes(model_path):
+    """读取每个partition的编号与边界框，用于无缝合并
+    优先读取清单，旧版本的输出目录中只有 partition_data.pkl 时从pkl中读取
+    :return: list of dict, partition_id, ori_camera_bbox, extend_camera_bbox, ...
+             以及inf_sides(位于场景外侧的边，旧版本的结果中没有)
+    """
+    manifest = load_manifest_meta(model_path)
+    if manifest is not None:
+        return manifest["partitions"]
+
+    with open(os.path.join(model_path, LEGACY_PARTITION_DATA), "rb") as f:
+        partition_scene = pickle.load(f)
+    return [{"partition_id": partition.partition_id, **{key: list(getattr(partition, key)) for key in BBOX_KEYS}}
+            for partition in partition_scene]
@@ -9,11 +9,11 @@ import os.path
 import json
 import numpy as np
 from glob import glob
-import pickle
 
 import torch
-from plyfile import PlyData, PlyElement
+from utils.ply_utils import load_gaussian_ply
 from scene.gaussian_model import GaussianModel
+from scene.vastgs.partition_manifest import load_partition_bboxes
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 
@@ -44,40 +44,7 @@ def extend_inf_x_z_bbox(partition_id, m_region, n_region):
 
 
 def load_ply(path):
-    plydata = PlyData.read(path)
-    max_sh_degree = 3
-    xyz = np.stack((np.asarray(plydata.elements[0]["x"]),
-                    np.asarray(plydata.elements[0]["y"]),
-                    np.asarray(plydata.elements[0]["z"])), axis=1)
-    opacities = np.asarray(plydata.elements[0]["opacity"])[..., np.newaxis]
-
-    features_dc = np.zeros((xyz.shape[0], 3, 1))
-    features_dc[:, 0, 0] = np.asarray(plydata.elements[0]["f_dc_0"])
-    features_dc[:, 1, 0] = np.asarray(plydata.elements[0]["f_dc_1"])
-    features_dc[:, 2, 0] = np.asarray(plydata.elements[0]["f_dc_2"])
-
-    extra_f_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("f_rest_")]
-    extra_f_names = sorted(extra_f_names, key=lambda x: int(x.split('_')[-1]))
-    assert len(extra_f_names) == 3 * (max_sh_degree + 1) ** 2 - 3
-    features_extra = np.zeros((xyz.shape[0], len(extra_f_names)))
-    for idx, attr_name in enumerate(extra_f_names):
-        features_extra[:, idx] = np.asarray(plydata.elements[0][attr_name])
-    # Reshape (P,F*SH_coeffs) to (P, F, SH_coeffs except DC)
-    features_extra = features_extra.reshape((features_extra.shape[0], 3, (max_sh_degree + 1) ** 2 - 1))
-
-    scale_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("scale_")]
-    scale_names = sorted(scale_names, key=lambda x: int(x.split('_')[-1]))
-    scales = np.zeros((xyz.shape[0], len(scale_names)))
-    for idx, attr_name in enumerate(scale_names):
-        scales[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-    rot_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("rot")]
-    rot_names = sorted(rot_names, key=lambda x: int(x.split('_')[-1]))
-    rots = np.zeros((xyz.shape[0], len(rot_names)))
-    for idx, attr_name in enumerate(rot_names):
-        rots[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-    return xyz, features_dc, features_extra, opacities, scales, rots
+    return load_gaussian_ply(path, max_sh_degree=3)
 
 
 def extract_point_cloud(points, bbox):
@@ -91,14 +58,14 @@ def extract_point_cloud(points, bbox):
 def seamless_merge(model_path, partition_point_cloud_dir):
     save_merge_dir = os.path.join(partition_point_cloud_dir, "point_cloud.ply")
 
-    # 加载partition数据
-    with open(os.path.join(model_path, "partition_data.pkl"), "rb") as f:
-        partition_scene = pickle.load(f)
+    # 加载partition数据，只需要清单中每个partition的编号与边界框
+    partition_scene = load_partition_bboxes(model_path)
 
     m_region, n_region = 0, 0
     # 获取分成了多少块
     for partition in partition_scene:
-        m, n = int(partition.partition_id.split("_")[0]), int(partition.partition_id.split("_")[1])
+        if partition.get("inf_sides") is not None: continue  # 清单中已经记录了位于场景外侧的边
+        m, n = int(partition["partition_id"].split("_")[0]), int(partition["partition_id"].split("_")[1])
         if m > m_region: m_region = m
         if n > n_region: n_region = n
 
@@ -111,18 +78,19 @@ def seamless_merge(model_path, partition_point_cloud_dir):
     rots_list = []
 
     for partition in partition_scene:
-        point_cloud_path = os.path.join(partition_point_cloud_dir, f"{partition.partition_id}_point_cloud.ply")
+        partition_id = partition["partition_id"]
+        point_cloud_path = os.path.join(partition_point_cloud_dir, f"{partition_id}_point_cloud.ply")
         xyz, features_dc, features_extra, opacities, scales, rots = load_ply(point_cloud_path)
-        extend_camera_bbox = partition.extend_camera_bbox  # 原始相机包围盒
+        extend_camera_bbox = partition["extend_camera_bbox"]  # 原始相机包围盒
         x_max = extend_camera_bbox[1]
         x_min = extend_camera_bbox[0]
         z_max = extend_camera_bbox[3]
         z_min = extend_camera_bbox[2]
 
-        flag = extend_inf_x_z_bbox(partition.partition_id, m_region, n_region)
-        if partition.partition_id == "1_1":
+        flag = partition.get("inf_sides") or extend_inf_x_z_bbox(partition_id, m_region, n_region)
+        if partition_id == "1_1":
             flag = [True, False, True, True]
-        if partition.partition_id == "2_1":
+        if partition_id == "2_1":
             flag = [False, True, True, True]
 
         x_max = np.inf if flag[1] else x_max
@@ -160,7 +128,7 @@ def seamless_merge(model_path, partition_point_cloud_dir):
         ax.set_xlabel('X-axis')
         ax.set_ylabel('Z-axis')
         fig.tight_layout()
-        fig.savefig(os.path.join(partition_point_cloud_dir, f'{partition.partition_id}_pcd.png'), dpi=200)
+        fig.savefig(os.path.join(partition_point_cloud_dir, f'{partition_id}_pcd.png'), dpi=200)
         plt.close(fig)
         print('point_cloud_path:', point_cloud_path)
 
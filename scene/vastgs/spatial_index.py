@@ -0,0 +1,60 @@
+# Author: Peilun Kang
+# Contact: kangpeilun@nefu.edu.cn
+# License: Apache Licence
+# Project: VastGaussian
+# File: spatial_index.py
+# Time: 10/17/26 5:10 PM
+# Des: xz平面上的二维空间索引，用于相机中心与点云的矩形区域查询
+"""
+将坐标按x轴排序，矩形查询时先用二分查找得到x范围内的连续区间，再在区间内按z筛选，
+单次查询的复杂度为 O(log N + K)，K为x范围内的元素数量，代替对所有元素逐个判断
+"""
+import numpy as np
+
+
+class SpatialIndex2D:
+    def __init__(self, x, z):
+        """
+        :param x: [N] 第一个轴的坐标
+        :param z: [N] 第二个轴的坐标
+        """
+        x = np.asarray(x, dtype=np.float64)
+        z = np.asarray(z, dtype=np.float64)
+        self.order = np.argsort(x, kind="stable")
+        self.sorted_x = x[self.order]
+        self.sorted_z = z[self.order]
+
+    @classmethod
+    def from_points(cls, points, axes=(0, 2)):
+        """由 [N, 3] 的坐标建立索引，默认使用xz平面"""
+        points = np.asarray(points).reshape(-1, 3)
+        return cls(points[:, axes[0]], points[:, axes[1]])
+
+    def __len__(self):
+        return len(self.order)
+
+    def query_box(self, bbox):
+        """查询落在矩形内(包含边界)的元素
+        :param bbox: [x_min, x_max, z_min, z_max]
+        :return: 元素的原始索引，升序排列
+        """
+        return self.query_boxes([bbox])[0]
+
+    def query_boxes(self, bboxes):
+        """批量查询多个矩形
+        :param bboxes: [B, 4] 每行为 [x_min, x_max, z_min, z_max]
+        :return: list of B 个索引数组，每个数组升序排列
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        starts = np.searchsorted(self.sorted_x, bboxes[:, 0], side="left")
+        ends = np.searchsorted(self.sorted_x, bboxes[:, 1], side="right")
+        results = []
+        for (_, _, z_min, z_max), start, end in zip(bboxes, starts, ends):
+            z = self.sorted_z[start:end]
+            hit = (z >= z_min) & (z <= z_max)
+            results.append(np.sort(self.order[start:end][hit]))
+        return results
+
+    def count_boxes(self, bboxes):
+        """批量统计每个矩形内的元素数量"""
+        return np.array([len(indices) for indices in self.query_boxes(bboxes)], dtype=np.int64)
@@ -0,0 +1,224 @@
+# Author: Peilun Kang
+# Contact: kangpeilun@nefu.edu.cn
+# License: Apache Licence
+# Project: VastGaussian
+# File: visibility.py
+# Time: 10/17/26 10:12 AM
+# Des: 批量化的空域感知可见性计算
+"""
+将所有相机的内外参一次性堆叠成数组，把候选的 (partition, camera) 对中partition边界框的8个角点一次性投影到对应的相机中，
+得到每一对的能见度，替代逐partition、逐相机、逐角点的python循环，结果以稀疏的对保存
+投影前先用视锥体的平面对partition的AABB进行保守的快速剔除，只有可能被看到的对才需要投影与求交
+"""
+import math
+import numpy as np
+
+from scene.vastgs.graham_scan import batch_intersection_rate
+
+
+def stack_cameras(cameras):
+    """将相机列表的内外参堆叠成数组，内参沿用原有逐相机投影的约定: 主点为 (image_height // 2, image_width // 2)
+    :param cameras: SimpleCamera/Camera 列表
+    :return: dict, R [C, 3, 3] 世界->相机的旋转, T [C, 3], fx fy cx cy width height [C]
+    """
+    num_cameras = len(cameras)
+    R = np.empty((num_cameras, 3, 3))
+    T = np.empty((num_cameras, 3))
+    fx = np.empty(num_cameras)
+    fy = np.empty(num_cameras)
+    cx = np.empty(num_cameras)
+    cy = np.empty(num_cameras)
+    width = np.empty(num_cameras)
+    height = np.empty(num_cameras)
+    for idx, camera in enumerate(cameras):
+        R[idx] = np.transpose(camera.R)
+        T[idx] = camera.T
+        fx[idx] = camera.image_width / (2 * math.tan(camera.FoVx / 2))
+        fy[idx] = camera.image_height / (2 * math.tan(camera.FoVy / 2))
+        cx[idx] = camera.image_height // 2  # 与原有逐相机投影的内参矩阵保持一致
+        cy[idx] = camera.image_width // 2
+        width[idx] = camera.image_width
+        height[idx] = camera.image_height
+
+    return {"R": R, "T": T, "fx": fx, "fy": fy, "cx": cx, "cy": cy, "width": width, "height": height}
+
+
+def camera_parameters(cams):
+    """将stack_cameras的结果拼接成 [C, 18] 的数组 (R, T, fx, fy, cx, cy, width, height)，用于判断相机是否改变"""
+    num_cameras = cams["R"].shape[0]
+    return np.concatenate([cams["R"].reshape(num_cameras, 9), cams["T"],
+                           np.stack([cams[key] for key in ["fx", "fy", "cx", "cy", "width", "height"]], axis=1)],
+                          axis=1)
+
+
+def select_cameras(cams, camera_indices):
+    """取出stack_cameras结果中的部分相机"""
+    return {key: value[camera_indices] for key, value in cams.items()}
+
+
+def project_corner_pairs(corner_points, cams):
+    """将每个 (partition, camera) 对中partition的角点投影到对应的相机中
+    :param corner_points: [N, K, 3] 每一对中partition边界框的角点
+    :param cams: 每一对中的相机，stack_cameras 返回值中取出的N个相机
+    :return points_image: [N, K, 2] 图像坐标, valid: [N, K] 角点是否位于相机前方(z > 0)
+    """
+    points_camera = np.einsum("nij,nkj->nki", cams["R"], corner_points) + cams["T"][:, None, :]  # [N, K, 3]
+    z = points_camera[..., 2]
+    valid = z > 0
+    z = np.where(valid, z, 1.0)  # 相机后方的点不参与投影，避免除0
+    u = (cams["fx"][:, None] * points_camera[..., 0] + cams["cx"][:, None] * points_camera[..., 2]) / z
+    v = (cams["fy"][:, None] * points_camera[..., 1] + cams["cy"][:, None] * points_camera[..., 2]) / z
+    return np.stack([u, v], axis=-1), valid
+
+
+def camera_centers(cams):
+    """相机中心在世界坐标系下的坐标 [C, 3]"""
+    return -np.einsum("cji,cj->ci", cams["R"], cams["T"])
+
+
+def frustum_planes(cams):
+    """视锥体的4个侧面与相机平面在世界坐标系下的表示 n·p + d，视锥体外侧为 n·p + d > 0
+    平面在相机坐标系下为 a·p >= 0，a·(R p + T) = (R^T a)·p + a·T
+    图像范围与batch_intersection_rate一致，为 u in [0, width], v in [0, height]
+    :return: normals [C, 5, 3], offsets [C, 5]
+    """
+    zeros, ones = np.zeros_like(cams["fx"]), np.ones_like(cams["fx"])
+    planes = np.stack([
+        np.stack([-cams["fx"], zeros, -cams["cx"]], axis=-1),                 # u <= 0
+        np.stack([cams["fx"], zeros, cams["cx"] - cams["width"]], axis=-1),   # u >= width
+        np.stack([zeros, -cams["fy"], -cams["cy"]], axis=-1),                 # v <= 0
+        np.stack([zeros, cams["fy"], cams["cy"] - cams["height"]], axis=-1),  # v >= height
+        np.stack([zeros, zeros, -ones], axis=-1),                             # z <= 0 相机后方
+    ], axis=1)  # [C, 5, 3]
+    normals = np.einsum("cji,ckj->cki", cams["R"], planes)
+    offsets = np.einsum("ckj,cj->ck", planes, cams["T"])
+    return normals, offsets
+
+
+def frustum_cull(corner_points, cams, max_distance=0.0):
+    """视锥体-AABB的保守剔除，被剔除的 (partition, camera) 对的能见度一定为0
+    以视锥体的4个侧面与相机平面作为分离轴: 若partition的AABB完全位于某个平面的外侧，
+    则位于相机前方的角点全部投影在图像的同一侧之外(或没有角点位于相机前方)，凸包与图像的交集面积为0
+    用AABB的中心与半边长即可得到8个角点中平面函数的最小值
+    AABB包含另一个AABB时，前者被剔除则后者一定被剔除(容差也不会更大)，因此可以先对粗分块剔除，再对其中的子块剔除
+    :param corner_points: [P, K, 3] 每个partition边界框的角点
+    :param cams: stack_cameras 的返回值
+    :param max_distance: >0时额外剔除xz平面上相机中心到AABB的距离大于该值的对，这一项不是保守的
+    :return: frustum_culled [P, C], distance_culled [P, C]
+    """
+    box_min, box_max = corner_points.min(axis=1), corner_points.max(axis=1)  # [P, 3]
+    center, half = (box_min + box_max) / 2, (box_max - box_min) / 2
+    normals, offsets = frustum_planes(cams)
+    min_value = (np.einsum("pi,cki->pck", center, normals) - np.einsum("pi,cki->pck", half, np.abs(normals))
+                 + offsets[None])
+    # 浮点误差的容差，只有明显位于平面外侧时才剔除
+    tolerance = 1e-9 * (np.einsum("pi,cki->pck", np.abs(center) + half, np.abs(normals)) + np.abs(offsets)[None])
+    frustum_culled = (min_value > tolerance).any(axis=-1)
+
+    distance_culled = np.zeros_like(frustum_culled)
+    if max_distance > 0:
+        centers = camera_centers(cams)[None, :, [0, 2]]  # [1, C, 2]
+        gap = np.maximum(np.maximum(box_min[:, None, [0, 2]] - centers, centers - box_max[:, None, [0, 2]]), 0)
+        distance_culled = ~frustum_culled & (np.linalg.norm(gap, axis=-1) > max_distance)
+    return frustum_culled, distance_culled
+
+
+def frustum_cull_pairs(corner_points, normals, offsets, centers, max_distance=0.0):
+    """frustum_cull 的逐对版本，只计算给定的 (partition, camera) 对
+    :param corner_points: [N, K, 3] 每一对中partition边界框的角点
+    :param normals, offsets: 每一对中相机的 frustum_planes，[N, 5, 3] 与 [N, 5]
+    :param centers: [N, 3] 每一对中相机的中心
+    :return: frustum_culled [N], distance_culled [N]
+    """
+    box_min, box_max = corner_points.min(axis=1), corner_points.max(axis=1)  # [N, 3]
+    center, half = (box_min + box_max) / 2, (box_max - box_min) / 2
+    min_value = np.einsum("ni,nki->nk", center, normals) - np.einsum("ni,nki->nk", half, np.abs(normals)) + offsets
+    tolerance = 1e-9 * (np.einsum("ni,nki->nk", np.abs(center) + half, np.abs(normals)) + np.abs(offsets))
+    frustum_culled = (min_value > tolerance).any(axis=-1)
+
+    distance_culled = np.zeros_like(frustum_culled)
+    if max_distance > 0:
+        gap = np.maximum(np.maximum(box_min[:, [0, 2]] - centers[:, [0, 2]], centers[:, [0, 2]] - box_max[:, [0, 2]]), 0)
+        distance_culled = ~frustum_culled & (np.linalg.norm(gap, axis=-1) > max_distance)
+    return frustum_culled, distance_culled
+
+
+def score_pairs(corner_points, cams):
+    """计算每个 (partition, camera) 对的凸包与图像的交集面积，只有当相机前方的角点数大于3时才计算
+    :param corner_points: [N, K, 3], cams: 每一对中的相机
+    :return: intersection_area [N]
+    """
+    intersection_area = np.zeros(corner_points.shape[0])
+    if corner_points.shape[0] == 0:
+        return intersection_area
+    points_image, valid = project_corner_pairs(corner_points, cams)
+    keep = valid.sum(axis=-1) > 3
+    if keep.any():
+        pkg = batch_intersection_rate(points_image[keep], valid[keep], cams["width"][keep], cams["height"][keep])
+        intersection_area[keep] = pkg["intersection_area"]
+    return intersection_area
+
+
+def compute_visibility_pairs(corner_points, cams, pair_partition, pair_camera, pair_chunk=1 << 16, max_distance=0.0):
+    """计算给定的 (partition, camera) 对的能见度，计算量与内存只与对的数量有关
+    与逐个调用 run_graham_scan 的语义相同: 只有当相机前方的角点数大于3时才计算凸包与图像的交集
+    :param corner_points: [P, K, 3] 每个partition边界框的角点
+    :param cams: stack_cameras 的返回值
+    :param pair_partition, pair_camera: [N] 每一对中partition与相机的序号
+    :param pair_chunk: 每次计算的对的数量，控制内存占用
+    :return: dict, intersection_area [N], 以及被视锥体/距离剔除的对的数量 frustum_culled, distance_culled
+    """
+    corner_points = np.asarray(corner_points, dtype=np.float64)
+    pair_partition = np.asarray(pair_partition, dtype=np.int64)
+    pair_camera = np.asarray(pair_camera, dtype=np.int64)
+    normals, offsets = frustum_planes(cams)
+    centers = camera_centers(cams)
+    intersection_area = np.zeros(len(pair_partition))
+    num_frustum_culled, num_distance_culled = 0, 0
+
+    for start in range(0, len(pair_partition), pair_chunk):
+        p_idx, c_idx = pair_partition[start:start + pair_chunk], pair_camera[start:start + pair_chunk]
+        frustum_culled, distance_culled = frustum_cull_pairs(corner_points[p_idx], normals[c_idx], offsets[c_idx],
+                                                             centers[c_idx], max_distance)
+        num_frustum_culled += int(frustum_culled.sum())
+        num_distance_culled += int(distance_culled.sum())
+        candidates = np.nonzero(~(frustum_culled | distance_culled))[0]
+        intersection_area[start + candidates] = score_pairs(corner_points[p_idx[candidates]],
+                                                            select_cameras(cams, c_idx[candidates]))
+
+    return {
+        "intersection_area": intersection_area,
+        "frustum_culled": num_frustum_culled,
+        "distance_culled": num_distance_culled,
+    }
+
+
+def pair_lookup(visibility, idx):
+    """第idx个partition的所有对: {相机序号: 对在visibility数组中的位置}，没有计算的对(已被剔除)能见度为0
+    :param visibility: 按partition排列的对，offsets [P+1] 与 pair_camera [N]
+    """
+    start, end = int(visibility["offsets"][idx]), int(visibility["offsets"][idx + 1])
+    return dict(zip(visibility["pair_camera"][start:end].tolist(), range(start, end)))
+
+
+def points_in_camera(cams, camera_idx, points, chunk_size=1_000_000):
+    """判断点云中的哪些点可以投影到第camera_idx个相机的图像中，分块计算以控制内存占用
+    与原有逐相机投影的判断方式保持一致: 位于相机前方，且 u in [0, image_height), v in [0, image_width)
+    :param cams: stack_cameras 的返回值
+    :param points: [N, 3] 点云坐标
+    :return: [N] bool mask
+    """
+    R, T = cams["R"][camera_idx], cams["T"][camera_idx]
+    fx, fy = cams["fx"][camera_idx], cams["fy"][camera_idx]
+    cx, cy = cams["cx"][camera_idx], cams["cy"][camera_idx]
+    width, height = cams["width"][camera_idx], cams["height"][camera_idx]
+    mask = np.zeros(points.shape[0], dtype=bool)
+    for start in range(0, points.shape[0], chunk_size):
+        points_camera = points[start:start + chunk_size] @ R.T + T
+        z = points_camera[:, 2]
+        in_front = z > 0
+        z = np.where(in_front, z, 1.0)
+        u = (fx * points_camera[:, 0] + cx * points_camera[:, 2]) / z
+        v = (fy * points_camera[:, 1] + cy * points_camera[:, 2]) / z
+        mask[start:start + chunk_size] = in_front & (u >= 0) & (u < height) & (v >= 0) & (v < width)
+    return mask
@@ -0,0 +1,72 @@
+# Author: Peilun Kang
+# Contact: kangpeilun@nefu.edu.cn
+# License: Apache Licence
+# Project: VastGaussian
+# File: voxel_downsample.py
+# Time: 10/17/26 10:20 PM
+# Des: 基于哈希体素索引的点云降采样，用于限制每个partition初始高斯的数量
+"""
+每个点落入的体素坐标 floor(p / voxel_size) 相对于origin所在的体素打包为一个int64的键，np.unique得到体素编号后用bincount对每个体素求和，
+体素内的点取坐标与颜色的平均值，法向量取平均后归一化
+点云可以分块输入，每块先在块内合并，再合并各块的结果，内存只与块大小和体素数量有关，结果与整体计算相同
+"""
+import numpy as np
+
+KEY_BITS = 21  # 每个轴的体素坐标占21位，相对于origin所在的体素的范围为 [0, 2^21)
+KEY_BIAS = 1 << (KEY_BITS - 1)  # 没有给出origin时以坐标原点为中心，范围为 [-2^20, 2^20)
+
+
+def voxel_keys(points, voxel_size, origin=None):
+    """每个点所在体素的键
+    :param points: [N, 3]
+    :param origin: [3] 所有点的下界(如点云边界框的最小角点)，体素的划分不变，只是键相对于origin所在的体素，
+                   因此点云远离坐标原点时键也不会越界，键的顺序与不给出origin时相同
+    :return: [N] int64
+    """
+    coords = np.floor(np.asarray(points, dtype=np.float64) / voxel_size).astype(np.int64)
+    if origin is None:
+        coords += KEY_BIAS
+    else:
+        coords -= np.floor(np.asarray(origin, dtype=np.float64) / voxel_size).astype(np.int64)
+    if coords.size > 0 and (coords.min() < 0 or coords.max() >= 1 << KEY_BITS):
+        raise ValueError(f"voxel size {voxel_size} is too small for the extent of the point cloud")
+    return (coords[:, 0] << (2 * KEY_BITS)) | (coords[:, 1] << KEY_BITS) | coords[:, 2]
+
+
+def reduce_voxels(keys, counts, sums):
+    """合并键相同的体素
+    :param counts: [N] 每个元素包含的点数
+    :param sums: list of [N, 3] 每个元素中各属性的和
+    :return: (有序且唯一的键, 点数, 属性的和)
+    """
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, weights=counts, minlength=len(unique_keys))
+    sums = [np.stack([np.bincount(inverse, weights=values[:, axis], minlength=len(unique_keys)) for axis in range(3)], axis=1)
+            for values in sums]
+    return unique_keys, counts, sums
+
+
+def voxel_downsample(chunks, voxel_size, origin=None):
+    """
+    :param chunks: 依次给出 (points, colors, normals)，均为 [N, 3]
+    :param voxel_size: 体素的边长
+    :param origin: 所有块中点的下界，见voxel_keys
+    :return: 降采样后的 points, colors, normals，按体素的键排列
+    """
+    keys, counts, sums = [np.zeros(0, dtype=np.int64)], [np.zeros(0)], [[np.zeros((0, 3))] * 3]
+    for points, colors, normals in chunks:
+        points = np.asarray(points, dtype=np.float64)
+        chunk_keys, chunk_counts, chunk_sums = reduce_voxels(
+            voxel_keys(points, voxel_size, origin), np.ones(points.shape[0]),
+            [points, np.asarray(colors, dtype=np.float64), np.asarray(normals, dtype=np.float64)])
+        keys.append(chunk_keys)
+        counts.append(chunk_counts)
+        sums.append(chunk_sums)
+
+    keys, counts, (points, colors, normals) = reduce_voxels(
+        np.concatenate(keys), np.concatenate(counts), [np.concatenate(values) for values in zip(*sums)])
+    counts = np.maximum(counts, 1)[:, None]
+    normals = normals / counts
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+    return points / counts, colors / counts, normals
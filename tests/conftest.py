@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+# Description: 测试从仓库根目录导入模块，与 python train_vast.py 等脚本相同
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Description: 缓存文件的原子写入
+import os
+
+import numpy as np
+import pytest
+
+from utils.cache_utils import atomic_save_npy, atomic_save_npy_chunks, atomic_save_json, load_json, fingerprint
+
+
+def chunks_of(arrays, chunk_size):
+    num_rows = len(next(iter(arrays.values())))
+    return ({key: value[start:start + chunk_size] for key, value in arrays.items()}
+            for start in range(0, max(num_rows, 1), chunk_size))
+
+
+@pytest.mark.parametrize("num_rows", [0, 1, 1000])
+def test_atomic_save_npy_chunks_matches_np_save(tmp_path, num_rows):
+    rng = np.random.default_rng(0)
+    arrays = {"points": rng.normal(size=(num_rows, 3)).astype(np.float32),
+              "indices": np.arange(num_rows, dtype=np.int64)}
+    paths = {key: str(tmp_path / f"{key}.npy") for key in arrays}
+    atomic_save_npy_chunks(paths, num_rows, chunks_of(arrays, 333))
+    for key, value in arrays.items():
+        np.save(tmp_path / f"{key}_ref.npy", value)
+        assert (tmp_path / f"{key}.npy").read_bytes() == (tmp_path / f"{key}_ref.npy").read_bytes()
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{key}.npy" for key in arrays] + [f"{key}_ref.npy" for key in arrays])
+
+
+def test_atomic_save_npy_chunks_wrong_row_count(tmp_path):
+    arrays = {"values": np.arange(10)}
+    paths = {"values": str(tmp_path / "values.npy")}
+    with pytest.raises(AssertionError):
+        atomic_save_npy_chunks(paths, 11, chunks_of(arrays, 4))
+    assert os.listdir(tmp_path) == []  # 不留下临时文件，也不写入不完整的文件
+
+
+def test_atomic_save_round_trip(tmp_path):
+    array = np.arange(12, dtype=np.float64).reshape(3, 4)
+    atomic_save_npy(str(tmp_path / "array.npy"), array)
+    np.testing.assert_array_equal(np.load(tmp_path / "array.npy"), array)
+
+    atomic_save_json(str(tmp_path / "meta.json"), {"version": 1, "names": ["a", "b"]})
+    assert load_json(str(tmp_path / "meta.json")) == {"version": 1, "names": ["a", "b"]}
+    assert load_json(str(tmp_path / "missing.json")) is None
+    (tmp_path / "broken.json").write_text("{")
+    assert load_json(str(tmp_path / "broken.json")) is None
+    assert sorted(os.listdir(tmp_path)) == ["array.npy", "broken.json", "meta.json"]
+
+
+def test_fingerprint():
+    array = np.arange(6, dtype=np.float32).reshape(2, 3)
+    assert fingerprint(array, {"a": 1}) == fingerprint(array.astype(np.float64), {"a": 1})
+    assert fingerprint(array, {"a": 1}) != fingerprint(array + 1, {"a": 1})
+    assert fingerprint(array, {"a": 1}) != fingerprint(array, {"a": 2})
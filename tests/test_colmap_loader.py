@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Description: 通过images.bin的索引读取部分图片，与完整读取的结果比较
+import json
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from scene.colmap_loader import read_extrinsics_binary, read_extrinsics_binary_vast, load_images_binary_index, \
+    images_binary_index_path
+
+
+def random_images(rng, names):
+    images = []
+    for idx, name in enumerate(names):
+        num_points2D = int(rng.integers(0, 50)) if idx % 4 else 0
+        images.append({"id": idx + 1, "qvec": rng.normal(size=4), "tvec": rng.normal(size=3),
+                       "camera_id": int(rng.integers(1, 4)), "name": name,
+                       "xys": rng.uniform(0, 1000, size=(num_points2D, 2)),
+                       "point3D_ids": rng.integers(-1, 10000, size=num_points2D)})
+    return images
+
+
+def write_images_binary(path, images):
+    """COLMAP的 Reconstruction::WriteImagesBinary 格式"""
+    with open(path, "wb") as fid:
+        fid.write(struct.pack("<Q", len(images)))
+        for image in images:
+            fid.write(struct.pack("<idddddddi", image["id"], *image["qvec"], *image["tvec"], image["camera_id"]))
+            fid.write(image["name"].encode("utf-8") + b"\x00")
+            fid.write(struct.pack("<Q", len(image["xys"])))
+            for xy, point3D_id in zip(image["xys"], image["point3D_ids"]):
+                fid.write(struct.pack("<ddq", *xy, point3D_id))
+
+
+def assert_same_image(image, expected):
+    assert image.id == expected["id"] and image.camera_id == expected["camera_id"] and image.name == expected["name"]
+    np.testing.assert_array_equal(image.qvec, expected["qvec"])
+    np.testing.assert_array_equal(image.tvec, expected["tvec"])
+    np.testing.assert_array_equal(image.xys.reshape(-1, 2), expected["xys"])
+    np.testing.assert_array_equal(image.point3D_ids, expected["point3D_ids"])
+
+
+@pytest.fixture
+def images_bin(tmp_path):
+    rng = np.random.default_rng(0)
+    images = random_images(rng, [f"DJI_{idx:04d}.JPG" for idx in range(30)] + ["子目录/图片.jpg"])
+    path = str(tmp_path / "images.bin")
+    write_images_binary(path, images)
+    return path, images
+
+
+@pytest.mark.parametrize("keypoints", ["eager", "lazy"])
+def test_read_subset_matches_full_read(images_bin, keypoints):
+    path, images = images_bin
+    lines = [image["name"] for image in images[::3]] + ["missing.jpg"]
+    subset = read_extrinsics_binary_vast(path, lines, keypoints=keypoints)
+    full = read_extrinsics_binary(path)
+
+    assert sorted(subset) == [image["id"] for image in images[::3]]
+    for image_id, image in subset.items():
+        assert_same_image(image, images[image_id - 1])
+        assert_same_image(full[image_id], images[image_id - 1])
+    assert os.path.exists(images_binary_index_path(path))
+
+
+def test_index_is_rebuilt_when_images_bin_changes(images_bin):
+    path, images = images_bin
+    index = load_images_binary_index(path)
+    assert sorted(index) == sorted(image["name"] for image in images)
+    with open(images_binary_index_path(path), "r", encoding="utf-8") as file:
+        assert json.load(file)["images"] == index
+
+    # 大小改变
+    images = images[:10]
+    write_images_binary(path, images)
+    assert sorted(load_images_binary_index(path)) == sorted(image["name"] for image in images)
+
+    # 大小与mtime都不变，但记录的位置改变
+    stat = os.stat(path)
+    images = images[::-1]
+    write_images_binary(path, images)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(path).st_size == stat.st_size
+    subset = read_extrinsics_binary_vast(path, [images[0]["name"], images[5]["name"]], keypoints="eager")
+    assert_same_image(subset[images[0]["id"]], images[0])
+    assert_same_image(subset[images[5]["id"]], images[5])
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Description: 分块计算的分位数与过滤结果和整体计算的结果比较
+import numpy as np
+import pytest
+
+from scene.dataset_readers import chunkedPercentile, filterPointCloud
+from scene.gaussian_model import BasicPointCloud
+
+
+@pytest.mark.parametrize("q", [0, 0.5, 37.3, 50, 99, 100])
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000, 100000])
+def test_chunked_percentile_matches_numpy(q, chunk_size):
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.normal(size=5000), rng.standard_cauchy(size=1000), np.full(2000, 0.25)])
+    rng.shuffle(values)
+    assert chunkedPercentile(values, q, chunk_size) == np.percentile(values, q)
+
+
+def test_chunked_percentile_float32_memmap(tmp_path):
+    rng = np.random.default_rng(1)
+    np.save(tmp_path / "values.npy", rng.normal(size=20000).astype(np.float32))
+    values = np.load(tmp_path / "values.npy", mmap_mode="r")
+    result = chunkedPercentile(values, 99, 1500)
+    expected = np.percentile(np.asarray(values), 99)
+    assert result == expected
+    assert np.asarray(result).dtype == expected.dtype
+
+
+def test_chunked_percentile_constant_and_single():
+    assert chunkedPercentile(np.full(10000, 3.5), 99, 10) == 3.5
+    assert chunkedPercentile(np.array([2.0]), 42, 10) == 2.0
+
+
+def test_filter_point_cloud_chunked_matches_whole(tmp_path):
+    rng = np.random.default_rng(2)
+    pcd = BasicPointCloud(points=rng.normal(size=(10000, 3)), colors=rng.random((10000, 3)),
+                          normals=rng.normal(size=(10000, 3)))
+    expected, expected_indices = filterPointCloud(pcd, 99)
+    subset_path = str(tmp_path / "y_below_p99")
+    for _ in range(2):  # 第二次直接读取已写入的子集
+        filtered, indices = filterPointCloud(pcd, 99, point_chunk_size=777, subset_path=subset_path)
+        np.testing.assert_array_equal(indices, expected_indices)
+        for key in ["points", "colors", "normals"]:
+            np.testing.assert_array_equal(getattr(filtered, key), getattr(expected, key))
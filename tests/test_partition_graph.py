@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Description: partition之间的邻接图以及按GPU调度的训练顺序
+from types import SimpleNamespace
+
+from scene.vastgs.partition_graph import build_adjacency, neighbor_aware_order, gpu_partition_order
+
+
+def make_partition(partition_id, bbox, image_names):
+    cameras = [SimpleNamespace(camera=SimpleNamespace(image_name=name)) for name in image_names]
+    return SimpleNamespace(partition_id=partition_id, ori_camera_bbox=bbox, cameras=cameras)
+
+
+def edge_set(adjacency):
+    return {tuple(edge["partitions"]) for edge in adjacency}
+
+
+def test_build_adjacency_unaligned_rows():
+    """第二列的行与第一列不对齐，1_1同时与2_1、2_2相邻；只有一个角点接触的块不相邻"""
+    partitions = [
+        make_partition("1_1", [-5.0, 0.0, -3.0, 4.0], ["a", "b", "c"]),
+        make_partition("2_1", [0.0, 6.0, -3.0, 1.0], ["c", "d"]),
+        make_partition("2_2", [0.0, 6.0, 1.0, 4.0], ["b", "c", "e"]),
+    ]
+    adjacency = build_adjacency(partitions)
+    assert edge_set(adjacency) == {("1_1", "2_1"), ("1_1", "2_2"), ("2_1", "2_2")}
+    edges = {tuple(edge["partitions"]): edge for edge in adjacency}
+    assert edges[("1_1", "2_1")]["axis"] == "x" and edges[("1_1", "2_1")]["shared_cameras"] == 1
+    assert edges[("1_1", "2_2")]["boundary"] == [[0.0, 1.0], [0.0, 4.0]]
+    assert edges[("2_1", "2_2")]["axis"] == "z" and edges[("2_1", "2_2")]["shared_cameras"] == 1
+
+    corner = [make_partition("a", [0.0, 1.0, 0.0, 1.0], []), make_partition("b", [1.0, 2.0, 1.0, 2.0], [])]
+    assert build_adjacency(corner) == []
+
+
+def grid(m, n):
+    partitions = [make_partition(f"{i}_{j}", [float(i), i + 1.0, float(j), j + 1.0], [f"{i}_{j}", f"{i}_{j + 1}"])
+                  for i in range(m) for j in range(n)]
+    return [partition.partition_id for partition in partitions], build_adjacency(partitions)
+
+
+def test_neighbor_aware_order():
+    partition_ids, adjacency = grid(3, 3)
+    order = neighbor_aware_order(partition_ids, adjacency)
+    assert sorted(order) == sorted(partition_ids) and order[0] == partition_ids[0]
+    assert neighbor_aware_order(partition_ids, []) == partition_ids
+
+
+def test_gpu_partition_order_slices():
+    """train_vast.py中第j块GPU依次训练 [j*training_round, (j+1)*training_round) 这一段"""
+    partition_ids, adjacency = grid(3, 4)
+    weight = {}
+    for edge in adjacency:
+        a, b = edge["partitions"]
+        weight.setdefault(a, {})[b] = weight.setdefault(b, {})[a] = edge["shared_cameras"]
+    for num_gpus in [1, 2, 3, 5, 12, 16]:
+        order = gpu_partition_order(partition_ids, adjacency, num_gpus)
+        assert sorted(order) == sorted(partition_ids)
+        training_round = len(partition_ids) // num_gpus
+        # 每块GPU的一段都从未训练的第一个partition开始，之后尽量选择与上一个partition共享相机最多的邻居
+        for position in range(training_round * num_gpus):
+            remaining = [partition_id for partition_id in partition_ids if partition_id not in order[:position]]
+            if position % training_round == 0:
+                assert order[position] == remaining[0]
+                continue
+            candidates = {partition_id: shared for partition_id, shared in weight[order[position - 1]].items()
+                          if partition_id in remaining}
+            if candidates:
+                assert candidates.get(order[position]) == max(candidates.values())
+            else:
+                assert order[position] == remaining[0]
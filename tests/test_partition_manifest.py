@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Description: 分块清单的保存与读取
+import os
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+
+from scene.vastgs.partition_manifest import save_partition_manifest, load_manifest_meta, save_manifest_arrays, \
+    load_manifest_arrays, load_partition_camera_names, load_partition_point_indices, load_partition_adjacency, \
+    load_partition_bboxes, LEGACY_PARTITION_DATA
+
+
+def make_partition(partition_id, image_names, point_indices, bbox, **extra):
+    cameras = [SimpleNamespace(camera=SimpleNamespace(image_name=name)) for name in image_names]
+    return SimpleNamespace(partition_id=partition_id, cameras=cameras, point_indices=point_indices, extend_rate=0.2,
+                           ori_camera_bbox=bbox, extend_camera_bbox=[bbox[0] - 1, bbox[1] + 1, bbox[2] - 1, bbox[3] + 1],
+                           ori_point_bbox=bbox + [0, 1], extend_point_bbox=bbox + [-1, 2], **extra)
+
+
+def test_manifest_round_trip(tmp_path):
+    model_path = str(tmp_path)
+    partitions = [
+        make_partition("1_1", ["a", "b", "c"], np.array([0, 3, 5]), [0.0, 1.0, 0.0, 1.0],
+                       inf_sides=[True, False, True, False], visible_rate=0.25, num_init_points=2),
+        make_partition("1_2", ["c", "d"], np.array([], dtype=np.int64), [1.0, 2.0, 0.0, 1.0]),
+    ]
+    tree = [{"node_id": "0", "ori_camera_bbox": [0.0, 2.0, 0.0, 1.0], "inf_sides": [True] * 4,
+             "children": ["1_1", "1_2"]}]
+    adjacency = [{"partitions": ["1_1", "1_2"], "axis": "x", "boundary": [[1.0, 0.0], [1.0, 1.0]],
+                  "shared_cameras": 1}]
+    assert load_manifest_meta(model_path) is None
+    assert load_partition_adjacency(model_path) is None
+
+    save_partition_manifest(model_path, partitions, num_points=6, fingerprint="abc", tree=tree, adjacency=adjacency,
+                            m_region=2, n_region=1)
+    manifest = load_manifest_meta(model_path)
+    assert manifest["fingerprint"] == "abc" and manifest["num_points"] == 6
+    assert manifest["params"] == {"m_region": 2, "n_region": 1}
+    assert manifest["camera_names"] == ["a", "b", "c", "d"]
+    assert manifest["tree"] == tree
+    assert load_partition_adjacency(model_path) == adjacency
+
+    for partition in partitions:
+        assert load_partition_camera_names(model_path, manifest, partition.partition_id) == \
+            [camera_pose.camera.image_name for camera_pose in partition.cameras]
+        indices = load_partition_point_indices(model_path, partition.partition_id)
+        assert indices.dtype == np.int64
+        np.testing.assert_array_equal(indices, partition.point_indices)
+
+    first, second = load_partition_bboxes(model_path)
+    assert first["partition_id"] == "1_1" and first["parent"] == "0"
+    assert first["ori_camera_bbox"] == [0.0, 1.0, 0.0, 1.0]
+    assert first["inf_sides"] == [True, False, True, False]
+    assert first["visible_rate"] == 0.25 and first["num_init_points"] == 2
+    assert "inf_sides" not in second and "visible_rate" not in second
+
+
+def test_manifest_arrays(tmp_path):
+    model_path = str(tmp_path)
+    assert load_manifest_arrays(model_path, "visibility") is None
+    offsets, pair_camera = np.array([0, 2, 3]), np.array([4, 7, 1], dtype=np.int32)
+    save_manifest_arrays(model_path, "visibility", offsets=offsets, pair_camera=pair_camera)
+    arrays = load_manifest_arrays(model_path, "visibility")
+    np.testing.assert_array_equal(arrays["offsets"], offsets)
+    np.testing.assert_array_equal(arrays["pair_camera"], pair_camera)
+    assert arrays["pair_camera"].dtype == np.int32
+
+
+def test_legacy_partition_data(tmp_path):
+    """旧版本的输出目录中只有 partition_data.pkl"""
+    model_path = str(tmp_path)
+    partitions = [make_partition("1_1", ["a"], np.array([0]), [0.0, 1.0, 0.0, 1.0])]
+    with open(os.path.join(model_path, LEGACY_PARTITION_DATA), "wb") as f:
+        pickle.dump(partitions, f)
+    bboxes = load_partition_bboxes(model_path)
+    assert bboxes == [{"partition_id": "1_1", "ori_camera_bbox": [0.0, 1.0, 0.0, 1.0],
+                       "extend_camera_bbox": [-1.0, 2.0, -1.0, 2.0], "ori_point_bbox": [0.0, 1.0, 0.0, 1.0, 0, 1],
+                       "extend_point_bbox": [0.0, 1.0, 0.0, 1.0, -1, 2]}]
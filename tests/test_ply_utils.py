@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Description: PLY读写与plyfile的结果比较，以及storePly/fetchPly的往返
+import numpy as np
+import pytest
+from plyfile import PlyData, PlyElement
+
+from utils.ply_utils import read_ply, write_ply, write_ply_chunks, columns
+
+
+def point_cloud(num_points, seed=0):
+    rng = np.random.default_rng(seed)
+    xyz = rng.normal(size=(num_points, 3)).astype(np.float32)
+    normals = rng.normal(size=(num_points, 3)).astype(np.float32)
+    rgb = rng.integers(0, 256, size=(num_points, 3)).astype(np.uint8)
+    return xyz, normals, rgb
+
+
+def attributes(xyz, normals, rgb):
+    return [(['x', 'y', 'z'], xyz), (['nx', 'ny', 'nz'], normals), (['red', 'green', 'blue'], rgb)]
+
+
+def write_plyfile(path, xyz, normals, rgb, byte_order="<", text=False):
+    """原有的写法: 逐点构造tuple后交给plyfile"""
+    dtype = [('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('nx', 'f4'), ('ny', 'f4'), ('nz', 'f4'),
+             ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+    elements = np.empty(xyz.shape[0], dtype=dtype)
+    elements[:] = list(map(tuple, np.concatenate((xyz, normals, rgb), axis=1)))
+    PlyData([PlyElement.describe(elements, 'vertex')], text=text, byte_order=byte_order).write(str(path))
+
+
+def assert_same_vertices(data, xyz, normals, rgb):
+    np.testing.assert_array_equal(columns(data, ['x', 'y', 'z']), xyz)
+    np.testing.assert_array_equal(columns(data, ['nx', 'ny', 'nz']), normals)
+    np.testing.assert_array_equal(columns(data, ['red', 'green', 'blue']), rgb)
+
+
+@pytest.mark.parametrize("num_points", [0, 1, 1000])
+def test_write_ply_matches_plyfile(tmp_path, num_points):
+    xyz, normals, rgb = point_cloud(num_points)
+    write_ply(tmp_path / "fast.ply", attributes(xyz, normals, rgb))
+    write_plyfile(tmp_path / "plyfile.ply", xyz, normals, rgb)
+    assert (tmp_path / "fast.ply").read_bytes() == (tmp_path / "plyfile.ply").read_bytes()
+
+
+def test_write_ply_chunks_matches_write_ply(tmp_path):
+    xyz, normals, rgb = point_cloud(1000)
+    write_ply(tmp_path / "whole.ply", attributes(xyz, normals, rgb))
+    chunks = (attributes(xyz[start:start + 300], normals[start:start + 300], rgb[start:start + 300])
+              for start in range(0, 1000, 300))
+    write_ply_chunks(tmp_path / "chunks.ply", chunks, 1000)
+    assert (tmp_path / "chunks.ply").read_bytes() == (tmp_path / "whole.ply").read_bytes()
+
+    with pytest.raises(AssertionError):
+        write_ply_chunks(tmp_path / "short.ply", [attributes(xyz, normals, rgb)], 999)
+
+
+@pytest.mark.parametrize("byte_order, text", [("<", False), (">", False), ("=", True)])
+@pytest.mark.parametrize("mmap", [True, False])
+def test_read_ply_matches_plyfile(tmp_path, byte_order, text, mmap):
+    xyz, normals, rgb = point_cloud(1000)
+    path = tmp_path / "points.ply"
+    write_plyfile(path, xyz, normals, rgb, byte_order=byte_order, text=text)
+    data = read_ply(path, mmap=mmap)
+    assert data.shape == (1000,)
+    assert_same_vertices(data, xyz, normals, rgb)
+    if byte_order == ">":  # 大端文件直接映射，列保留大端的dtype
+        assert data.dtype["x"].byteorder == ">"
+
+
+def test_read_ply_element_after_list_property(tmp_path):
+    """包含变长属性(面片)的文件交给plyfile读取"""
+    xyz, normals, rgb = point_cloud(10)
+    vertex = np.empty(10, dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4')])
+    vertex['x'], vertex['y'], vertex['z'] = xyz.T
+    face = np.empty(2, dtype=[('vertex_indices', 'i4', (3,))])
+    face['vertex_indices'] = [[0, 1, 2], [2, 3, 4]]
+    PlyData([PlyElement.describe(vertex, 'vertex'), PlyElement.describe(face, 'face')]).write(str(tmp_path / "mesh.ply"))
+    np.testing.assert_array_equal(columns(read_ply(tmp_path / "mesh.ply"), ['x', 'y', 'z']), xyz)
+
+
+def test_read_ply_second_element(tmp_path):
+    xyz, normals, rgb = point_cloud(7)
+    first = np.empty(3, dtype=[('a', 'f8'), ('b', 'u1')])
+    first['a'], first['b'] = [1.5, 2.5, 3.5], [1, 2, 3]
+    vertex = np.empty(7, dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4')])
+    vertex['x'], vertex['y'], vertex['z'] = xyz.T
+    PlyData([PlyElement.describe(first, 'first'), PlyElement.describe(vertex, 'vertex')]).write(str(tmp_path / "two.ply"))
+    np.testing.assert_array_equal(columns(read_ply(tmp_path / "two.ply"), ['x', 'y', 'z']), xyz)
+    np.testing.assert_array_equal(read_ply(tmp_path / "two.ply", element="first")["a"], first["a"])
+    with pytest.raises(KeyError):
+        read_ply(tmp_path / "two.ply", element="face")
+
+
+def test_store_and_fetch_ply_round_trip(tmp_path):
+    from scene.dataset_readers import storePly, fetchPly, fetchPlyChunks
+
+    rng = np.random.default_rng(3)
+    xyz = rng.normal(size=(2500, 3))
+    rgb = rng.integers(0, 256, size=(2500, 3))
+    path = str(tmp_path / "points3D.ply")
+    storePly(path, xyz, rgb)
+
+    pcd = fetchPly(path)
+    np.testing.assert_array_equal(pcd.points, xyz.astype(np.float32))
+    np.testing.assert_array_equal(pcd.colors, rgb / 255.0)
+    np.testing.assert_array_equal(pcd.normals, np.zeros((2500, 3)))
+
+    man_trans = np.eye(4)
+    man_trans[:3, :3] = np.array([[0, 0, 1], [1, 0, 0], [0, 1, 0]])
+    man_trans[:3, 3] = [1, 2, 3]
+    aligned = fetchPly(path, man_trans)
+    chunks = list(fetchPlyChunks(path, man_trans, chunk_size=1000))
+    assert len(chunks) == 3
+    np.testing.assert_array_equal(np.concatenate([chunk.points for chunk in chunks]), aligned.points)
+    np.testing.assert_array_equal(np.concatenate([chunk.colors for chunk in chunks]), aligned.colors)
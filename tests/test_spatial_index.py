@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Description: SpatialIndex2D 与逐点判断的结果比较
+import numpy as np
+
+from scene.vastgs.spatial_index import SpatialIndex2D
+
+
+def brute_force(points, bbox):
+    x_min, x_max, z_min, z_max = bbox
+    return np.nonzero((points[:, 0] >= x_min) & (points[:, 0] <= x_max) &
+                      (points[:, 2] >= z_min) & (points[:, 2] <= z_max))[0]
+
+
+def test_query_boxes_matches_brute_force():
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-100, 100, size=(5000, 3))
+    points[:500] = np.round(points[:500])  # 重复的坐标，以及恰好位于边界上的点
+    low = rng.uniform(-120, 100, size=(200, 2))
+    bboxes = np.stack([low[:, 0], low[:, 0] + rng.uniform(0, 60, 200),
+                       low[:, 1], low[:, 1] + rng.uniform(0, 60, 200)], axis=1)
+    bboxes[:20] = np.round(bboxes[:20])
+    bboxes[20] = [-np.inf, np.inf, -np.inf, np.inf]  # 位于场景外侧的边为无穷大
+    bboxes[21] = [10, 5, -10, 10]  # 空的矩形
+
+    index = SpatialIndex2D.from_points(points)
+    assert len(index) == len(points)
+    results = index.query_boxes(bboxes)
+    for bbox, result in zip(bboxes, results):
+        np.testing.assert_array_equal(result, brute_force(points, bbox))
+    np.testing.assert_array_equal(index.count_boxes(bboxes), [len(result) for result in results])
+    np.testing.assert_array_equal(index.query_box(bboxes[0]), results[0])
+
+
+def test_empty_index():
+    index = SpatialIndex2D.from_points(np.zeros((0, 3)))
+    assert len(index) == 0
+    assert len(index.query_box([-1, 1, -1, 1])) == 0
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Description: 批量能见度计算与逐对调用 run_graham_scan 的原有实现比较
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from scene.vastgs.graham_scan import batch_intersection_rate, check_batch_intersection_rate, \
+    reference_intersection_area
+from scene.vastgs.visibility import stack_cameras, compute_visibility_pairs, frustum_cull, points_in_camera
+
+
+def random_cameras(rng, num_cameras):
+    """在场景上方随机放置相机，朝向场景中的随机位置"""
+    cameras = []
+    for idx in range(num_cameras):
+        center = rng.uniform([-60, -30, -60], [60, -5, 60])
+        forward = rng.uniform([-50, -2, -50], [50, 2, 50]) - center
+        forward /= np.linalg.norm(forward)
+        right = np.cross(forward, rng.normal(size=3))
+        right /= np.linalg.norm(right)
+        down = np.cross(forward, right)
+        R_w2c = np.stack([right, down, forward])
+        width, height = int(rng.integers(200, 1600)), int(rng.integers(200, 1600))
+        cameras.append(SimpleNamespace(R=R_w2c.T, T=-R_w2c @ center, image_width=width, image_height=height,
+                                       FoVx=rng.uniform(0.6, 1.6), FoVy=rng.uniform(0.6, 1.6), image_name=f"{idx:04d}"))
+    return cameras
+
+
+def random_corner_points(rng, num_partitions):
+    """随机的partition边界框的8个角点 [P, 8, 3]"""
+    low = rng.uniform([-50, -5, -50], [40, 0, 40], size=(num_partitions, 3))
+    high = low + rng.uniform([1, 1, 1], [30, 10, 30], size=(num_partitions, 3))
+    return np.stack([np.stack([bound_x, bound_y, bound_z], axis=-1)
+                     for bound_x in [low[:, 0], high[:, 0]]
+                     for bound_y in [low[:, 1], high[:, 1]]
+                     for bound_z in [low[:, 2], high[:, 2]]], axis=1)
+
+
+def project_baseline(camera, points):
+    """原有 point_in_image 的投影方式，逐相机构造内参矩阵
+    :return: 所有点的图像坐标 [N, 2] 以及是否位于相机前方 [N]
+    """
+    fx = camera.image_width / (2 * math.tan(camera.FoVx / 2))
+    fy = camera.image_height / (2 * math.tan(camera.FoVy / 2))
+    intrinsic_matrix = np.array([[fx, 0, camera.image_height // 2], [0, fy, camera.image_width // 2], [0, 0, 1]])
+    points_camera = (np.transpose(camera.R) @ points.T + camera.T.reshape(3, 1)).T
+    in_front = points_camera[:, 2] > 0
+    points_image = intrinsic_matrix @ points_camera.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (points_image[:2] / points_image[2]).T, in_front
+
+
+def baseline_area(corner_points, camera):
+    """原有实现: 相机前方的角点数大于3时，计算其凸包与图像的交集面积"""
+    points_image, in_front = project_baseline(camera, corner_points)
+    if not in_front.sum() > 3:
+        return 0.0
+    return reference_intersection_area(points_image, in_front, camera.image_width, camera.image_height)
+
+
+def test_batch_intersection_rate_matches_run_graham_scan():
+    assert check_batch_intersection_rate(num_trials=3000, seed=1) <= 1e-9
+
+
+@pytest.mark.parametrize("points, expected", [
+    ([[10, 10], [30, 10], [30, 40], [10, 40]], 600.0),          # 完全位于图像内
+    ([[-10, -10], [200, -10], [200, 200], [-10, 200]], 5000.0),  # 完全包含图像
+    ([[-50, 0], [50, 0], [0, 50]], 1250.0),                    # 被 x >= 0 裁剪掉一半
+    ([[110, 10], [150, 10], [130, 40]], 0.0),                  # 完全位于图像右侧
+    ([[0, 0], [50, 25], [100, 50]], 0.0),                      # 共线，凸包退化
+])
+def test_batch_intersection_rate_clipping(points, expected):
+    points = np.array(points, dtype=np.float64)[None]
+    pkg = batch_intersection_rate(points, np.ones(points.shape[:2], dtype=bool), 100, 50)
+    assert pkg["intersection_area"][0] == pytest.approx(expected, abs=1e-9)
+    assert pkg["intersection_rate"][0] == pytest.approx(expected / 5000.0, abs=1e-12)
+
+
+@pytest.mark.parametrize("max_distance", [0.0, 40.0])
+def test_compute_visibility_pairs_matches_baseline(max_distance):
+    rng = np.random.default_rng(0)
+    cameras = random_cameras(rng, 40)
+    corner_points = random_corner_points(rng, 12)
+    cams = stack_cameras(cameras)
+    pair_partition, pair_camera = [idx.ravel() for idx in np.meshgrid(np.arange(12), np.arange(40), indexing="ij")]
+
+    result = compute_visibility_pairs(corner_points, cams, pair_partition, pair_camera, pair_chunk=97,
+                                      max_distance=max_distance)
+    baseline = np.array([baseline_area(corner_points[p], cameras[c]) for p, c in zip(pair_partition, pair_camera)])
+    image_area = cams["width"][pair_camera] * cams["height"][pair_camera]
+
+    assert result["frustum_culled"] > 0
+    if max_distance == 0:
+        assert result["distance_culled"] == 0
+        np.testing.assert_allclose(result["intersection_area"] / image_area, baseline / image_area, rtol=0, atol=1e-9)
+    else:
+        # 距离剔除不是保守的，只比较没有被剔除的对
+        computed = result["intersection_area"] > 0
+        np.testing.assert_allclose(result["intersection_area"][computed] / image_area[computed],
+                                   baseline[computed] / image_area[computed], rtol=0, atol=1e-9)
+
+
+def test_frustum_cull_is_conservative():
+    rng = np.random.default_rng(1)
+    cameras = random_cameras(rng, 30)
+    corner_points = random_corner_points(rng, 20)
+    frustum_culled, distance_culled = frustum_cull(corner_points, stack_cameras(cameras))
+    assert frustum_culled.any() and not distance_culled.any()
+    for p, c in zip(*np.nonzero(frustum_culled)):
+        assert baseline_area(corner_points[p], cameras[c]) == 0.0
+
+
+def test_points_in_camera_matches_baseline():
+    rng = np.random.default_rng(2)
+    cameras = random_cameras(rng, 5)
+    cams = stack_cameras(cameras)
+    points = rng.uniform([-60, -10, -60], [60, 10, 60], size=(20000, 3))
+    for idx, camera in enumerate(cameras):
+        points_image, in_front = project_baseline(camera, points)
+        expected = in_front & (points_image[:, 0] >= 0) & (points_image[:, 0] < camera.image_height) & \
+            (points_image[:, 1] >= 0) & (points_image[:, 1] < camera.image_width)
+        np.testing.assert_array_equal(points_in_camera(cams, idx, points, chunk_size=3001), expected)
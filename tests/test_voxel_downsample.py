@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Description: 体素降采样与逐体素求平均的结果比较
+import numpy as np
+import pytest
+
+from scene.vastgs.voxel_downsample import KEY_BITS, voxel_keys, voxel_downsample
+
+
+def brute_force(points, colors, normals, voxel_size):
+    """按体素坐标分组求平均，按体素坐标的字典序排列"""
+    coords = np.floor(points / voxel_size).astype(np.int64)
+    unique_coords, inverse = np.unique(coords, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    result = []
+    for values in [points, colors, normals]:
+        result.append(np.stack([np.bincount(inverse, weights=values[:, axis]) for axis in range(3)], axis=1)
+                      / np.bincount(inverse)[:, None])
+    length = np.linalg.norm(result[2], axis=1, keepdims=True)
+    result[2] = np.divide(result[2], length, out=np.zeros_like(result[2]), where=length > 0)
+    return result
+
+
+def chunked(points, colors, normals, chunk_size):
+    return [(points[start:start + chunk_size], colors[start:start + chunk_size], normals[start:start + chunk_size])
+            for start in range(0, max(len(points), 1), chunk_size)]
+
+
+@pytest.mark.parametrize("offset", [0.0, 1e5])
+@pytest.mark.parametrize("use_origin", [False, True])
+def test_voxel_downsample_matches_brute_force(offset, use_origin):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-20, 20, size=(20000, 3)) + offset
+    colors = rng.random((20000, 3))
+    normals = rng.normal(size=(20000, 3))
+    origin = points.min(axis=0) if use_origin else None
+
+    result = voxel_downsample(chunked(points, colors, normals, 3001), 0.5, origin)
+    expected = brute_force(points, colors, normals, 0.5)
+    for value, reference in zip(result, expected):
+        np.testing.assert_allclose(value, reference, rtol=1e-9, atol=1e-12)
+
+
+def test_voxel_keys_order_and_origin():
+    rng = np.random.default_rng(1)
+    points = rng.uniform(-1000, 1000, size=(10000, 3))
+    keys = voxel_keys(points, 1.0)
+    shifted = voxel_keys(points, 1.0, origin=points.min(axis=0))
+    coords = np.floor(points).astype(np.int64)
+    # 键的顺序与体素坐标的字典序相同，给出origin只平移键而不改变顺序
+    np.testing.assert_array_equal(np.argsort(keys, kind="stable"), np.lexsort(coords.T[::-1]))
+    np.testing.assert_array_equal(np.argsort(shifted, kind="stable"), np.argsort(keys, kind="stable"))
+    assert len(np.unique(keys)) == len(np.unique(coords, axis=0))
+
+
+def test_voxel_keys_out_of_range():
+    points = np.array([[0.0, 0.0, 0.0], [float(1 << KEY_BITS), 0.0, 0.0]])
+    with pytest.raises(ValueError):
+        voxel_keys(points, 1.0, origin=points.min(axis=0))
+    # 远离坐标原点的点云需要给出origin
+    far = np.array([[3e6, 0.0, 0.0], [3e6 + 10, 5.0, 5.0]])
+    with pytest.raises(ValueError):
+        voxel_keys(far, 1.0)
+    assert len(np.unique(voxel_keys(far, 1.0, origin=far.min(axis=0)))) == 2
+
+
+def test_voxel_downsample_empty():
+    points, colors, normals = voxel_downsample([(np.zeros((0, 3)), np.zeros((0, 3)), np.zeros((0, 3)))], 0.5)
+    assert points.shape == colors.shape == normals.shape == (0, 3)
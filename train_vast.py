@@ -22,9 +22,13 @@ from scene import Scene, GaussianModel, PartitionScene
 from scene.vastgs.appearance_network import decouple_appearance
 from utils.general_utils import safe_state
 from utils.partition_utils import data_partition, read_camList
+from scene.vastgs.partition_manifest import load_partition_adjacency
+from scene.vastgs.partition_graph import gpu_partition_order
 import uuid
 from tqdm import tqdm
 from utils.image_utils import psnr
+from utils.image_provider import current_image_provider
+from utils.image_cache import current_image_disk_caches
 from utils.manhattan_utils import get_man_trans
 from argparse import ArgumentParser, Namespace
 from arguments import ModelParams, PipelineParams, OptimizationParams
@@ -228,7 +232,11 @@ def prepare_output_and_logger(args):
         del_var_list = ["manhattan", "man_trans", "pos", "rot",
                         "m_region", "n_region", "extend_rate", "visible_rate",
                         "num_gpus", "partition_id", "partition_model_path", "plantform",
-                        "llffhold"]  # 删除多余的变量，防止无法使用SIBR可视化
+                        "llffhold", "track_point_selection", "cache_dir",
+                        "partition_strategy", "partition_target_cost", "partition_max_cameras", "partition_max_points",
+                        "partition_workers", "visibility_max_distance", "sub_m_region", "sub_n_region", "point_chunk_size",
+                        "voxel_size", "voxel_max_points", "image_cache_mb",
+                        "image_disk_cache", "jpeg_draft", "load_workers", "uint8_images"]  # 删除多余的变量，防止无法使用SIBR可视化
         for key in vars(args).keys():
             if key in del_var_list:
                 del var_dict[key]
@@ -276,6 +284,18 @@ def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_i
                     tb_writer.add_scalar(config['name'] + '/loss_viewpoint - l1_loss', l1_test, iteration)
                     tb_writer.add_scalar(config['name'] + '/loss_viewpoint - psnr', psnr_test, iteration)
 
+        image_provider = current_image_provider()
+        if image_provider is not None:
+            print(f"[ITER {iteration}] {image_provider}")
+            if tb_writer:
+                for key, value in image_provider.stats().items():
+                    tb_writer.add_scalar(f"image_cache/{key}", value, iteration)
+        for disk_cache in current_image_disk_caches():
+            print(f"[ITER {iteration}] {disk_cache}")
+            if tb_writer:
+                for key, value in disk_cache.stats().items():
+                    tb_writer.add_scalar(f"image_disk_cache/{key}", value, iteration)
+
         if tb_writer:
             tb_writer.add_histogram("scene/opacity_histogram", scene.gaussians.get_opacity, iteration)
             tb_writer.add_scalar('total_points', scene.gaussians.get_xyz.shape[0], iteration)
@@ -322,6 +342,10 @@ if __name__ == "__main__":
 
     cuda_devices = torch.cuda.device_count()
     print(f"Found {cuda_devices} CUDA devices")
+    # 按GPU调度调整顺序，使同一块GPU上先后训练的partition相邻且共享相机较多
+    adjacency = load_partition_adjacency(lp.model_path)
+    if adjacency is not None:
+        partition_id_list = gpu_partition_order(partition_id_list, adjacency, cuda_devices)
     training_round = partition_num // cuda_devices
     remainder = partition_num % cuda_devices
 
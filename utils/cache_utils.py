@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#        Data: 2026-10-17 14:20
+#     Project: VastGaussian
+#   File Name: cache_utils.py
+#      Author: KangPeilun
+#       Email: 374774222@qq.com
+# Description: 缓存相关的工具函数，文件内容哈希(按size/mtime记忆化)与原子写入
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+
+
+def temp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # 同一进程的多个线程也不会写同一个临时文件
+
+
+def atomic_write(path, write_fn):
+    """先写入临时文件再重命名，多个进程同时写同一个缓存文件时不会读到写了一半的文件
+    :param write_fn: 接收一个已打开的二进制文件对象
+    """
+    tmp_path = temp_path(path)
+    try:
+        with open(tmp_path, "wb") as file:
+            write_fn(file)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def atomic_save_json(path, obj):
+    atomic_write(path, lambda file: file.write(json.dumps(obj, indent=2).encode("utf-8")))
+
+
+def atomic_save_npy(path, array):
+    atomic_write(path, lambda file: np.save(file, array))
+
+
+def atomic_save_npy_chunks(paths, num_rows, chunks):
+    """将依次给出的块分别追加写入多个npy文件，全部写完后再重命名，峰值内存只与每块的大小有关，文件与np.save的结果相同
+    :param paths: dict, 名称 -> npy文件的路径
+    :param chunks: 依次给出 名称 -> 数组 的dict，至少一块(可以为空)，同一名称的各块dtype与除第一维外的形状相同，
+                   每个名称的行数之和为num_rows
+    """
+    tmp_paths = {key: temp_path(path) for key, path in paths.items()}
+    files = {}
+    written = 0
+    try:
+        for chunk in chunks:
+            for key, tmp_path in tmp_paths.items():
+                array = np.ascontiguousarray(chunk[key])
+                if key not in files:
+                    files[key] = open(tmp_path, "wb")
+                    np.lib.format.write_array_header_1_0(files[key], {
+                        "descr": np.lib.format.dtype_to_descr(array.dtype), "fortran_order": False,
+                        "shape": (num_rows,) + array.shape[1:]})
+                array.tofile(files[key])
+            written += np.asarray(chunk[next(iter(paths))]).shape[0]
+        assert written == num_rows, f"wrote {written} rows, expected {num_rows}"
+        for file in files.values():
+            file.close()
+        for key, path in paths.items():
+            os.replace(tmp_paths[key], path)
+    finally:
+        for file in files.values():
+            file.close()
+        for tmp_path in tmp_paths.values():
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def load_json(path):
+    """读取json文件，文件不存在或损坏时返回None"""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def file_digest(path, memo_path=None, chunk_size=1 << 24):
+    """计算文件内容的sha1，结果按 (size, mtime_ns) 记忆化在memo_path中，文件未改变时只需要一次stat
+    :param memo_path: 记忆化文件的路径，为None时每次都重新计算
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    memo = (load_json(memo_path) or {}) if memo_path is not None else {}
+    entry = memo.get(path)
+    if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["sha1"]
+
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha1.update(chunk)
+    digest = sha1.hexdigest()
+
+    if memo_path is not None:
+        memo = load_json(memo_path) or {}  # 重新读取，避免覆盖其他进程的记录
+        memo[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": digest}
+        try:
+            atomic_save_json(memo_path, memo)
+        except OSError:
+            pass
+    return digest
+
+
+def array_digest(array):
+    """数组(如曼哈顿变换矩阵)的哈希，None 对应固定的值"""
+    if array is None:
+        return "none"
+    array = np.asarray(array)
+    sha1 = hashlib.sha1(str(array.shape).encode("utf-8"))
+    if array.ndim == 0:
+        sha1.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        return sha1.hexdigest()
+    # 按行分块转换与哈希，映射到文件的大点云不需要整体转换为float64，结果与整体哈希相同
+    rows = max(1, (1 << 24) // max(array[:1].size * 8, 1))
+    for start in range(0, array.shape[0], rows):
+        sha1.update(np.ascontiguousarray(array[start:start + rows], dtype=np.float64).tobytes())
+    return sha1.hexdigest()
+
+
+def fingerprint(*items):
+    """多个输入的组合哈希，数组按内容哈希，其余对象按json序列化后哈希"""
+    sha1 = hashlib.sha1()
+    for item in items:
+        if isinstance(item, np.ndarray):
+            sha1.update(array_digest(item).encode("utf-8"))
+        else:
+            sha1.update(json.dumps(item, sort_keys=True).encode("utf-8"))
+    return sha1.hexdigest()
@@ -11,13 +11,76 @@
 
 from scene.cameras import Camera, SimpleCamera
 import numpy as np
-from utils.general_utils import PILtoTorch
+from utils.general_utils import PILtoArray, ArrayToTorch
 from utils.graphics_utils import fov2focal
+from utils.image_provider import LazyImage, get_image_provider
+from utils.image_cache import get_image_disk_cache
+from scene.scene_cache import get_cache_dir
 from PIL import Image
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
+import time
 
 WARNED = False
 
+
+class DecodeStats:
+    """每张图片解码与缩放的耗时"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.seconds = {}  # 图片路径 -> 耗时
+        self.draft_images = set()
+
+    def add(self, image_path, seconds, draft):
+        with self.lock:
+            self.seconds[image_path] = seconds
+            if draft:
+                self.draft_images.add(image_path)
+
+    def report(self, table_path=None):
+        """输出总耗时与最慢的图片，给出table_path时将每张图片的耗时按从慢到快追加写入该文件"""
+        if len(self.seconds) == 0:
+            return
+        slowest = max(self.seconds, key=self.seconds.get)
+        total = sum(self.seconds.values())
+        print(f"[ INFO ] Decoded {len(self.seconds)} images in {total:.1f}s "
+              f"({1000 * total / len(self.seconds):.1f} ms/image, {len(self.draft_images)} with JPEG draft decoding), "
+              f"slowest {os.path.basename(slowest)} {1000 * self.seconds[slowest]:.1f} ms"
+              + (f", per-image times in {table_path}" if table_path else ""))
+        if table_path:
+            with open(table_path, "a") as f:
+                f.write(f"# {len(self.seconds)} images\nimage_path\tdecode_ms\tjpeg_draft\n")
+                for image_path in sorted(self.seconds, key=self.seconds.get, reverse=True):
+                    f.write(f"{image_path}\t{1000 * self.seconds[image_path]:.3f}\t{int(image_path in self.draft_images)}\n")
+
+DECODE_STATS = DecodeStats()
+
+def image_disk_cache(args):
+    """启用image_disk_cache时返回缩放后图片的磁盘缓存，位于场景缓存目录下"""
+    if not getattr(args, "image_disk_cache", False):
+        return None
+    return get_image_disk_cache(get_cache_dir(args.source_path, getattr(args, "cache_dir", "")))
+
+def report_loading(args):
+    """输出本次加载相机时的解码耗时(每张图片的耗时写入model_path/decode_times.txt)，
+    以及磁盘缓存的命中情况(延迟加载时训练中解码的图片在training_report中输出)
+    """
+    model_path = getattr(args, "model_path", "")
+    DECODE_STATS.report(os.path.join(model_path, "decode_times.txt") if model_path and os.path.isdir(model_path) else None)
+    disk_cache = image_disk_cache(args)
+    if disk_cache is not None:
+        print(f"[ INFO ] {disk_cache}")
+
+def lazy_image_key(image_path, resolution, mode, args):
+    """延迟加载时图片在缓存中的键，包含所有影响解码结果的参数，训练与评估相机使用同一张图片时不会共用不同格式的结果"""
+    return (f"{image_path}@{resolution[0]}x{resolution[1]}|{mode}"
+            f"|draft={int(getattr(args, 'jpeg_draft', False))}|uint8={int(getattr(args, 'uint8_images', False))}")
+
 def loadCam(args, id, cam_info, resolution_scale):
     orig_w, orig_h = cam_info.image.size
 
@@ -40,31 +103,99 @@ def loadCam(args, id, cam_info, resolution_scale):
         scale = float(global_down) * float(resolution_scale)
         resolution = (int(orig_w / scale), int(orig_h / scale))
 
-    resized_image_rgb = PILtoTorch(cam_info.image, resolution)
+    if getattr(args, "image_cache_mb", 0) > 0:
+        # 延迟加载: 只记录分辨率，第一次使用时才解码
+        image = LazyImage(key=lazy_image_key(cam_info.image_path, resolution, None, args),
+                          width=resolution[0], height=resolution[1],
+                          load=partial(load_lazy_image, cam_info.image, resolution, None, image_disk_cache(args),
+                                       getattr(args, "jpeg_draft", False), getattr(args, "uint8_images", False)))
+        return Camera(colmap_id=cam_info.uid, R=cam_info.R, T=cam_info.T,
+                      FoVx=cam_info.FovX, FoVy=cam_info.FovY,
+                      image=image, gt_alpha_mask=None,
+                      image_name=cam_info.image_name, uid=id, data_device=args.data_device,
+                      image_provider=get_image_provider(args.image_cache_mb))
+
+    gt_image, loaded_mask = load_gt_image(cam_info.image, resolution, disk_cache=image_disk_cache(args),
+                                          draft=getattr(args, "jpeg_draft", False),
+                                          uint8=getattr(args, "uint8_images", False))
+
+    return Camera(colmap_id=cam_info.uid, R=cam_info.R, T=cam_info.T, 
+                  FoVx=cam_info.FovX, FoVy=cam_info.FovY, 
+                  image=gt_image, gt_alpha_mask=loaded_mask,
+                  image_name=cam_info.image_name, uid=id, data_device=args.data_device)
+
+def decode_image(image, resolution, mode=None, draft=False):
+    """解码并缩放图片，返回uint8数组
+    :param draft: 目标分辨率不超过原图的1/2、1/4或1/8时，JPEG在DCT域中直接解码为缩小的图片，再精确缩放到目标分辨率，
+                  此时重新打开文件进行解码，不修改CameraInfo中共用的图片对象
+    """
+    start = time.perf_counter()
+    reduced = False
+    if draft and getattr(image, "filename", "") and image.format == "JPEG":
+        with Image.open(image.filename) as file_image:
+            result = file_image.draft(mode, resolution)  # 返回缩小后的图片中与原图对应的区域
+            reduced = file_image.size != image.size
+            array = PILtoArray(file_image if mode is None else file_image.convert(mode), resolution,
+                               result[1] if result is not None else None)
+    else:
+        array = PILtoArray(image if mode is None else image.convert(mode), resolution)
+    DECODE_STATS.add(getattr(image, "filename", "") or str(id(image)), time.perf_counter() - start, reduced)
+    return array
+
+def load_gt_image(image, resolution, mode=None, disk_cache=None, draft=False, uint8=False):
+    """缩放图片，返回RGB图像与alpha mask
+    :param mode: 缩放前转换的颜色模式，如 "RGB"
+    :param disk_cache: 不为None时，来自文件的图片缩放后的结果从磁盘缓存中读取，命中时不需要解码
+    :param draft: 是否使用JPEG的缩小解码，见decode_image
+    :param uint8: 为True时返回uint8的图像与mask，由Camera在使用时再转换为float
+    """
+    def decode():
+        return decode_image(image, resolution, mode, draft)
+
+    if disk_cache is not None and getattr(image, "filename", ""):
+        resized_image_rgb = ArrayToTorch(disk_cache.load(image.filename, resolution, decode, mode, draft), not uint8)
+    else:
+        resized_image_rgb = ArrayToTorch(decode(), not uint8)
 
     gt_image = resized_image_rgb[:3, ...]
     loaded_mask = None
 
     if resized_image_rgb.shape[1] == 4:
         loaded_mask = resized_image_rgb[3:4, ...]
-
-    return Camera(colmap_id=cam_info.uid, R=cam_info.R, T=cam_info.T, 
-                  FoVx=cam_info.FovX, FoVy=cam_info.FovY, 
-                  image=gt_image, gt_alpha_mask=loaded_mask,
-                  image_name=cam_info.image_name, uid=id, data_device=args.data_device)
+    return gt_image, loaded_mask
+
+def load_lazy_image(image, resolution, mode=None, disk_cache=None, draft=False, uint8=False):
+    """延迟加载时解码图片: 来自文件的图片重新打开，解码后的像素不会一直保留在CameraInfo中；内存中的图片(如合成数据集)直接使用"""
+    if not getattr(image, "filename", ""):
+        return load_gt_image(image, resolution, mode, uint8=uint8)
+    with Image.open(image.filename) as file_image:
+        return load_gt_image(file_image, resolution, mode, disk_cache, draft, uint8)
+
+def load_cameras(load_fn, args, cam_infos, resolution_scale):
+    """依次对每个CameraInfo调用 load_fn(args, id, cam_info, resolution_scale)，id为其在cam_infos中的序号
+    load_workers>1时在线程池中并行解码与缩放(PIL解码时释放GIL)，结果仍按cam_infos的顺序排列
+    """
+    num_workers = getattr(args, "load_workers", 1)
+    if num_workers <= 0:
+        num_workers = os.cpu_count() or 1
+    if num_workers <= 1 or len(cam_infos) <= 1:
+        return [load_fn(args, id, c, resolution_scale) for id, c in enumerate(cam_infos)]
+    with ThreadPoolExecutor(max_workers=min(num_workers, len(cam_infos))) as executor:
+        return list(executor.map(lambda item: load_fn(args, item[0], item[1], resolution_scale), enumerate(cam_infos)))
 
 def cameraList_from_camInfos(cam_infos, resolution_scale, args):
     camera_list = []
 
-    for id, c in enumerate(cam_infos):
-        camera_list.append(loadCam(args, id, c, resolution_scale))
+    DECODE_STATS.reset()
+    camera_list.extend(load_cameras(loadCam, args, cam_infos, resolution_scale))
+    report_loading(args)
 
     return camera_list
 
 
 def loadCamEval(args, id, cam_info, resolution_scale):
     image_path = cam_info.image_path
-    image = Image.open(image_path).convert('RGB')
+    image = Image.open(image_path)  # 只读取文件头，缩放前再解码
     orig_w, orig_h = image.size
 
     if args.resolution in [1, 2, 4, 8]:
@@ -86,12 +217,20 @@ def loadCamEval(args, id, cam_info, resolution_scale):
         scale = float(global_down) * float(resolution_scale)
         resolution = (int(orig_w / scale), int(orig_h / scale))
 
-    resized_image_rgb = PILtoTorch(image, resolution)
-    gt_image = resized_image_rgb[:3, ...]
-
-    loaded_mask = None
-    if resized_image_rgb.shape[1] == 4:
-        loaded_mask = resized_image_rgb[3:4, ...]
+    if getattr(args, "image_cache_mb", 0) > 0:
+        image.close()  # 延迟加载时按文件名重新打开，不保留打开的文件
+        image = LazyImage(key=lazy_image_key(image_path, resolution, "RGB", args),
+                          width=resolution[0], height=resolution[1],
+                          load=partial(load_lazy_image, image, resolution, "RGB", image_disk_cache(args),
+                                       getattr(args, "jpeg_draft", False), getattr(args, "uint8_images", False)))
+        return Camera(colmap_id=cam_info.uid, R=cam_info.R, T=cam_info.T,
+                      FoVx=cam_info.FovX, FoVy=cam_info.FovY,
+                      image=image, gt_alpha_mask=None,
+                      image_name=cam_info.image_name, uid=id, data_device=args.data_device,
+                      image_provider=get_image_provider(args.image_cache_mb))
+
+    gt_image, loaded_mask = load_gt_image(image, resolution, "RGB", image_disk_cache(args),
+                                          getattr(args, "jpeg_draft", False), getattr(args, "uint8_images", False))
     # if data is in a validation set, mask right-side pixels, as in Mega-NeRF
     # See https://github.com/cmusatyalab/mega-nerf/issues/18 for more details
 
@@ -178,7 +317,8 @@ def cameraList_from_camInfos_partition(cam_infos, args):
 def cameraList_from_camInfosEval(cam_infos, resolution_scale, args):
     camera_list = []
 
-    for id, c in enumerate(cam_infos):
-        camera_list.append(loadCamEval(args, id, c, resolution_scale))
+    DECODE_STATS.reset()
+    camera_list.extend(load_cameras(loadCamEval, args, cam_infos, resolution_scale))
+    report_loading(args)
     camera_list = sorted(camera_list, key=lambda x: x.image_name)
     return camera_list
\ No newline at end of file
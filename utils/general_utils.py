@@ -19,8 +19,15 @@ def inverse_sigmoid(x):
     return torch.log(x/(1-x))
 
 def PILtoTorch(pil_image, resolution):
-    resized_image_PIL = pil_image.resize(resolution)
-    resized_image = torch.from_numpy(np.array(resized_image_PIL)) / 255.0
+    return ArrayToTorch(PILtoArray(pil_image, resolution))
+
+def PILtoArray(pil_image, resolution, box=None):
+    resized_image_PIL = pil_image.resize(resolution, box=box)
+    return np.array(resized_image_PIL)
+
+def ArrayToTorch(array, normalize=True):
+    """uint8数组 [H, W, C] 转为 [C, H, W] 的tensor，normalize为False时保持uint8，不除以255"""
+    resized_image = torch.from_numpy(array) / 255.0 if normalize else torch.from_numpy(np.ascontiguousarray(array))
     if len(resized_image.shape) == 3:
         return resized_image.permute(2, 0, 1)
     else:
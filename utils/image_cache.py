@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+#        Data: 2026-10-17 23:20
+#     Project: VastGaussian
+#   File Name: image_cache.py
+#      Author: KangPeilun
+#       Email: 374774222@qq.com
+# Description: 缩放后图片的磁盘缓存，所有partition与多次运行共用
+"""
+缩放后的图片以uint8的npy文件保存在 <cache_dir>/images 下，文件名由 (图片的绝对路径, 文件大小, mtime, 目标分辨率, 颜色模式) 的哈希决定，
+图片文件改变后自动使用新的缓存；读取时使用memmap(写时复制)，不需要再解码JPEG与缩放
+缓存文件先写入临时文件再重命名，多个partition进程同时写同一张图片时不会读到不完整的文件
+"""
+import os
+import hashlib
+import threading
+
+import numpy as np
+
+from utils.cache_utils import atomic_save_npy
+
+
+class ImageDiskCache:
+    def __init__(self, cache_dir):
+        self.image_dir = os.path.join(cache_dir, "images")
+        self.hits = 0
+        self.misses = 0
+        self.write_failed = False
+        self.lock = threading.Lock()  # 多个线程同时加载图片时保护计数
+
+    def cache_path(self, image_path, resolution, mode=None, draft=False):
+        image_path = os.path.abspath(image_path)
+        stat = os.stat(image_path)
+        key = hashlib.sha1(f"{image_path}|{stat.st_size}|{stat.st_mtime_ns}|{resolution[0]}x{resolution[1]}|{mode}"
+                           f"{'|draft' if draft else ''}".encode("utf-8")).hexdigest()
+        return os.path.join(self.image_dir, key[:2], f"{key}.npy")
+
+    def load(self, image_path, resolution, decode, mode=None, draft=False):
+        """读取缩放后的图片，缓存中没有时调用decode()解码缩放并写入缓存
+        :param decode: 返回缩放后的uint8数组 [H, W] 或 [H, W, C]
+        :param draft: 是否使用JPEG的缩小解码，结果与完整解码略有不同，分别缓存
+        """
+        path = self.cache_path(image_path, resolution, mode, draft)
+        try:
+            array = np.load(path, mmap_mode="c")
+            with self.lock:
+                self.hits += 1
+            return array
+        except (OSError, ValueError):
+            pass
+
+        with self.lock:
+            self.misses += 1
+        array = np.ascontiguousarray(decode())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_save_npy(path, array)
+        except OSError as e:
+            if not self.write_failed:  # 缓存目录不可写时只提示一次
+                print(f"[ WARNING ] Failed to write image cache {self.image_dir}: {e}")
+                self.write_failed = True
+        return array
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def __str__(self):
+        stats = self.stats()
+        return f"Image disk cache {self.image_dir}: {stats['hits']} hits, {stats['misses']} misses"
+
+
+_image_disk_caches = {}
+_image_disk_caches_lock = threading.Lock()  # 多个线程同时加载相机时每个目录只创建一个ImageDiskCache
+
+
+def get_image_disk_cache(cache_dir):
+    """进程内每个缓存目录共用一个ImageDiskCache"""
+    with _image_disk_caches_lock:
+        if cache_dir not in _image_disk_caches:
+            _image_disk_caches[cache_dir] = ImageDiskCache(cache_dir)
+        return _image_disk_caches[cache_dir]
+
+
+def current_image_disk_caches():
+    """当前进程中使用过的图片磁盘缓存"""
+    with _image_disk_caches_lock:
+        return list(_image_disk_caches.values())
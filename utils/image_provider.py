@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#        Data: 2026-10-17 22:50
+#     Project: VastGaussian
+#   File Name: image_provider.py
+#      Author: KangPeilun
+#       Email: 374774222@qq.com
+# Description: 训练图片的延迟加载与LRU缓存
+"""
+相机创建时不再解码图片，第一次访问 Camera.original_image 时才解码、缩放并放到data_device上，
+解码后的tensor保存在按字节数限制容量的LRU缓存中，超过容量时丢弃最久未使用的图片，再次访问时重新解码
+缓存容量足够容纳所有图片时，每张图片只解码一次，结果与预先加载所有图片相同
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Callable
+
+
+class LazyImage(NamedTuple):
+    key: str  # 缓存中的键，包含图片路径、分辨率以及颜色模式等解码参数
+    width: int  # 缩放后的宽度
+    height: int  # 缩放后的高度
+    load: Callable  # 解码并缩放图片，返回 (gt_image [3, H, W], alpha mask 或 None)
+
+
+def tensor_bytes(tensor):
+    return tensor.element_size() * tensor.nelement()
+
+
+class ImageProvider:
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.cache = OrderedDict()  # key -> tensor，按最近访问的顺序排列
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.decode_seconds = 0.0
+
+    def get(self, key, load):
+        """返回key对应的图片，不在缓存中时调用load()解码并加入缓存"""
+        with self.lock:
+            image = self.cache.get(key)
+            if image is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        start = time.perf_counter()
+        image = load()
+        elapsed = time.perf_counter() - start
+
+        size = tensor_bytes(image)
+        with self.lock:
+            self.decode_seconds += elapsed
+            if key not in self.cache and size <= self.budget_bytes:  # 单张超过容量的图片不缓存
+                while self.cached_bytes + size > self.budget_bytes:
+                    _, evicted = self.cache.popitem(last=False)
+                    self.cached_bytes -= tensor_bytes(evicted)
+                    self.evictions += 1
+                self.cache[key] = image
+                self.cached_bytes += size
+        return image
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "decode_seconds": self.decode_seconds, "cached_images": len(self.cache),
+                    "cached_mb": self.cached_bytes / 2 ** 20}
+
+    def __str__(self):
+        stats = self.stats()
+        return (f"Image cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+                f"{stats['decode_seconds']:.1f}s decoding, {stats['cached_images']} images "
+                f"({stats['cached_mb']:.0f}/{self.budget_bytes / 2 ** 20:.0f} MB)")
+
+
+_image_provider = None  # 进程内所有相机共用一个缓存
+_image_provider_lock = threading.Lock()  # 多个线程同时加载相机时只创建一个缓存
+
+
+def get_image_provider(cache_mb):
+    """返回进程内共享的图片缓存，容量为cache_mb MB"""
+    global _image_provider
+    with _image_provider_lock:
+        if _image_provider is None:
+            _image_provider = ImageProvider(int(cache_mb * 2 ** 20))
+        else:
+            _image_provider.budget_bytes = int(cache_mb * 2 ** 20)
+        return _image_provider
+
+
+def current_image_provider():
+    """当前进程中的图片缓存，没有使用延迟加载时返回None"""
+    return _image_provider
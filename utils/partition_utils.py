@@ -15,7 +15,9 @@ def data_partition(lp):
     from scene.vastgs.data_partition import ProgressiveDataPartitioning
 
     # 读取整个场景的点云以及相机，同时将相机划分为train和test
-    scene_info = sceneLoadTypeCallbacks["Partition"](lp.source_path, lp.images, lp.man_trans, lp.eval, lp.llffhold)  # 得到一个场景的所有参数信息
+    scene_info = sceneLoadTypeCallbacks["Partition"](lp.source_path, lp.images, lp.man_trans, lp.eval, lp.llffhold,
+                                                     load_tracks=lp.track_point_selection, cache_dir=lp.cache_dir,
+                                                     point_chunk_size=lp.point_chunk_size)  # 得到一个场景的所有参数信息
     with open(os.path.join(lp.model_path, "train_cameras.txt"), "w") as f:
         for cam in scene_info.train_cameras:
             image_name = cam.image_name
@@ -28,7 +30,12 @@ def data_partition(lp):
 
     all_cameras = cameraList_from_camInfos_partition(scene_info.train_cameras + scene_info.test_cameras, args=lp)
     DataPartitioning = ProgressiveDataPartitioning(scene_info, all_cameras, lp.model_path,
-                                                   lp.m_region, lp.n_region, lp.extend_rate, lp.visible_rate)
+                                                   lp.m_region, lp.n_region, lp.extend_rate, lp.visible_rate,
+                                                   lp.partition_strategy, lp.partition_target_cost,
+                                                   lp.partition_max_cameras, lp.partition_max_points,
+                                                   lp.partition_workers, lp.visibility_max_distance,
+                                                   lp.sub_m_region, lp.sub_n_region, lp.point_chunk_size,
+                                                   lp.voxel_size, lp.voxel_max_points)
     partition_result = DataPartitioning.partition_scene
 
     # 保存每个partition的图片名称到txt文件
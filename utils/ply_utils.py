@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#        Data: 2026-10-17 21:30
+#     Project: VastGaussian
+#   File Name: ply_utils.py
+#      Author: KangPeilun
+#       Email: 374774222@qq.com
+# Description: 二进制PLY文件的快速读写，storePly/fetchPly、GaussianModel以及无缝合并共用
+"""
+写入: 由各列的连续数组直接填充结构化数组，写入文件头后一次性写入顶点数据，不再逐点构造python tuple
+读取: 解析文件头后用np.memmap映射顶点数据，返回结构化数组，每一列都是不复制的视图
+文件格式与plyfile写出的 binary_little_endian 文件相同；binary_big_endian 文件同样直接映射，列的dtype保留大端字节序，
+只有ascii或包含变长属性(如面片)的文件交给plyfile读取
+"""
+import numpy as np
+from numpy.lib import recfunctions
+from plyfile import PlyData
+
+PLY_TYPES = {"char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+             "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+             "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+             "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"}
+NUMPY_TYPES = {"i1": "char", "u1": "uchar", "i2": "short", "u2": "ushort",
+               "i4": "int", "u4": "uint", "f4": "float", "f8": "double"}
+
+
+def to_structured(attributes):
+    """
+    :param attributes: list of (属性名列表, [N, len(属性名)] 的数组)，数组的dtype即属性在文件中的类型
+    """
+    dtype = []
+    num_elements = None
+    for names, array in attributes:
+        array = np.asarray(array)
+        assert array.ndim == 2 and array.shape[1] == len(names), f"shape {array.shape} does not match {names}"
+        assert num_elements is None or array.shape[0] == num_elements, "all attributes must have the same length"
+        num_elements = array.shape[0]
+        dtype.extend((name, array.dtype.newbyteorder("<").str) for name in names)
+
+    elements = np.empty(num_elements or 0, dtype=dtype)
+    for names, array in attributes:
+        for idx, name in enumerate(names):
+            elements[name] = array[:, idx]
+    return elements
+
+
+def ply_header(dtype, num_elements, element="vertex"):
+    header = ["ply", "format binary_little_endian 1.0", f"element {element} {num_elements}"]
+    header += [f"property {NUMPY_TYPES[dtype[name].str[1:]]} {name}" for name in dtype.names]
+    header.append("end_header")
+    return ("\n".join(header) + "\n").encode("ascii")
+
+
+def write_ply(path, attributes, element="vertex"):
+    """
+    :param attributes: list of (属性名列表, [N, len(属性名)] 的数组)，数组的dtype即属性在文件中的类型
+    """
+    elements = to_structured(attributes)
+    with open(path, "wb") as file:
+        file.write(ply_header(elements.dtype, elements.shape[0], element))
+        elements.tofile(file)
+
+
+def write_ply_chunks(path, chunks, num_elements, element="vertex"):
+    """分块写入，峰值内存只与每块的大小有关
+    :param chunks: 依次给出与write_ply格式相同的attributes，至少一块(可以为空)，各块的属性相同，总数需等于num_elements
+    """
+    written = 0
+    with open(path, "wb") as file:
+        for idx, attributes in enumerate(chunks):
+            elements = to_structured(attributes)
+            if idx == 0:
+                file.write(ply_header(elements.dtype, num_elements, element))
+            elements.tofile(file)
+            written += elements.shape[0]
+    assert written == num_elements, f"wrote {written} elements, expected {num_elements}"
+
+
+def parse_header(file):
+    """解析文件头
+    :return: (格式, [(元素名, 数量, [(属性名, 类型)])], 数据起始位置)，属性为变长列表时类型为None
+    """
+    assert file.readline().strip() == b"ply", "not a ply file"
+    file_format, elements = None, []
+    while True:
+        line = file.readline()
+        assert line, "unexpected end of ply header"
+        words = line.decode("ascii").split()
+        if not words or words[0] in ["comment", "obj_info"]:
+            continue
+        if words[0] == "end_header":
+            return file_format, elements, file.tell()
+        if words[0] == "format":
+            file_format = words[1]
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            elements[-1][2].append((words[-1], None if words[1] == "list" else PLY_TYPES[words[1]]))
+
+
+def read_ply(path, element="vertex", mmap=True):
+    """读取PLY文件中的一个元素
+    :param mmap: 为True时返回映射到文件的只读数组，否则将数据读入内存，大小端的二进制文件都直接解析
+    :return: 结构化数组，data["x"] 等为不复制的列视图
+    """
+    with open(path, "rb") as file:
+        file_format, elements, offset = parse_header(file)
+
+    byte_order = {"binary_little_endian": "<", "binary_big_endian": ">"}.get(file_format)
+    fixed_size = all(prop_type is not None for _, _, props in elements for _, prop_type in props)
+    if byte_order is None or not fixed_size:
+        return PlyData.read(path)[element].data
+
+    for name, count, props in elements:
+        dtype = np.dtype([(prop_name, byte_order + prop_type) for prop_name, prop_type in props])
+        if name == element:
+            if mmap and count > 0:
+                return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+            return np.fromfile(path, dtype=dtype, count=count, offset=offset)
+        offset += dtype.itemsize * count
+    raise KeyError(f"element {element} not found in {path}")
+
+
+def columns(data, names):
+    """将结构化数组中的多列取出为 [N, len(names)] 的数组，各列类型相同且连续时不复制"""
+    return recfunctions.structured_to_unstructured(data[list(names)], copy=False)
+
+
+def sorted_names(data, prefix):
+    """按编号排序的属性名，如 f_rest_0, f_rest_1, ..."""
+    names = [name for name in data.dtype.names if name.startswith(prefix)]
+    return sorted(names, key=lambda x: int(x.split('_')[-1]))
+
+
+def load_gaussian_ply(path, max_sh_degree=3):
+    """读取高斯模型的PLY文件
+    :return: xyz [N, 3], features_dc [N, 3, 1], features_extra [N, 3, SH_coeffs-1], opacities [N, 1], scales, rots
+    """
+    data = read_ply(path)
+    xyz = np.array(columns(data, ["x", "y", "z"]))
+    opacities = np.array(columns(data, ["opacity"]))
+    features_dc = np.array(columns(data, ["f_dc_0", "f_dc_1", "f_dc_2"])).reshape(-1, 3, 1)
+
+    extra_f_names = sorted_names(data, "f_rest_")
+    assert len(extra_f_names) == 3 * (max_sh_degree + 1) ** 2 - 3
+    # Reshape (P,F*SH_coeffs) to (P, F, SH_coeffs except DC)
+    features_extra = np.array(columns(data, extra_f_names)).reshape(-1, 3, (max_sh_degree + 1) ** 2 - 1)
+    scales = np.array(columns(data, sorted_names(data, "scale_")))
+    rots = np.array(columns(data, sorted_names(data, "rot")))
+    return xyz, features_dc, features_extra, opacities, scales, rots